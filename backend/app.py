@@ -8,21 +8,17 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import websockets
 
-from config import TOKENS, EXCHANGES, POLLING_INTERVAL
+from config import (
+    TOKENS, EXCHANGES, POLLING_INTERVAL, DEPTH_CHANNEL_LEVELS, DEPTH_CHANNEL_MAX_LEVELS, WS_PER_MESSAGE_DEFLATE
+)
 from database.db import init_db, get_tokens, get_exchanges, add_token, add_exchange, remove_token, remove_exchange
 from services.orderbook_manager import OrderbookManager
 from services.websocket_manager import WebSocketManager
-from services.coinex_force_updater import CoinExForceUpdater
+from utils import json_codec, log
 
 # Налаштування логування
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/app.log'),
-        logging.StreamHandler()
-    ]
-)
+# Файл і консоль обслуговує фоновий потік, тож запис логу не блокує цикл подій
+log.setup_logging(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Створення FastAPI застосунку
@@ -67,24 +63,6 @@ async def startup_event():
     logger.info("Starting polling processes...")
     asyncio.create_task(orderbook_manager.start_polling())
     
-    # Знаходимо клієнт CoinEx серед усіх бірж
-    coinex_client = None
-    for exchange_name, client in orderbook_manager.exchanges.items():
-        if exchange_name == 'CoinEx':
-            coinex_client = client
-            logger.info("Знайдено клієнт CoinEx для примусового оновлення")
-            break
-    
-    # Якщо клієнт знайдено, створюємо форсувальник оновлень
-    if coinex_client:
-        logger.info("Ініціалізуємо CoinExForceUpdater")
-        coinex_updater = CoinExForceUpdater(coinex_client, websocket_manager)
-        app.state.coinex_updater = coinex_updater
-        asyncio.create_task(coinex_updater.start())
-        logger.info("CoinExForceUpdater запущено")
-    else:
-        logger.warning("Клієнт CoinEx не знайдено, CoinExForceUpdater не запущено")
-    
     logger.info("Server startup completed")
 
 
@@ -93,12 +71,11 @@ async def shutdown_event():
     """Виконується при зупинці сервера."""
     await orderbook_manager.close_all_connections()
     
-    # Зупиняємо модуль форсування оновлень CoinEx
-    if hasattr(app.state, "coinex_updater"):
-        logger.info("Зупиняємо CoinExForceUpdater")
-        await app.state.coinex_updater.stop()
+    # Відправляємо накопичені оновлення ордербуків
+    await websocket_manager.close()
     
     logger.info("Server shutdown completed")
+    log.shutdown()
 
 
 @app.websocket("/ws")
@@ -107,8 +84,13 @@ async def websocket_endpoint(websocket: WebSocket):
     # Спочатку приймаємо з'єднання
     await websocket.accept()
     
+    # Бінарний формат оновлень найкращих цін вмикається параметром ?format=binary,
+    # об'єднання оновлень одного тіку в один кадр - параметром ?batch=1
+    binary = websocket.query_params.get("format") == "binary"
+    batch = websocket.query_params.get("batch") in ("1", "true")
+    
     # Потім додаємо клієнта до списку активних з'єднань
-    await websocket_manager.connect(websocket)
+    await websocket_manager.connect(websocket, binary=binary, batch=batch)
     
     try:
         # Відправляємо початкові дані клієнту
@@ -118,7 +100,12 @@ async def websocket_endpoint(websocket: WebSocket):
             "exchanges": await get_exchanges(),
             "orderbooks": orderbook_manager.get_all_orderbooks()
         }
-        await websocket.send_text(json.dumps(initial_data))
+        if binary:
+            # Ідентифікатори токенів і бірж, які використовуються в бінарних кадрах
+            await websocket_manager.announce_symbols(orderbook_manager.tokens, list(orderbook_manager.exchanges))
+            initial_data["wire_format"] = "binary"
+            initial_data["symbol_ids"] = websocket_manager.symbols.to_dict()
+        await websocket_manager.send_personal_message(initial_data, websocket)
         
         # Підписуємо клієнта на всі дані
         await websocket_manager.subscribe(websocket, [], [])
@@ -139,7 +126,7 @@ async def websocket_endpoint(websocket: WebSocket):
 async def process_client_message(websocket: WebSocket, message: str):
     """Обробка повідомлень від клієнта."""
     try:
-        data = json.loads(message)
+        data = json_codec.loads(message)
         action = data.get("action")
         
         if action == "subscribe":
@@ -150,7 +137,7 @@ async def process_client_message(websocket: WebSocket, message: str):
         elif action == "add_token":
             token = data.get("token")
             if not token:
-                await websocket.send_text(json.dumps({"type": "error", "message": "No token provided"}))
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "No token provided"}))
                 return
                 
             await add_token(token)
@@ -160,7 +147,7 @@ async def process_client_message(websocket: WebSocket, message: str):
         elif action == "remove_token":
             token = data.get("token")
             if not token:
-                await websocket.send_text(json.dumps({"type": "error", "message": "No token provided"}))
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "No token provided"}))
                 return
                 
             await remove_token(token)
@@ -173,7 +160,7 @@ async def process_client_message(websocket: WebSocket, message: str):
             exchange_type = data.get("type", "websocket")  # "websocket" or "http"
             
             if not exchange or not url:
-                await websocket.send_text(json.dumps({"type": "error", "message": "Exchange or URL missing"}))
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "Exchange or URL missing"}))
                 return
                 
             exchange_data = {"name": exchange, "url": url, "type": exchange_type}
@@ -184,7 +171,7 @@ async def process_client_message(websocket: WebSocket, message: str):
         elif action == "remove_exchange":
             exchange = data.get("exchange")
             if not exchange:
-                await websocket.send_text(json.dumps({"type": "error", "message": "No exchange provided"}))
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "No exchange provided"}))
                 return
                 
             await remove_exchange(exchange)
@@ -193,10 +180,7 @@ async def process_client_message(websocket: WebSocket, message: str):
             
         elif action == "update_prices":
             exchange = data.get("exchange")
-            if exchange == "CoinEx" and hasattr(app.state, "coinex_updater"):
-                logger.info("Запит на примусове оновлення даних CoinEx")
-                await app.state.coinex_updater.force_update_all()
-            elif exchange:
+            if exchange:
                 await orderbook_manager.refresh_exchange(exchange)
             else:
                 await orderbook_manager.refresh_all()
@@ -210,35 +194,85 @@ async def process_client_message(websocket: WebSocket, message: str):
             exchange = data.get("exchange")
             
             if not token or not exchange:
-                await websocket.send_text(json.dumps({"type": "error", "message": "Token or exchange missing"}))
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "Token or exchange missing"}))
                 return
                 
             # Отримуємо дані ордербуку
             orderbook_data = await orderbook_manager.get_orderbook(token, exchange)
             if orderbook_data:
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(json_codec.dumps({
                     "type": "orderbook_data",
                     "token": token,
                     "exchange": exchange,
                     "data": {
                         "asks": orderbook_data.get("asks", []),
                         "bids": orderbook_data.get("bids", [])
-                    }
+                    },
+                    "updated_at": orderbook_data.get("updated_at"),
+                    "source": orderbook_data.get("source")
                 }))
             else:
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(json_codec.dumps({
+                    "type": "error",
+                    "message": f"No orderbook data available for {token} on {exchange}"
+                }))
+            
+        elif action == "subscribe_depth":
+            token = data.get("token")
+            exchange = data.get("exchange")
+            levels = data.get("levels", DEPTH_CHANNEL_LEVELS)
+            
+            if not token or not exchange:
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "Token or exchange missing"}))
+                return
+            if not isinstance(levels, int) or not 0 < levels <= DEPTH_CHANNEL_MAX_LEVELS:
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": f"Levels must be between 1 and {DEPTH_CHANNEL_MAX_LEVELS}"}))
+                return
+            
+            book = orderbook_manager.get_book(token, exchange)
+            if book is None:
+                await websocket.send_text(json_codec.dumps({
                     "type": "error",
                     "message": f"No orderbook data available for {token} on {exchange}"
                 }))
+                return
+            
+            # Підписка на канал глибини: снапшот з номером послідовності, далі різниці рівнів
+            await websocket_manager.subscribe_depth(websocket, token, exchange, book, levels)
+            
+        elif action == "unsubscribe_depth":
+            websocket_manager.unsubscribe_depth(websocket, data.get("token"), data.get("exchange"))
+            
+        elif action == "get_effective_prices":
+            token = data.get("token")
+            if not token:
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "No token provided"}))
+                return
+                
+            thresholds = data.get("thresholds")
+            if thresholds is not None and (
+                not isinstance(thresholds, list)
+                or not all(isinstance(t, (int, float)) and t > 0 for t in thresholds)
+            ):
+                await websocket.send_text(json_codec.dumps({"type": "error", "message": "Thresholds must be a list of positive numbers"}))
+                return
+                
+            # Ціни виконання для кількох порогів обсягу (бінарний пошук за префіксними сумами повної книги)
+            prices = await orderbook_manager.get_effective_prices(token, thresholds, data.get("exchange"))
+            await websocket.send_text(json_codec.dumps({
+                "type": "effective_prices",
+                "token": token,
+                "prices": prices
+            }))
             
         else:
-            await websocket.send_text(json.dumps({"type": "error", "message": f"Unknown action: {action}"}))
+            await websocket.send_text(json_codec.dumps({"type": "error", "message": f"Unknown action: {action}"}))
             
     except json.JSONDecodeError:
-        await websocket.send_text(json.dumps({"type": "error", "message": "Invalid JSON"}))
+        await websocket.send_text(json_codec.dumps({"type": "error", "message": "Invalid JSON"}))
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
-        await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+        await websocket.send_text(json_codec.dumps({"type": "error", "message": str(e)}))
 
 
 # REST API ендпоінти для отримання статичних даних
@@ -299,15 +333,24 @@ async def api_remove_exchange(exchange: str):
     return {"status": "success", "message": f"Exchange {exchange} removed"}
 
 
+@app.get("/api/websocket/stats")
+async def api_websocket_stats():
+    """Статистика відправки та глибина вихідних черг WebSocket-клієнтів."""
+    return {
+        "stats": websocket_manager.stats,
+        "clients": websocket_manager.get_client_stats()
+    }
+
+
 # Додаткові ендпоінти для керування CoinEx
 @app.post("/api/coinex/force-update")
 async def force_update_coinex():
     """Примусове оновлення всіх даних CoinEx."""
     try:
-        if not hasattr(app.state, "coinex_updater"):
-            return {"status": "error", "message": "CoinExForceUpdater не ініціалізовано"}
+        if "CoinEx" not in orderbook_manager.exchanges:
+            return {"status": "error", "message": "Біржу CoinEx не підключено"}
             
-        await app.state.coinex_updater.force_update_all()
+        await orderbook_manager.refresh_exchange("CoinEx")
         return {"status": "success", "message": "Оновлення CoinEx запущено"}
     except Exception as e:
         logger.error(f"Помилка при примусовому оновленні CoinEx: {str(e)}")
@@ -317,10 +360,10 @@ async def force_update_coinex():
 async def force_update_coinex_token(token: str):
     """Примусове оновлення конкретного токену CoinEx."""
     try:
-        if not hasattr(app.state, "coinex_updater"):
-            return {"status": "error", "message": "CoinExForceUpdater не ініціалізовано"}
+        if "CoinEx" not in orderbook_manager.exchanges:
+            return {"status": "error", "message": "Біржу CoinEx не підключено"}
             
-        await app.state.coinex_updater.force_update_token(token)
+        await orderbook_manager.refresh_exchange("CoinEx", token)
         return {"status": "success", "message": f"Оновлення токену {token} запущено"}
     except Exception as e:
         logger.error(f"Помилка при оновленні токену {token}: {str(e)}")
@@ -328,4 +371,5 @@ async def force_update_coinex_token(token: str):
 
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True,
+                ws="websockets", ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE)
\ No newline at end of file
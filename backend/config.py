@@ -18,7 +18,13 @@ EXCHANGES = [
         "name": "MEXC",
         "url": "wss://wbs.mexc.com/raw/ws",
         "type": "websocket",
-        "config": {}
+        "config": {
+            # Інкрементальна глибина з синхронізацією за REST-знімком замість 5 верхніх рівнів
+            "depth_mode": "diff",
+            "depth_snapshot_limit": 1000,
+            # Книги без живого потоку оновлюються найкращими цінами всіх токенів одним запитом bookTicker
+            "bulk_bbo": True
+        }
     },
     {
         "name": "CoinEx",
@@ -55,9 +61,83 @@ EXCHANGES = [
 # Інтервал опитування для HTTP-бірж (у секундах)
 POLLING_INTERVAL = 5
 
+# Максимальна кількість одночасних запитів ордербуку до однієї біржі під час циклу оновлення
+# (можна перевизначити в конфігурації біржі ключем fetch_concurrency)
+FETCH_CONCURRENCY = 4
+
+# Граничний час одного запиту ордербуку під час циклу оновлення (у секундах, ключ fetch_timeout)
+FETCH_TIMEOUT = 5.0
+
+# Планувальник запитів: тривалість слота колеса таймерів (с), кількість слотів
+# та відносне випадкове відхилення інтервалу опитування (0.1 = ±10%)
+INGEST_TICK = 0.1
+INGEST_WHEEL_SIZE = 512
+INGEST_JITTER = 0.1
+
+# Адаптивне опитування HTTP-бірж: межі інтервалу для одного токена (с), множники інтервалу
+# після зміненої та незміненої відповіді, бюджет запитів до однієї біржі (запитів за секунду).
+# Перевизначаються в конфігурації біржі ключами min_polling_interval, max_polling_interval,
+# polling_speedup, polling_backoff та request_budget
+HTTP_MIN_POLLING_INTERVAL = 1.0
+HTTP_MAX_POLLING_INTERVAL = 30.0
+HTTP_POLLING_SPEEDUP = 0.5
+HTTP_POLLING_BACKOFF = 1.5
+HTTP_REQUEST_BUDGET = 2.0
+
+# Спільний HTTP-транспорт REST-запитів усіх бірж (exchange_clients.transport): загальна кількість
+# з'єднань, з'єднань до одного хоста, час утримання неактивного з'єднання (с), час кешування DNS (с),
+# граничний час запиту за замовчуванням (с, ключ timeout у конфігурації біржі) та HTTP/2
+# (використовується, якщо встановлено пакет h2)
+HTTP_POOL_SIZE = 100
+HTTP_POOL_PER_HOST = 10
+HTTP_KEEPALIVE = 30.0
+HTTP_DNS_CACHE_TTL = 300
+HTTP_TIMEOUT = 10.0
+HTTP2_ENABLED = True
+
+# Вікно злиття оновлень ордербуків перед відправкою клієнтам (у секундах): за вікно для кожної
+# пари (біржа, токен) відправляється лише останній стан; 0 - відправляти кожне оновлення одразу
+BROADCAST_CONFLATION_WINDOW = 0.1
+
+# Вихідна черга кожного WebSocket-клієнта: максимальна кількість повідомлень, граничний час
+# відправки одного повідомлення (с) та скільки секунд черга може бути переповненою до відключення
+WS_CLIENT_QUEUE_SIZE = 256
+WS_SEND_TIMEOUT = 5.0
+WS_SLOW_CLIENT_TIMEOUT = 10.0
+
+# Час життя (с) результату REST-запиту ордербуку: одночасні запити того самого ринку виконуються
+# один раз, а результат повторно використовується протягом цього часу (ключ orderbook_cache_ttl)
+ORDERBOOK_CACHE_TTL = 0.5
+
+# Максимальний вік локальної книги (с), з якої відповідаємо на get_orderbook без REST-запиту до біржі
+# (ключ orderbook_max_age у конфігурації біржі)
+ORDERBOOK_MAX_AGE = 30.0
+
+# Максимальний вік книги потокового клієнта (с): якщо потік книги живий, але книга довше не змінювалася,
+# підписка могла зникнути, тож get_orderbook запитує біржу (ключ push_stale_after). Книги без живого
+# потоку перевіряються за ORDERBOOK_MAX_AGE
+PUSH_STALE_AFTER = 120.0
+
+# Інтервал запиту найкращих цін усіх ринків одним запитом (с) для бірж з bulk_bbo: ціни запитуються
+# лише для токенів без живого потоку і не замінюють глибину їх книг (ключ bulk_bbo_interval)
+BULK_BBO_INTERVAL = 5.0
+
+# Канал глибини ордербуку: кількість рівнів на сторону за замовчуванням та максимальна
+DEPTH_CHANNEL_LEVELS = 20
+DEPTH_CHANNEL_MAX_LEVELS = 200
+
+# Стиснення повідомлень WebSocket (permessage-deflate), узгоджується з клієнтом при підключенні
+WS_PER_MESSAGE_DEFLATE = True
+
+# Бекенд кодування JSON для повідомлень клієнтам: 'auto' (orjson, якщо встановлений), 'orjson' або 'json'
+JSON_BACKEND = "auto"
+
 # Поріг для розрахунку кумулятивного обсягу (в USDT)
 CUMULATIVE_THRESHOLD = 5.0
 
+# Пороги обсягу (в USDT) для цін виконання за замовчуванням у запиті get_effective_prices
+EFFECTIVE_PRICE_THRESHOLDS = [5.0, 100.0, 1000.0]
+
 # Налаштування бази даних
 DATABASE_URL = "sqlite:///./crypto_orderbook.db"
 
@@ -66,9 +146,13 @@ WS_PING_INTERVAL = 30  # секунди між пінгами для перев
 
 # Налаштування системи логування
 LOG_LEVEL = "DEBUG"
-LOG_FILE = "crypto_orderbook.log"
+LOG_FILE = "logs/app.log"
 LOG_MAX_SIZE = 5 * 1024 * 1024  # 5 МБ
 LOG_BACKUPS = 3  # Кількість файлів резервного копіювання
+LOG_QUEUE_SIZE = 10000  # Місткість черги записів логу; при переповненні записи відкидаються
+LOG_PAYLOAD = False  # Логувати повні повідомлення бірж і вміст книг (рівень PAYLOAD)
+LOG_THROTTLE_INTERVAL = 5.0  # Мінімальний інтервал між записами одного місця виклику на гарячих шляхах (секунди)
+LOG_SAMPLE_RATE = 100  # Вибірка записів на гарячих шляхах: 1 з N
 
 # Налаштування для повторних спроб підключення
 MAX_RECONNECT_ATTEMPTS = 5
@@ -2,6 +2,8 @@
 Модуль для роботи з біржами.
 """
 
+from .orderbook import OrderBook, MarketScale
+from .transport import HttpTransport
 from .base_client import BaseExchangeClient
 from .websocket_client import WebSocketExchangeClient
 from .http_client import HttpExchangeClient
@@ -9,6 +11,9 @@ from .mexc import MEXCClient
 from .tradeogre import TradeOgreClient
 
 __all__ = [
+    'OrderBook',
+    'MarketScale',
+    'HttpTransport',
     'BaseExchangeClient',
     'WebSocketExchangeClient',
     'HttpExchangeClient',
@@ -3,7 +3,13 @@
 """
 import abc
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from config import HTTP_TIMEOUT, ORDERBOOK_CACHE_TTL
+from exchange_clients.orderbook import OrderBook, Level, MarketScale
+from exchange_clients.transport import HttpTransport, get_transport
+from utils.single_flight import SingleFlight
 
 # Налаштування логгера
 logger = logging.getLogger(__name__)
@@ -14,6 +20,9 @@ class BaseExchangeClient(abc.ABC):
     Всі конкретні реалізації мають успадковуватися від цього класу.
     """
     
+    # Чи повідомляє клієнт про зміни книги через on_book_update (інакше менеджер опитує його сам)
+    push_updates = False
+    
     def __init__(self, name: str, url: str, config: Dict[str, Any] = None):
         """
         Ініціалізація клієнта біржі.
@@ -28,12 +37,28 @@ class BaseExchangeClient(abc.ABC):
         self.config = config or {}
         self.is_connected = False
         
-        # Словник ордербуків {token: {'asks': [...], 'bids': [...]}}
-        self.orderbooks: Dict[str, Dict[str, List]] = {}
+        # Словник ордербуків {book_key: OrderBook}
+        self.orderbooks: Dict[str, OrderBook] = {}
+        
+        # Масштаби цілочисельного представлення цін {book_key: MarketScale}
+        self.market_scales: Dict[str, MarketScale] = {}
         
         # Список токенів, за якими спостерігаємо
         self.tokens: List[str] = []
         
+        # Зворотний виклик менеджера про зміну книги: on_book_update(exchange, token)
+        self.on_book_update: Optional[Callable[[str, str], None]] = None
+        
+        # Відповідність ключів ордербуків токенам для подій {book_key: token}
+        self._book_tokens: Dict[str, str] = {}
+        
+        # Одночасні REST-запити ордербуку того самого ринку виконуються один раз
+        self.orderbook_flight = SingleFlight(self.config.get('orderbook_cache_ttl', ORDERBOOK_CACHE_TTL))
+        
+        # Спільні пули HTTP-з'єднань для REST-запитів (менеджер підставляє власний транспорт)
+        self.transport: HttpTransport = get_transport()
+        self.request_timeout = self.config.get('timeout', HTTP_TIMEOUT)
+        
         logger.info(f"Initialized {self.__class__.__name__} for {name}")
     
     @abc.abstractmethod
@@ -70,17 +95,108 @@ class BaseExchangeClient(abc.ABC):
         """
         pass
     
-    def get_orderbook(self, token: str) -> Dict[str, List]:
+    def book_key(self, token: str) -> str:
+        """
+        Ключ, під яким ордербук токена зберігається в self.orderbooks.
+        Клієнти, що працюють з символами ринку (наприклад, BTCUSDT), перевизначають цей метод.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            str: Ключ ордербуку
+        """
+        return token
+    
+    def get_book(self, token: str) -> Optional[OrderBook]:
+        """
+        Отримання рушія ордербуку для токена.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            Optional[OrderBook]: Ордербук або None, якщо токен не відстежується
+        """
+        return self.orderbooks.get(self.book_key(token))
+    
+    def has_live_stream(self, token: str) -> bool:
+        """
+        Перевірка, чи книга токена оновлюється потоком біржі.
+        Потокові клієнти, що відстежують стан підписки кожного ринку, перевизначають цей метод.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            bool: True, якщо клієнт отримує оновлення книги потоком і з'єднання активне
+        """
+        return self.push_updates and self.is_connected
+    
+    def get_top(self, token: str) -> Optional[Tuple[Optional[Level], Optional[Level]]]:
         """
-        Отримання поточного стану ордербуку для токена.
+        Найкращі рівні токена, за якими менеджер визначає зміну цін.
         
         Args:
             token (str): Символ токена
             
         Returns:
-            Dict[str, List]: Словник з asks і bids
+            Optional[Tuple[Optional[Level], Optional[Level]]]: (best_ask, best_bid) або None, якщо книги немає
+        """
+        book = self.get_book(token)
+        return (book.best_ask(), book.best_bid()) if book is not None else None
+    
+    def market_scale(self, key: str) -> MarketScale:
+        """
+        Масштаб цін і обсягів ринку.
+        
+        Береться з config['markets'][key] (tick_size / lot_size), далі з
+        tick_size / lot_size біржі, інакше використовується точність за замовчуванням.
+        
+        Args:
+            key (str): Ключ ордербуку
+            
+        Returns:
+            MarketScale: Масштаб ринку
+        """
+        scale = self.market_scales.get(key)
+        if scale is None:
+            market_config = {**self.config, **self.config.get('markets', {}).get(key, {})}
+            scale = self.market_scales[key] = MarketScale.from_config(market_config)
+        return scale
+    
+    def _ensure_book(self, key: str) -> OrderBook:
+        """
+        Отримання ордербуку за ключем зі створенням порожнього за потреби.
+        
+        Args:
+            key (str): Ключ ордербуку
+            
+        Returns:
+            OrderBook: Ордербук
+        """
+        book = self.orderbooks.get(key)
+        if book is None:
+            book = self.orderbooks[key] = OrderBook(self.market_scale(key))
+        return book
+    
+    def _notify_book_update(self, key: str):
         """
-        return self.orderbooks.get(token, {'asks': [], 'bids': []})
+        Повідомлення менеджера про зміну ордербуку.
+        
+        Args:
+            key (str): Ключ ордербуку, що змінився
+        """
+        if self.on_book_update is None:
+            return
+        token = self._book_tokens.get(key)
+        if token is None:
+            # Список токенів змінився - перебудовуємо відповідність ключів
+            self._book_tokens = {self.book_key(t): t for t in self.tokens}
+            token = self._book_tokens.get(key)
+            if token is None:
+                return
+        self.on_book_update(self.name, token)
     
     async def add_token(self, token: str):
         """
@@ -91,7 +207,7 @@ class BaseExchangeClient(abc.ABC):
         """
         if token not in self.tokens:
             self.tokens.append(token)
-            self.orderbooks[token] = {'asks': [], 'bids': []}
+            self._ensure_book(self.book_key(token))
             
             if self.is_connected:
                 await self.subscribe_to_orderbook(token)
@@ -110,8 +226,7 @@ class BaseExchangeClient(abc.ABC):
                 await self.unsubscribe_from_orderbook(token)
                 
             self.tokens.remove(token)
-            if token in self.orderbooks:
-                del self.orderbooks[token]
+            self.orderbooks.pop(self.book_key(token), None)
                 
             logger.info(f"{self.name}: Removed token {token}")
     
@@ -150,37 +265,91 @@ class BaseExchangeClient(abc.ABC):
         Returns:
             Tuple[str, str]: (best_sell, best_buy)
         """
-        if token not in self.orderbooks:
-            return "X X X", "X X X"
+        prices = self.get_effective_prices(token, [threshold])[0]
+        return prices['best_sell'], prices['best_buy']
+
+    def get_effective_prices(self, token: str, thresholds: List[float]) -> List[Dict[str, Any]]:
+        """
+        Ціни виконання для кількох порогів обсягу (у USDT).
+        
+        Кожен поріг - бінарний пошук за префіксними сумами книги, а не прохід по рівнях.
+        
+        Args:
+            token (str): Символ токена
+            thresholds (List[float]): Пороги кумулятивного обсягу
+            
+        Returns:
+            List[Dict[str, Any]]: [{'threshold': ..., 'best_sell': ..., 'best_buy': ...}, ...]
+        """
+        book = self.get_book(token)
+        if book is None or not book.asks or not book.bids:
+            return [{'threshold': threshold, 'best_sell': "X X X", 'best_buy': "X X X"} for threshold in thresholds]
+            
+        scale = book.scale
+        prices = []
+        for threshold in thresholds:
+            best_sell, best_buy = book.effective_prices(scale.notional_units(threshold))
+            prices.append({
+                'threshold': threshold,
+                'best_sell': scale.display_price(best_sell) if best_sell is not None else "X X X",
+                'best_buy': scale.display_price(best_buy) if best_buy is not None else "X X X"
+            })
+        return prices
+
+    def _load_snapshot(self, key: str, asks: List[Any], bids: List[Any]) -> OrderBook:
+        """
+        Завантаження снапшоту у форматі біржі в ордербук.
+        
+        Args:
+            key (str): Ключ ордербуку
+            asks (List[Any]): Рівні asks у форматі біржі
+            bids (List[Any]): Рівні bids у форматі біржі
             
-        orderbook = self.orderbooks[token]
-        asks = orderbook.get('asks', [])
-        bids = orderbook.get('bids', [])
+        Returns:
+            OrderBook: Оновлений ордербук
+        """
+        book = self._ensure_book(key)
+        book.load_snapshot(self._parse_levels(asks, book.scale), self._parse_levels(bids, book.scale))
+        self._notify_book_update(key)
+        return book
+
+    def _orderbook_payload(self, book: OrderBook) -> Dict[str, Any]:
+        """
+        Формування даних ордербуку для менеджера та фронтенду.
         
-        if not asks or not bids:
-            return "X X X", "X X X"
+        Args:
+            book (OrderBook): Ордербук
             
-        # Розрахунок кумулятивного обсягу
-        cumulative_volume = 0
-        best_sell = None
-        best_buy = None
+        Returns:
+            Dict[str, Any]: asks, bids та відформатовані найкращі ціни
+        """
+        best_ask = book.best_ask()
+        best_bid = book.best_bid()
+        return {
+            **book.to_dict(),
+            'best_sell': book.scale.display_price(best_ask[0]) if best_ask else "X X X",
+            'best_buy': book.scale.display_price(best_bid[0]) if best_bid else "X X X"
+        }
+
+    def _parse_levels(self, levels: List[Any], scale: MarketScale) -> List[Level]:
+        """
+        Розбір рівнів у форматі біржі з пропуском некоректних записів.
         
-        for ask in asks:
-            price, volume = float(ask[0]), float(ask[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                best_sell = f"{price:.8f}"
-                break
-                
-        cumulative_volume = 0
-        for bid in bids:
-            price, volume = float(bid[0]), float(bid[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                best_buy = f"{price:.8f}"
-                break
-                
-        return best_sell or "X X X", best_buy or "X X X"
+        Args:
+            levels (List[Any]): Рівні у форматі біржі
+            scale (MarketScale): Масштаб ринку
+            
+        Returns:
+            List[Level]: Рівні (тіки, лоти)
+        """
+        parse_level = scale.parse_level
+        parsed = []
+        for level in levels:
+            try:
+                parsed.append(parse_level(level))
+            except (ValueError, TypeError, IndexError, KeyError, ArithmeticError):
+                logger.debug(f"{self.name}: Skipping malformed level: {level}")
+        return parsed
 
     async def connect(self):
         """Підключення до API біржі"""
@@ -212,10 +381,9 @@ class BaseExchangeClient(abc.ABC):
                     logger.error(f"{self.name}: Failed to connect")
                     return None
 
-            # Отримуємо дані
+            # Отримуємо дані (get_orderbook сам оновлює локальний ордербук)
             data = await self.get_orderbook(token)
             if data:
-                self.orderbooks[token] = data
                 return data
             else:
                 logger.warning(f"{self.name}: No data received for {token}")
@@ -225,5 +393,111 @@ class BaseExchangeClient(abc.ABC):
             return None
 
     async def get_orderbook(self, token: str) -> Dict[str, Any]:
-        """Отримання даних ордербуку для токена"""
-        raise NotImplementedError("Subclasses must implement get_orderbook")
\ No newline at end of file
+        """
+        Отримання даних ордербуку для токена.
+        Одночасні виклики для того самого ринку отримують результат одного запиту _fetch_orderbook.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            Dict[str, Any]: Дані ордербуку (спільний об'єкт - не змінювати)
+        """
+        return await self.orderbook_flight.run(self.book_key(token), self._fetch_orderbook, token)
+    
+    async def _fetch_orderbook(self, token: str) -> Dict[str, Any]:
+        """Запит ордербуку токена в біржі (реалізується в підкласах)."""
+        raise NotImplementedError("Subclasses must implement _fetch_orderbook")
+
+
+class BulkBboMixin(abc.ABC):
+    """
+    Клієнт, що отримує найкращі ціни всіх ринків одним запитом.
+    Вказується перед BaseExchangeClient у базових класах; опитування вмикається атрибутом bulk_bbo.
+    
+    Найкращі ціни зберігаються окремо від книг і не замінюють їх глибину.
+    """
+    
+    # Чи реєструє менеджер джерело найкращих цін одним запитом для книг без живого потоку
+    bulk_bbo = False
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Найкращі рівні з останнього запиту для книг без живого потоку {book_key: (ask, bid, timestamp)}
+        self.bbo_tops: Dict[str, Tuple[Level, Level, float]] = {}
+    
+    @abc.abstractmethod
+    async def get_bulk_bbo(self, tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Найкращі ціни кількох токенів одним запитом.
+        
+        Args:
+            tokens (List[str]): Символи токенів
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: {token: {'best_sell', 'best_buy', 'asks', 'bids'}} для токенів,
+                ціни яких повернула біржа; asks і bids - верхній рівень у форматі біржі
+        """
+    
+    @abc.abstractmethod
+    def has_live_stream(self, token: str) -> bool:
+        """
+        Перевірка, чи книга токена оновлюється потоком біржі.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            bool: True, якщо з'єднання активне і потік книги не зупинився
+        """
+    
+    def get_top(self, token: str) -> Optional[Tuple[Optional[Level], Optional[Level]]]:
+        """
+        Найкращі рівні токена: з книги, а для книги без живого потоку - з останнього запиту
+        найкращих цін, якщо він новіший за книгу.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            Optional[Tuple[Optional[Level], Optional[Level]]]: (best_ask, best_bid) або None, якщо даних немає
+        """
+        top = super().get_top(token)
+        entry = self.bbo_tops.get(self.book_key(token))
+        if entry is None or self.has_live_stream(token):
+            return top
+        ask, bid, updated_at = entry
+        book = self.get_book(token)
+        if book is not None and not book.is_empty() and book.updated_at >= updated_at:
+            return top
+        return ask, bid
+    
+    async def refresh_bulk_bbo(self, tokens: List[str]) -> int:
+        """
+        Запит найкращих цін для токенів без живого потоку.
+        
+        Ціни зберігаються в bbo_tops, а книги токенів не змінюються. Менеджер отримує звичайну
+        подію зміни книги, тож ціни проходять те саме порівняння верхівки, що й оновлення з потоку.
+        
+        Args:
+            tokens (List[str]): Символи токенів
+            
+        Returns:
+            int: Кількість оновлених токенів
+        """
+        stale = [token for token in tokens if not self.has_live_stream(token)]
+        if not stale:
+            return 0
+        prices = await self.get_bulk_bbo(stale)
+        updated = 0
+        for token, data in prices.items():
+            key = self.book_key(token)
+            scale = self.market_scale(key)
+            asks = self._parse_levels(data['asks'], scale)
+            bids = self._parse_levels(data['bids'], scale)
+            if not asks or not bids:
+                continue
+            self.bbo_tops[key] = (asks[0], bids[0], time.time())
+            self._notify_book_update(key)
+            updated += 1
+        return updated
@@ -4,18 +4,29 @@
 import asyncio
 import json
 import logging
+import time
 from typing import Dict, Any, List, Tuple, Optional
 import websockets
+from config import PUSH_STALE_AFTER
 from exchange_clients.base_client import BaseExchangeClient
+from exchange_clients.frame_decoder import FrameDecoder
+from utils import log
 import aiohttp
 
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
 
 class CoinExClient(BaseExchangeClient):
     """
     Клієнт для біржі CoinEx.
     """
     
+    # Зміни книги з потоку біржі надходять у менеджер подіями
+    push_updates = True
+    
+    # Методи повідомлень, які обробляє _process_message
+    HANDLED_METHODS = frozenset({"depth.update", "depth.subscribe"})
+    
     def __init__(self, name: str, url: str, config: Dict[str, Any] = None):
         super().__init__(name, url, config)
         self.ws = None
@@ -24,9 +35,15 @@ class CoinExClient(BaseExchangeClient):
         self.tokens = []
         self.listen_task = None
         self._ws_lock = asyncio.Lock()  # Додаємо блокування для WebSocket операцій
-        self.http_client = aiohttp.ClientSession()  # Додаємо HTTP клієнт
+        self._synced_symbols = set()  # Символи, для яких отримано повний снапшот після підписки
+        self.decoder = FrameDecoder()  # Розбір вхідних кадрів (orjson, якщо встановлений)
         logger.info(f"{self.name}: Ініціалізація клієнта з URL: {self.url}")
-        
+
+    @property
+    def http_client(self) -> aiohttp.ClientSession:
+        """Спільна aiohttp-сесія транспорту."""
+        return self.transport.session()
+
     async def connect(self):
         """Підключення до WebSocket API біржі"""
         try:
@@ -35,6 +52,8 @@ class CoinExClient(BaseExchangeClient):
                 await self.ws.close()
                 
             logger.info(f"{self.name}: Спроба підключення до WebSocket {self.url}")
+            # Після перепідключення інкрементальні оновлення застосовуються лише після нового снапшоту
+            self._synced_symbols.clear()
             self.ws = await websockets.connect(self.url)
             self.is_connected = True
             logger.info(f"{self.name}: WebSocket з'єднання встановлено успішно")
@@ -91,12 +110,13 @@ class CoinExClient(BaseExchangeClient):
                     symbol,
                     50,  # Глибина ордербуку
                     "0", # Точність
-                    True # Об'єднувати однакові ціни
+                    True # Інкрементальні оновлення (перше повідомлення - повний снапшот)
                 ],
                 "id": 1
             }
             
-            logger.info(f"{self.name}: Відправка запиту на підписку для {symbol}: {json.dumps(subscription, indent=2, ensure_ascii=False)}")
+            logger.info(f"{self.name}: Відправка запиту на підписку для {symbol}")
+            hot_log.payload("%s: Запит на підписку: %s", self.name, log.lazy(json.dumps, subscription, ensure_ascii=False))
             async with self._ws_lock:  # Використовуємо блокування для send
                 await self.ws.send(json.dumps(subscription))
                 
@@ -124,9 +144,13 @@ class CoinExClient(BaseExchangeClient):
 
                 async with self._ws_lock:
                     message = await self.ws.recv()
-                    logger.debug(f"{self.name}: Отримано нове повідомлення: {message[:200]}...")
+                    hot_log.payload("%s: Отримано нове повідомлення: %.200s", self.name, message)
                     
-                data = json.loads(message)
+                # Обробляються лише методи depth.*: інші кадри з методом відкидаємо без розбору
+                if self.decoder.skip_unhandled(message, "method", self.HANDLED_METHODS):
+                    continue
+                    
+                data = self.decoder.loads(message)
                 await self._process_message(data)
                 
             except websockets.exceptions.ConnectionClosed as e:
@@ -150,8 +174,6 @@ class CoinExClient(BaseExchangeClient):
     async def _process_message(self, message: dict):
         """Обробка повідомлень від WebSocket"""
         try:
-            logger.info(f"{self.name}: Отримано повідомлення: {json.dumps(message, indent=2, ensure_ascii=False)}")
-            
             # Перевіряємо чи це повідомлення з ордербуком
             if "method" in message:
                 if message["method"] == "depth.update":
@@ -160,112 +182,42 @@ class CoinExClient(BaseExchangeClient):
                         logger.warning(f"{self.name}: Неправильний формат даних в повідомленні")
                         return
                         
-                    # Отримуємо символ з першого параметра
-                    symbol = data[0]  # Перший параметр - це символ
-                    orderbook = data[1]  # Другий параметр - це дані ордербуку
+                    # Формат CoinEx: [clean, {asks, bids, ...}, market], де clean=True - повний снапшот,
+                    # а clean=False - інкрементальне оновлення змінених рівнів.
+                    # Старий формат [market, {asks, bids}] вважаємо повним снапшотом.
+                    if isinstance(data[0], bool):
+                        if len(data) < 3:
+                            logger.warning(f"{self.name}: Відсутній символ в оновленні ордербуку")
+                            return
+                        is_snapshot, orderbook, symbol = data[0], data[1], data[2]
+                    else:
+                        is_snapshot, orderbook, symbol = True, data[1], data[0]
                     
                     asks = orderbook.get("asks", [])  # [[price, amount], ...]
                     bids = orderbook.get("bids", [])  # [[price, amount], ...]
                     
-                    logger.info(f"{self.name}: Отримано оновлення для {symbol}:")
-                    logger.info(f"Кількість asks: {len(asks)}, Кількість bids: {len(bids)}")
-                    logger.info(f"Приклад asks: {asks[:3]}")
-                    logger.info(f"Приклад bids: {bids[:3]}")
-                    
-                    if asks and bids:
-                        try:
-                            # Фільтруємо і конвертуємо дані
-                            valid_asks = []
-                            valid_bids = []
-                            
-                            for ask in asks:
-                                try:
-                                    price, amount = ask[0], ask[1]
-                                    if float(amount) > 0:
-                                        valid_asks.append((price, amount))
-                                except (ValueError, IndexError):
-                                    continue
-                                    
-                            for bid in bids:
-                                try:
-                                    price, amount = bid[0], bid[1]
-                                    if float(amount) > 0:
-                                        valid_bids.append((price, amount))
-                                except (ValueError, IndexError):
-                                    continue
-                            
-                            if valid_asks and valid_bids:
-                                # Логуємо вхідні дані
-                                logger.info(f"{self.name}: Валідні asks перед обробкою: {valid_asks[:5]}")
-                                logger.info(f"{self.name}: Валідні bids перед обробкою: {valid_bids[:5]}")
-                                
-                                top_ask = min(float(price) for price, _ in valid_asks)
-                                top_bid = max(float(price) for price, _ in valid_bids)
-                                
-                                # Логуємо проміжні значення
-                                logger.info(f"{self.name}: Top ask: {top_ask}, Top bid: {top_bid}")
-                                
-                                # Перетворюємо дані в формат для фронтенду
-                                formatted_asks = []
-                                formatted_bids = []
-                                
-                                for price, size in valid_asks:
-                                    try:
-                                        formatted_asks.append([
-                                            str(float(price)),  # Передаємо як рядок
-                                            str(float(size))    # Передаємо як рядок
-                                        ])
-                                    except ValueError as e:
-                                        logger.error(f"{self.name}: Помилка конвертації ask: {e}, price={price}, size={size}")
-                                        continue
-                                    
-                                for price, size in valid_bids:
-                                    try:
-                                        formatted_bids.append([
-                                            str(float(price)),  # Передаємо як рядок
-                                            str(float(size))    # Передаємо як рядок
-                                        ])
-                                    except ValueError as e:
-                                        logger.error(f"{self.name}: Помилка конвертації bid: {e}, price={price}, size={size}")
-                                        continue
-                                
-                                # Логуємо результат
-                                logger.info(f"{self.name}: Форматовані asks: {formatted_asks[:5]}")
-                                logger.info(f"{self.name}: Форматовані bids: {formatted_bids[:5]}")
-                                
-                                # Зберігаємо повний ордербук та найкращі ціни
-                                self.orderbooks[symbol] = {
-                                    "asks": formatted_asks,
-                                    "bids": formatted_bids,
-                                    "last_update": message.get("id", 0),
-                                    "best_sell": self._format_price(top_ask),
-                                    "best_buy": self._format_price(top_bid)
-                                }
-                            else:
-                                self.orderbooks[symbol] = {
-                                    "asks": [],
-                                    "bids": [],
-                                    "last_update": message.get("id", 0),
-                                    "best_sell": "X X X",
-                                    "best_buy": "X X X"
-                                }
-                        except Exception as e:
-                            logger.error(f"{self.name}: Помилка при обробці даних: {str(e)}")
-                            self.orderbooks[symbol] = {
-                                "asks": [],
-                                "bids": [],
-                                "last_update": message.get("id", 0),
-                                "best_sell": "X X X",
-                                "best_buy": "X X X"
-                            }
+                    if is_snapshot:
+                        # Рушій сам сортує рівні та відкидає нульові обсяги
+                        book = self._load_snapshot(symbol, asks, bids)
+                        self._synced_symbols.add(symbol)
+                    elif symbol in self._synced_symbols:
+                        # Зливаємо лише змінені рівні; нульовий обсяг видаляє рівень
+                        book = self._ensure_book(symbol)
+                        changed = False
+                        for price, amount in self._parse_levels(asks, book.scale):
+                            changed |= book.update_ask(price, amount)
+                        for price, amount in self._parse_levels(bids, book.scale):
+                            changed |= book.update_bid(price, amount)
+                        if changed:
+                            self._notify_book_update(symbol)
                     else:
-                        self.orderbooks[symbol] = {
-                            "asks": [],
-                            "bids": [],
-                            "last_update": message.get("id", 0),
-                            "best_sell": "X X X",
-                            "best_buy": "X X X"
-                        }
+                        # Без снапшоту нема до чого застосовувати дельту - чекаємо повний стан
+                        logger.debug(f"{self.name}: Пропускаємо оновлення для {symbol} до отримання снапшоту")
+                        return
+                    
+                    hot_log.debug("%s: %s (%s): asks=%d, bids=%d, top ask=%s, top bid=%s",
+                                  self.name, symbol, 'snapshot' if is_snapshot else 'update',
+                                  len(asks), len(bids), log.lazy(book.best_ask), log.lazy(book.best_bid))
                 elif message["method"] == "depth.subscribe":
                     logger.info(f"{self.name}: Підтверджено підписку на ордербук")
                 
@@ -274,17 +226,20 @@ class CoinExClient(BaseExchangeClient):
             logger.error(f"Повідомлення: {message}")
             raise
 
+    def book_key(self, token: str) -> str:
+        """Ордербуки CoinEx зберігаються за символом ринку (наприклад, BTCUSDT)."""
+        return f"{token}USDT"
+
     async def add_token(self, token: str):
         """Додавання нового токена для відстеження"""
         if token not in self.tokens:
             self.tokens.append(token)
             logger.info(f"{self.name}: Додано токен {token}")
             
-            # Отримуємо початковий стан ордербуку
-            symbol = f"{token}USDT"
+            # Отримуємо початковий стан ордербуку (get_orderbook оновлює локальну книгу)
+            symbol = self.book_key(token)
             orderbook = await self.get_orderbook(token)
             if orderbook:
-                self.orderbooks[symbol] = orderbook
                 logger.info(f"{self.name}: Завантажено початковий ордербук для {symbol}")
             
             # Підключаємося до WebSocket якщо ще не підключені
@@ -303,16 +258,14 @@ class CoinExClient(BaseExchangeClient):
     def get_best_prices(self, symbol: str) -> Dict[str, str]:
         """Отримання найкращих цін для символу"""
         try:
-            orderbook = self.orderbooks.get(symbol, {})
-            logger.info(f"{self.name}: Отримання цін для {symbol}:")
-            logger.info(f"Поточний стан ордербуку: {json.dumps(orderbook, indent=2, ensure_ascii=False)}")
+            book = self.orderbooks.get(symbol)
+            best_ask = book.best_ask() if book is not None else None
+            best_bid = book.best_bid() if book is not None else None
             
-            sell = orderbook.get("best_sell", "X X X")
-            buy = orderbook.get("best_buy", "X X X")
+            sell = book.scale.display_price(best_ask[0]) if best_ask else "X X X"
+            buy = book.scale.display_price(best_bid[0]) if best_bid else "X X X"
             
-            logger.info(f"{self.name}: Повертаю ціни для {symbol}:")
-            logger.info(f"best_sell: {sell}")
-            logger.info(f"best_buy: {buy}")
+            hot_log.debug("%s: Ціни для %s: best_sell=%s, best_buy=%s", self.name, symbol, sell, buy)
             
             return {
                 "best_sell": sell,
@@ -325,28 +278,45 @@ class CoinExClient(BaseExchangeClient):
                 "best_buy": "X X X"
             }
 
-    def _format_price(self, price: float) -> str:
-        """Форматування ціни з відповідною кількістю десяткових знаків."""
-        if price >= 1000:
-            return f"{price:.2f}"  # Прибираємо пробіли у великих числах
-        elif price >= 100:
-            return f"{price:.3f}"
-        elif price >= 10:
-            return f"{price:.4f}"
-        elif price >= 1:
-            return f"{price:.5f}"
-        elif price >= 0.1:
-            return f"{price:.6f}"
-        elif price >= 0.01:
-            return f"{price:.7f}"
-        else:
-            return f"{price:.8f}"
+    def _is_stream_synced(self, symbol: str) -> bool:
+        """
+        Перевірка, чи книга символу підтримується потоком: отримано снапшот після підписки,
+        з'єднання активне і книга змінювалася не раніше ніж push_stale_after секунд тому.
+        
+        Args:
+            symbol (str): Символ ринку (наприклад, BTCUSDT)
+            
+        Returns:
+            bool: True, якщо REST-знімок не потрібен
+        """
+        book = self.orderbooks.get(symbol)
+        if not self.is_connected or symbol not in self._synced_symbols or book is None or book.is_empty():
+            return False
+        return time.time() - book.updated_at <= self.config.get('push_stale_after', PUSH_STALE_AFTER)
+
+    def has_live_stream(self, token: str) -> bool:
+        """
+        Перевірка, чи книга токена оновлюється потоком: з'єднання активне і після підписки отримано снапшот.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            bool: True, якщо книга синхронізована з потоком
+        """
+        return self.is_connected and self.book_key(token) in self._synced_symbols
 
-    async def get_orderbook(self, token: str) -> Dict[str, Any]:
+    async def _fetch_orderbook(self, token: str) -> Dict[str, Any]:
         """Отримання початкового стану ордербуку через REST API"""
         try:
             symbol = f"{token}USDT"
-            logger.info(f"{self.name}: Отримання ордербуку для {symbol}")
+            
+            # Книга, синхронізована снапшотом з живого потоку, актуальніша за REST-знімок: він міг би
+            # перезаписати новіші рівні, тож відповідаємо з пам'яті
+            if self._is_stream_synced(symbol):
+                return self._orderbook_payload(self.orderbooks[symbol])
+            
+            hot_log.debug("%s: Отримання ордербуку для %s", self.name, symbol)
             
             url = "https://api.coinex.com/v1/market/depth"
             params = {
@@ -355,41 +325,32 @@ class CoinExClient(BaseExchangeClient):
                 "merge": "0"
             }
             
-            async with self.http_client.get(url, params=params) as response:
+            async with self.http_client.get(url, params=params,
+                                           timeout=self.transport.aiohttp_timeout(self.request_timeout)) as response:
                 response_data = await response.json()
-                logger.info(f"{self.name}: Отримано відповідь від API: {json.dumps(response_data, indent=2, ensure_ascii=False)}")
+                hot_log.payload("%s: Отримано відповідь від API: %s", self.name, log.lazy(json.dumps, response_data, ensure_ascii=False))
                 
                 if response_data.get("code") == 0 and "data" in response_data:
                     data = response_data["data"]
                     asks = data.get("asks", [])  # [[price, amount], ...]
                     bids = data.get("bids", [])  # [[price, amount], ...]
                     
+                    # Снапшот з потоку міг надійти під час запиту - тоді REST-знімок старіший за книгу
+                    if self._is_stream_synced(symbol):
+                        return self._orderbook_payload(self.orderbooks[symbol])
+                    
                     if asks and bids:
-                        # Конвертуємо ціни в float для порівняння
-                        top_ask = min(float(ask[0]) for ask in asks if float(ask[1]) > 0)
-                        top_bid = max(float(bid[0]) for bid in bids if float(bid[1]) > 0)
-                        
-                        # Перетворюємо дані в формат для фронтенду
-                        formatted_asks = [[str(float(ask[0])), str(float(ask[1]))] for ask in asks if float(ask[1]) > 0]
-                        formatted_bids = [[str(float(bid[0])), str(float(bid[1]))] for bid in bids if float(bid[1]) > 0]
+                        # Оновлюємо локальний ордербук і формуємо дані для фронтенду
+                        book = self._load_snapshot(symbol, asks, bids)
                         
-                        logger.info(f"{self.name}: Форматовані дані для {symbol}:")
-                        logger.info(f"Приклад asks: {json.dumps(formatted_asks[:5], indent=2)}")
-                        logger.info(f"Приклад bids: {json.dumps(formatted_bids[:5], indent=2)}")
+                        hot_log.debug("%s: Оновлено ордербук для %s: asks=%d, bids=%d", self.name, symbol, len(book.asks), len(book.bids))
                         
-                        return {
-                            "asks": formatted_asks,
-                            "bids": formatted_bids,
-                            "last_update": 0,
-                            "best_sell": self._format_price(top_ask) if formatted_asks else "X X X",
-                            "best_buy": self._format_price(top_bid) if formatted_bids else "X X X"
-                        }
+                        return self._orderbook_payload(book)
                 
                 logger.warning(f"{self.name}: Не вдалося отримати дані ордербуку для {symbol}")
                 return {
                     "asks": [],
                     "bids": [],
-                    "last_update": 0,
                     "best_sell": "X X X",
                     "best_buy": "X X X"
                 }
@@ -399,7 +360,6 @@ class CoinExClient(BaseExchangeClient):
             return {
                 "asks": [],
                 "bids": [],
-                "last_update": 0,
                 "best_sell": "X X X",
                 "best_buy": "X X X"
             }
@@ -413,15 +373,12 @@ class CoinExClient(BaseExchangeClient):
         """
         try:
             symbol = f"{token}USDT"
-            logger.info(f"{self.name}: Асинхронне оновлення ордербуку для {symbol}")
+            hot_log.debug("%s: Асинхронне оновлення ордербуку для %s", self.name, symbol)
             
-            # Запитуємо актуальні дані
+            # Запитуємо актуальні дані (get_orderbook оновлює локальну книгу)
             orderbook = await self.get_orderbook(token)
-            
-            # Оновлюємо кеш, якщо отримали дані
             if orderbook:
-                self.orderbooks[symbol] = orderbook
-                logger.info(f"{self.name}: Успішно оновлено ордербук для {symbol}")
+                hot_log.debug("%s: Успішно оновлено ордербук для %s", self.name, symbol)
         except Exception as e:
             logger.error(f"{self.name}: Помилка при оновленні ордербуку для {token}: {str(e)}")
 
@@ -460,9 +417,6 @@ class CoinExClient(BaseExchangeClient):
             if self.ws:
                 await self.ws.close()
             
-            if self.http_client:
-                await self.http_client.close()
-            
             self.is_connected = False
             logger.info(f"{self.name}: Всі з'єднання закрито")
             return True
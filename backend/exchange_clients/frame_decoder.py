@@ -0,0 +1,233 @@
+"""
+Розбір вхідних кадрів WebSocket бірж.
+
+Кадр розбирається парсером utils.json_codec (orjson, якщо встановлений) або
+переданим у FrameDecoder. До повного розбору клієнт може прочитати поля
+маршрутизації верхнього рівня (метод, канал, символ) або вкладене поле, назва
+якого зустрічається в кадрі один раз, прямо з сирого кадру і відкинути кадри, які не обробляються, або кадри ринків, за якими ніхто не
+спостерігає.
+"""
+from typing import Any, Callable, Container, Iterable, Optional, Set, Tuple, Union
+
+from utils import json_codec
+
+Frame = Union[str, bytes]
+
+# Службові символи JSON, які перевіряє peek: { } [ ] : " \
+_STR_TOKENS = ('{', '}', '[', ']', ':', '"', '\\')
+_BYTES_TOKENS = tuple(token.encode() for token in _STR_TOKENS)
+
+
+class FrameDecoder:
+    """
+    Розбір кадрів з попереднім читанням полів маршрутизації та фільтром символів.
+    """
+
+    def __init__(self, loads: Optional[Callable[[Frame], Any]] = None, symbols: Iterable[str] = ()):
+        """
+        Ініціалізація.
+
+        Args:
+            loads (Optional[Callable[[Frame], Any]]): Парсер JSON; None - utils.json_codec.loads
+            symbols (Iterable[str]): Символи ринків, кадри яких потрібно обробляти
+        """
+        self._loads = loads or json_codec.loads
+        self.symbols: Set[str] = set(symbols)
+        self.stats = {
+            'decoded': 0,
+            'skipped': 0
+        }
+
+    def loads(self, frame: Frame) -> Any:
+        """
+        Повний розбір кадру.
+
+        Args:
+            frame (Frame): Сирий кадр (текст або байти)
+
+        Returns:
+            Any: Розібране повідомлення
+        """
+        self.stats['decoded'] += 1
+        return self._loads(frame)
+
+    def peek(self, frame: Frame, field: str) -> Optional[str]:
+        """
+        Читання рядкового поля верхнього рівня з сирого кадру без повного розбору.
+
+        Входження ключа приймається, лише якщо воно точно належить об'єкту кадру:
+        до нього немає жодної дужки, крім першої (поле стоїть перед вкладеними
+        значеннями), або після нього немає дужок, крім останньої (поле стоїть після
+        них). Повертає значення, якщо це простий рядок без екранування; інакше None
+        (тоді поле потрібно брати з повного розбору).
+
+        Args:
+            frame (Frame): Сирий кадр
+            field (str): Назва поля верхнього рівня
+
+        Returns:
+            Optional[str]: Значення поля або None
+        """
+        key, tokens = self._key(frame, field)
+        start = frame.find(key)
+        while start >= 0:
+            end = start + len(key)
+            if not self._is_top_level(frame, start, end, tokens):
+                start = frame.find(key, end)
+                continue
+            is_key, value = self._read_value(frame, end, tokens)
+            if is_key:
+                return value
+            # Рядок-значення, що збігся з назвою поля
+            start = frame.find(key, end)
+        return None
+
+    def peek_unique(self, frame: Frame, field: str) -> Optional[str]:
+        """
+        Читання рядкового поля на будь-якій глибині кадру без повного розбору.
+
+        Поле приймається, лише якщо його назва зустрічається в кадрі рівно один раз
+        (наприклад, params.symbol у кадрах ордербуку Xeggex); значення - як у peek.
+
+        Args:
+            frame (Frame): Сирий кадр
+            field (str): Назва поля
+
+        Returns:
+            Optional[str]: Значення поля або None
+        """
+        key, tokens = self._key(frame, field)
+        start = frame.find(key)
+        if start < 0 or frame.find(key, start + len(key)) >= 0:
+            return None
+        # Без екранування парна кількість лапок означає, що ключ - поза рядком
+        if frame.find(tokens[6], 0, start) >= 0 or frame.count(tokens[5], 0, start) % 2:
+            return None
+        return self._read_value(frame, start + len(key), tokens)[1]
+
+    @staticmethod
+    def _key(frame: Frame, field: str) -> Tuple[Frame, Tuple]:
+        """Назва поля в лапках і службові символи JSON у типі кадру."""
+        if isinstance(frame, bytes):
+            return f'"{field}"'.encode(), _BYTES_TOKENS
+        return f'"{field}"', _STR_TOKENS
+
+    @staticmethod
+    def _read_value(frame: Frame, end: int, tokens: Tuple) -> Tuple[bool, Optional[str]]:
+        """
+        Читання значення після назви поля.
+
+        Args:
+            frame (Frame): Сирий кадр
+            end (int): Позиція одразу після назви поля в лапках
+            tokens (Tuple): Символи { } [ ] : " \\ у типі кадру
+
+        Returns:
+            Tuple[bool, Optional[str]]: (чи це ключ об'єкта, значення - простий рядок без екранування або None)
+        """
+        colon, quote, backslash = tokens[4], tokens[5], tokens[6]
+        size = len(frame)
+        while end < size and frame[end:end + 1].isspace():
+            end += 1
+        if frame[end:end + 1] != colon:
+            return False, None
+        end += 1
+        while end < size and frame[end:end + 1].isspace():
+            end += 1
+        if frame[end:end + 1] != quote:
+            return True, None
+
+        close = frame.find(quote, end + 1)
+        if close < 0:
+            return True, None
+        value = frame[end + 1:close]
+        if backslash in value:
+            return True, None
+        return True, value.decode() if isinstance(value, bytes) else value
+
+    @staticmethod
+    def _is_top_level(frame: Frame, start: int, end: int, tokens: Tuple) -> bool:
+        """
+        Перевірка, чи лапки на позиції start відкривають ключ об'єкта верхнього рівня.
+
+        Дужки всередині рядків теж рахуються, тож перевірка може відхилити ключ
+        верхнього рівня (і кадр буде розібрано повністю), але не прийме вкладений.
+
+        Args:
+            frame (Frame): Сирий кадр
+            start (int): Початок ключа (позиція лапок)
+            end (int): Кінець ключа
+            tokens (Tuple): Символи { } [ ] : " \\ у типі кадру
+
+        Returns:
+            bool: True, якщо ключ належить об'єкту верхнього рівня
+        """
+        brace, close_brace, bracket, close_bracket, _, quote, backslash = tokens
+        # Без екранування парна кількість лапок означає, що позиція start - поза рядком
+        if frame.find(backslash, 0, start) >= 0 or frame.count(quote, 0, start) % 2:
+            return False
+        # Поле перед вкладеними значеннями: до нього лише дужка, що відкриває кадр
+        if (frame.count(brace, 0, start) == 1 and frame.find(close_brace, 0, start) < 0
+                and frame.find(bracket, 0, start) < 0):
+            return True
+        # Поле після вкладених значень: після нього лише дужка, що закриває кадр
+        return (frame.count(close_brace, end) == 1 and frame.find(brace, end) < 0
+                and frame.find(bracket, end) < 0 and frame.find(close_bracket, end) < 0)
+
+    def track(self, symbol: str):
+        """Додавання символу до фільтра."""
+        self.symbols.add(symbol)
+
+    def untrack(self, symbol: str):
+        """Видалення символу з фільтра."""
+        self.symbols.discard(symbol)
+
+    def skip_unhandled(self, frame: Frame, field: str, handled: Container[str]) -> bool:
+        """
+        Перевірка, чи тип кадру (метод, канал) не обробляється клієнтом.
+        Кадр без поля типу верхнього рівня (або з полем, яке не вдалося прочитати) не відкидається.
+
+        Args:
+            frame (Frame): Сирий кадр
+            field (str): Назва поля типу
+            handled (Container[str]): Типи, які обробляє клієнт
+
+        Returns:
+            bool: True, якщо кадр можна відкинути без розбору
+        """
+        value = self.peek(frame, field)
+        if value is None or value in handled:
+            return False
+        self.stats['skipped'] += 1
+        return True
+
+    def skip_untracked(self, frame: Frame, field: str, nested: bool = False) -> bool:
+        """
+        Перевірка, чи кадр стосується ринку, за яким ніхто не спостерігає.
+        Кадр без поля символу (або з полем, яке не вдалося прочитати) не відкидається.
+
+        Args:
+            frame (Frame): Сирий кадр
+            field (str): Назва поля символу
+            nested (bool): Поле вкладене в кадр (читається через peek_unique); інакше - поле верхнього рівня
+
+        Returns:
+            bool: True, якщо кадр можна відкинути без розбору
+        """
+        symbol = self.peek_unique(frame, field) if nested else self.peek(frame, field)
+        return symbol is not None and self.skip_symbol(symbol)
+
+    def skip_symbol(self, symbol: str) -> bool:
+        """
+        Перевірка символу, прочитаного з уже розібраного кадру (коли символ вкладений у кадр).
+
+        Args:
+            symbol (str): Символ ринку
+
+        Returns:
+            bool: True, якщо за ринком ніхто не спостерігає і кадр можна не обробляти
+        """
+        if symbol in self.symbols:
+            return False
+        self.stats['skipped'] += 1
+        return True
@@ -1,19 +1,22 @@
 """
 Базовий клас для клієнтів бірж, які використовують HTTP API замість WebSocket.
 """
-import asyncio
-import json
 import logging
 import time
-from typing import Dict, List, Any, Optional, Callable, Tuple
+from typing import Dict, List, Any, Tuple
 
 import httpx
 
 from exchange_clients.base_client import BaseExchangeClient
-from config import POLLING_INTERVAL
+from utils import log
+from config import (
+    POLLING_INTERVAL, HTTP_MIN_POLLING_INTERVAL, HTTP_MAX_POLLING_INTERVAL,
+    HTTP_POLLING_SPEEDUP, HTTP_POLLING_BACKOFF, HTTP_REQUEST_BUDGET
+)
 
 # Налаштування логгера
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
 
 
 class HttpExchangeClient(BaseExchangeClient):
@@ -21,6 +24,9 @@ class HttpExchangeClient(BaseExchangeClient):
     Базовий клас для клієнтів бірж, які використовують HTTP API.
     """
     
+    # Кожен запит планувальника завантажує снапшот, тож зміни надходять подіями
+    push_updates = True
+    
     def __init__(self, name: str, url: str, config: Dict[str, Any] = None):
         """
         Ініціалізація HTTP-клієнта біржі.
@@ -31,23 +37,49 @@ class HttpExchangeClient(BaseExchangeClient):
             config (Dict[str, Any], optional): Додаткова конфігурація
         """
         super().__init__(name, url, config)
-        self.http_client = httpx.AsyncClient(timeout=10.0)
         self.polling_interval = config.get('polling_interval', POLLING_INTERVAL) if config else POLLING_INTERVAL
-        self.polling_tasks = {}  # {token: task}
         self.last_update_time = {}  # {token: timestamp}
+        
+        # Адаптивне опитування: інтервал кожного токена залежить від того, чи змінюється його книга
+        config = config or {}
+        self.min_polling_interval = config.get('min_polling_interval', min(HTTP_MIN_POLLING_INTERVAL, self.polling_interval))
+        self.max_polling_interval = config.get('max_polling_interval', max(HTTP_MAX_POLLING_INTERVAL, self.polling_interval))
+        self.polling_speedup = config.get('polling_speedup', HTTP_POLLING_SPEEDUP)
+        self.polling_backoff = config.get('polling_backoff', HTTP_POLLING_BACKOFF)
+        self.request_budget = config.get('request_budget', HTTP_REQUEST_BUDGET)
+        self.poll_intervals: Dict[str, float] = {}  # {token: інтервал без урахування бюджету}
+        self._poll_fingerprints: Dict[str, Tuple[List, List]] = {}  # {token: рівні книги з останньої відповіді}
+        self.request_headers = config.get('headers')
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Спільний httpx-клієнт транспорту."""
+        return self.transport.client()
+    
+    async def http_get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        GET-запит через спільний пул з'єднань з граничним часом і заголовками біржі.
+        
+        Args:
+            url (str): URL запиту
+            **kwargs: Додаткові параметри httpx (params тощо)
+            
+        Returns:
+            httpx.Response: Відповідь
+        """
+        kwargs.setdefault('timeout', self.request_timeout)
+        if self.request_headers:
+            kwargs.setdefault('headers', self.request_headers)
+        return await self.http_client.get(url, **kwargs)
     
     async def connect(self):
         """
-        Підключення до HTTP API біржі (запуск polling задач).
+        Підключення до HTTP API біржі.
+        Періодичні запити виконує планувальник (services.ingest_scheduler) через poll_once.
         """
         try:
             self.is_connected = True
             logger.info(f"{self.name}: HTTP client initialized")
-            
-            # Запуск задач для polling всіх токенів
-            for token in self.tokens:
-                await self.subscribe_to_orderbook(token)
-                
             return True
         except Exception as e:
             logger.error(f"{self.name}: Failed to initialize HTTP client: {str(e)}")
@@ -56,19 +88,9 @@ class HttpExchangeClient(BaseExchangeClient):
     
     async def disconnect(self):
         """
-        Відключення від HTTP API (зупинка polling задач).
+        Відключення від HTTP API.
         """
         try:
-            # Зупинка всіх задач polling
-            for token, task in self.polling_tasks.items():
-                if not task.done():
-                    task.cancel()
-                    
-            self.polling_tasks = {}
-            
-            # Закриття HTTP клієнта
-            await self.http_client.aclose()
-            
             self.is_connected = False
             logger.info(f"{self.name}: HTTP client closed")
             return True
@@ -78,72 +100,99 @@ class HttpExchangeClient(BaseExchangeClient):
     
     async def subscribe_to_orderbook(self, token: str):
         """
-        Підписка на оновлення ордербуку для конкретного токена (запуск polling задачі).
+        Підписка на оновлення ордербуку для конкретного токена.
+        HTTP API не має підписок: токен опитується планувальником, поки він у self.tokens.
         
         Args:
             token (str): Символ токена (наприклад, BTC, ETH)
         """
-        if token in self.polling_tasks:
-            # Якщо задача вже існує, але завершена - створюємо нову
-            if self.polling_tasks[token].done():
-                self.polling_tasks[token] = asyncio.create_task(self._poll_orderbook(token))
-        else:
-            # Створюємо нову задачу
-            self.polling_tasks[token] = asyncio.create_task(self._poll_orderbook(token))
-            
-        logger.info(f"{self.name}: Started polling for {token}")
+        logger.info(f"{self.name}: Polling for {token} is handled by the ingest scheduler")
     
     async def unsubscribe_from_orderbook(self, token: str):
         """
-        Відписка від оновлень ордербуку для конкретного токена (зупинка polling задачі).
+        Відписка від оновлень ордербуку для конкретного токена.
         
         Args:
             token (str): Символ токена (наприклад, BTC, ETH)
         """
-        if token in self.polling_tasks:
-            task = self.polling_tasks[token]
-            if not task.done():
-                task.cancel()
-                
-            del self.polling_tasks[token]
-            
-            if token in self.last_update_time:
-                del self.last_update_time[token]
-                
-            logger.info(f"{self.name}: Stopped polling for {token}")
+        self.last_update_time.pop(token, None)
+        self.poll_intervals.pop(token, None)
+        self._poll_fingerprints.pop(token, None)
+        logger.info(f"{self.name}: Stopped polling for {token}")
     
-    async def _poll_orderbook(self, token: str):
+    async def poll_once(self, token: str):
         """
-        Періодичне опитування API для оновлення ордербуку.
+        Один запит ордербуку токена (викликається планувальником).
+        Після запиту інтервал токена коригується залежно від того, чи змінилася книга.
         
         Args:
             token (str): Символ токена
         """
+        changed = False
         try:
-            while self.is_connected:
-                try:
-                    # Отримання і обробка даних ордербуку
-                    orderbook = await self.get_orderbook(token)
-                    if orderbook:
-                        self.orderbooks[token] = orderbook
-                        self.last_update_time[token] = time.time()
-                        logger.info(f"{self.name}: Updated orderbook for {token}")
-                    else:
-                        logger.warning(f"{self.name}: No orderbook data received for {token}")
-                        
-                except Exception as e:
-                    logger.error(f"{self.name}: Error polling orderbook for {token}: {str(e)}")
-                    # Очищення ордербуку при помилці
-                    if token in self.orderbooks:
-                        self.orderbooks[token] = {'asks': [], 'bids': [], 'best_sell': 'X X X', 'best_buy': 'X X X'}
-                
-                # Очікування перед наступним запитом
-                await asyncio.sleep(self.polling_interval)
-                
-        except asyncio.CancelledError:
-            logger.info(f"{self.name}: Polling task for {token} cancelled")
-        except Exception as e:
-            logger.error(f"{self.name}: Polling task for {token} failed: {str(e)}")
+            # get_orderbook сам оновлює локальний ордербук токена
+            orderbook = await self.get_orderbook(token)
+            if orderbook:
+                self.last_update_time[token] = time.time()
+                changed = self._book_changed(token)
+                hot_log.debug("%s: Updated orderbook for %s", self.name, token)
+            else:
+                logger.warning(f"{self.name}: No orderbook data received for {token}")
+        except Exception:
+            # Очищення ордербуку при помилці, щоб не показувати застарілі ціни
+            book = self.get_book(token)
+            if book is not None:
+                book.clear()
+            raise
+        finally:
+            self._adapt_interval(token, changed)
+    
+    def next_poll_interval(self, token: str) -> float:
+        """
+        Інтервал до наступного запиту для токена з урахуванням бюджету запитів біржі.
+        Якщо сумарна частота запитів усіх токенів перевищує request_budget,
+        інтервали всіх токенів пропорційно збільшуються.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            float: Інтервал у секундах
+        """
+        interval = self.poll_intervals.get(token, self.polling_interval)
+        if self.request_budget <= 0:
+            return interval
+        
+        demand = sum(1 / self.poll_intervals.get(t, self.polling_interval) for t in self.tokens)
+        return interval * max(1.0, demand / self.request_budget)
+    
+    def _book_changed(self, token: str) -> bool:
+        """
+        Порівняння книги токена з відповіддю попереднього запиту.
+        
+        Args:
+            token (str): Символ токена
+            
+        Returns:
+            bool: True, якщо рівні книги змінилися
+        """
+        book = self.get_book(token)
+        fingerprint = (book.top_asks(), book.top_bids()) if book is not None else None
+        previous = self._poll_fingerprints.get(token)
+        self._poll_fingerprints[token] = fingerprint
+        return fingerprint != previous
+    
+    def _adapt_interval(self, token: str, changed: bool):
+        """
+        Прискорення опитування токена після зміни книги і сповільнення після однакових відповідей.
+        
+        Args:
+            token (str): Символ токена
+            changed (bool): Чи змінилася книга
+        """
+        interval = self.poll_intervals.get(token, self.polling_interval)
+        interval *= self.polling_speedup if changed else self.polling_backoff
+        self.poll_intervals[token] = min(self.max_polling_interval, max(self.min_polling_interval, interval))
     
     def get_endpoint_url(self, token: str) -> str:
         """
@@ -172,10 +221,10 @@ class HttpExchangeClient(BaseExchangeClient):
         Args:
             token (str): Символ токена
         """
-        self.orderbooks[token] = {'asks': [], 'bids': []}
+        self._ensure_book(self.book_key(token)).clear()
         logger.error(f"{self.name}: The method _fetch_and_process_orderbook must be implemented in derived classes")
 
-    async def get_orderbook(self, token: str) -> Dict[str, List]:
+    async def _fetch_orderbook(self, token: str) -> Dict[str, List]:
         """
         Отримання поточного стану ордербуку для токена.
         
@@ -185,47 +234,7 @@ class HttpExchangeClient(BaseExchangeClient):
         Returns:
             Dict[str, List]: Словник з asks і bids
         """
-        return self.orderbooks.get(token, {'asks': [], 'bids': []})
-
-    def get_best_prices(self, token: str, threshold: float = 5.0) -> Tuple[str, str]:
-        """
-        Отримання найкращих цін для токена з урахуванням кумулятивного обсягу.
-        
-        Args:
-            token (str): Символ токена
-            threshold (float): Поріг кумулятивного обсягу
-            
-        Returns:
-            Tuple[str, str]: (best_sell, best_buy)
-        """
-        if token not in self.orderbooks:
-            return "X X X", "X X X"
-            
-        orderbook = self.orderbooks[token]
-        asks = orderbook.get('asks', [])
-        bids = orderbook.get('bids', [])
-        
-        if not asks or not bids:
-            return "X X X", "X X X"
-            
-        # Розрахунок кумулятивного обсягу
-        cumulative_volume = 0
-        best_sell = None
-        best_buy = None
-        
-        for ask in asks:
-            price, volume = float(ask[0]), float(ask[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                best_sell = f"{price:.8f}"
-                break
-                
-        cumulative_volume = 0
-        for bid in bids:
-            price, volume = float(bid[0]), float(bid[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                best_buy = f"{price:.8f}"
-                break
-                
-        return best_sell or "X X X", best_buy or "X X X"
\ No newline at end of file
+        book = self.get_book(token)
+        if book is None:
+            return {'asks': [], 'bids': []}
+        return book.to_dict()
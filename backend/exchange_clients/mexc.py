@@ -1,18 +1,27 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List
 import websockets
 import aiohttp
-from exchange_clients.base_client import BaseExchangeClient
+from config import PUSH_STALE_AFTER
+from exchange_clients.base_client import BaseExchangeClient, BulkBboMixin
+from exchange_clients.frame_decoder import FrameDecoder
+from exchange_clients.orderbook import OrderBook
+from utils import log
 
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
 
-class MEXCClient(BaseExchangeClient):
+class MEXCClient(BulkBboMixin, BaseExchangeClient):
     """
     Клієнт для біржі MEXC.
     """
     
+    # Зміни книги з потоку біржі надходять у менеджер подіями
+    push_updates = True
+    
     def __init__(self, name: str, url: str, config: Dict[str, Any] = None):
         super().__init__(name, url, config)
         self.ws = None
@@ -26,17 +35,42 @@ class MEXCClient(BaseExchangeClient):
         self.orderbooks = {}
         self.tokens = []
         self.is_connected = False
-        self.http_client = aiohttp.ClientSession()
         self._recv_lock = asyncio.Lock()
+        self.decoder = FrameDecoder()  # Розбір вхідних кадрів (orjson, якщо встановлений)
+        # Режим глибини: "limit" - знімки верхніх рівнів (5), "diff" - інкрементальний канал,
+        # синхронізований з одним REST-знімком за номером версії
+        self.depth_mode = config.get('depth_mode', 'limit')
+        self.depth_snapshot_limit = config.get('depth_snapshot_limit', 1000)
+        # Максимальна кількість diff-подій у буфері до синхронізації; при переповненні буфер
+        # відкидається і синхронізація починається заново
+        self.depth_buffer_limit = config.get('depth_buffer_limit', 1000)
+        # Стан синхронізації diff-глибини {symbol: {'synced': bool, 'buffer': [...], 'task': Task}}
+        self._depth_sync: Dict[str, Dict[str, Any]] = {}
+        # Час останнього знімка limit-глибини з потоку {symbol: timestamp}
+        self._stream_updated: Dict[str, float] = {}
+        # Книги без живого потоку оновлюються найкращими цінами всіх ринків одним запитом bookTicker
+        self.bulk_bbo = config.get('bulk_bbo', False)
+    
+    @property
+    def http_client(self) -> aiohttp.ClientSession:
+        """Спільна aiohttp-сесія транспорту."""
+        return self.transport.session()
         
     async def connect(self):
         try:
             self.ws = await websockets.connect(self.url)
             self.is_connected = True
             self.reconnect_attempts = 0
+            # Після перепідключення diff-книги потрібно синхронізувати заново
+            self._reset_depth_sync()
             self.ping_task = asyncio.create_task(self._ping())
             self.listen_task = asyncio.create_task(self.listen())
             logger.info(f"{self.name}: Connected to WebSocket")
+            
+            # Підписка існує лише в межах з'єднання: токени, додані до підключення
+            # або до розриву, підписуємо заново
+            for token in list(self.tokens):
+                await self.subscribe(token, "public.limit.depth.v3.api", self._handle_depth_update)
             return True
         except Exception as e:
             logger.error(f"{self.name}: Failed to connect to WebSocket: {str(e)}")
@@ -51,8 +85,6 @@ class MEXCClient(BaseExchangeClient):
                 self.listen_task.cancel()
             if self.ws:
                 await self.ws.close()
-            if self.http_client:
-                await self.http_client.close()
             self.is_connected = False
             logger.info(f"{self.name}: Disconnected from WebSocket")
             return True
@@ -64,12 +96,13 @@ class MEXCClient(BaseExchangeClient):
         if not self.ws:
             await self.connect()
         subscription_key = f"{symbol}_{channel}"
-        if subscription_key not in self.callbacks:
-            self.callbacks[subscription_key] = []
-        self.callbacks[subscription_key].append(callback)
+        callbacks = self.callbacks.setdefault(subscription_key, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
         subscribe_template = self.config.get("subscribe_template", {
             "method": "SUBSCRIPTION",
-            "params": ["spot@public.limit.depth.v3.api@$TOKEN_USDT@5"]
+            "params": [self._depth_channel("$TOKENUSDT") if self.depth_mode == "diff"
+                       else "spot@public.limit.depth.v3.api@$TOKEN_USDT@5"]
         })
         params = [param.replace("$TOKEN", symbol) for param in subscribe_template["params"]]
         subscribe_message = {
@@ -83,68 +116,122 @@ class MEXCClient(BaseExchangeClient):
         except Exception as e:
             logger.error(f"{self.name}: Помилка при підписці на {subscription_key}: {e}")
 
-    async def get_orderbook(self, token: str) -> Dict[str, Any]:
+    async def _fetch_orderbook(self, token: str) -> Dict[str, Any]:
         try:
             # Переконуємось, що символ має формат, наприклад, BTCUSDT
             symbol = token if token.endswith("USDT") else f"{token}USDT"
-            logger.info(f"Getting orderbook for {symbol} on MEXC")
-            url = "https://api.mexc.com/api/v3/depth"
-            params = {"symbol": symbol, "limit": 100}
-            async with self.http_client.get(url, params=params) as response:
-                response_data = await response.json()
-                if response_data and 'bids' in response_data and 'asks' in response_data:
-                    best_buy = float(response_data['bids'][0][0]) if response_data['bids'] else 'X X X'
-                    best_sell = float(response_data['asks'][0][0]) if response_data['asks'] else 'X X X'
-                    
-                    # Форматуємо ціни в залежності від їх значення
-                    if best_buy != 'X X X':
-                        if best_buy >= 1000:
-                            best_buy = f"{best_buy:.2f}"
-                        elif best_buy >= 100:
-                            best_buy = f"{best_buy:.3f}"
-                        elif best_buy >= 10:
-                            best_buy = f"{best_buy:.4f}"
-                        elif best_buy >= 1:
-                            best_buy = f"{best_buy:.5f}"
-                        elif best_buy >= 0.1:
-                            best_buy = f"{best_buy:.6f}"
-                        elif best_buy >= 0.01:
-                            best_buy = f"{best_buy:.7f}"
-                        else:
-                            best_buy = f"{best_buy:.8f}"
-                            
-                    if best_sell != 'X X X':
-                        if best_sell >= 1000:
-                            best_sell = f"{best_sell:.2f}"
-                        elif best_sell >= 100:
-                            best_sell = f"{best_sell:.3f}"
-                        elif best_sell >= 10:
-                            best_sell = f"{best_sell:.4f}"
-                        elif best_sell >= 1:
-                            best_sell = f"{best_sell:.5f}"
-                        elif best_sell >= 0.1:
-                            best_sell = f"{best_sell:.6f}"
-                        elif best_sell >= 0.01:
-                            best_sell = f"{best_sell:.7f}"
-                        else:
-                            best_sell = f"{best_sell:.8f}"
-                    
-                    logger.info(f"Received orderbook data for {symbol}: sell={best_sell}, buy={best_buy}")
-                    return {
-                        'best_sell': best_sell,
-                        'best_buy': best_buy,
-                        'asks': response_data['asks'],
-                        'bids': response_data['bids']
-                    }
-                return None
+
+            # У diff-режимі синхронізована локальна книга вже актуальна - REST не потрібен
+            if self.depth_mode == "diff" and self._is_depth_synced(symbol):
+                return self._orderbook_payload(self.orderbooks[symbol])
+
+            hot_log.debug("Getting orderbook for %s on MEXC", symbol)
+            response_data = await self._fetch_depth_snapshot(symbol, 100)
+            if response_data and 'bids' in response_data and 'asks' in response_data:
+                if self.depth_mode == "diff":
+                    # diff-книгу заповнює лише синхронізація за номером версії (вона могла завершитися під час
+                    # запиту), тож REST-знімок у неї не записуємо, а лише повертаємо
+                    if self._is_depth_synced(symbol):
+                        return self._orderbook_payload(self.orderbooks[symbol])
+                    scale = self.market_scale(symbol)
+                    book = OrderBook(scale)
+                    book.load_snapshot(self._parse_levels(response_data['asks'], scale),
+                                       self._parse_levels(response_data['bids'], scale))
+                else:
+                    # Оновлюємо локальний ордербук знімком з REST API
+                    book = self._load_snapshot(symbol, response_data['asks'], response_data['bids'])
+                payload = self._orderbook_payload(book)
+                hot_log.debug("Received orderbook data for %s: sell=%s, buy=%s", symbol, payload['best_sell'], payload['best_buy'])
+                return payload
+            return None
         except Exception as e:
             logger.error(f"Error getting orderbook for {token} on MEXC: {str(e)}")
             return None
 
+    async def _fetch_depth_snapshot(self, symbol: str, limit: int) -> Dict[str, Any]:
+        """
+        Запит знімка глибини через REST API.
+
+        Args:
+            symbol (str): Символ ринку (наприклад, BTCUSDT)
+            limit (int): Кількість рівнів
+
+        Returns:
+            Dict[str, Any]: Відповідь біржі з asks, bids та lastUpdateId
+        """
+        url = "https://api.mexc.com/api/v3/depth"
+        params = {"symbol": symbol, "limit": limit}
+        timeout = self.transport.aiohttp_timeout(self.request_timeout)
+        async with self.http_client.get(url, params=params, timeout=timeout) as response:
+            return await response.json()
+
     async def get_ticker(self, token: str) -> Dict:
-        async with self.http_client.get("https://api.mexc.com/api/v3/ticker/24hr", params={"symbol": token}) as response:
+        timeout = self.transport.aiohttp_timeout(self.request_timeout)
+        async with self.http_client.get("https://api.mexc.com/api/v3/ticker/24hr", params={"symbol": token},
+                                        timeout=timeout) as response:
+            return await response.json()
+
+    async def get_bulk_bbo(self, tokens: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Найкращі ціни відстежуваних токенів з одного запиту bookTicker для всіх ринків.
+
+        Args:
+            tokens (List[str]): Символи токенів
+
+        Returns:
+            Dict[str, Dict[str, Any]]: {token: {'best_sell', 'best_buy', 'asks', 'bids'}},
+                asks і bids - верхній рівень у форматі біржі
+        """
+        # Одночасні цикли оновлення використовують одну відповідь
+        tickers = await self.orderbook_flight.run("*bookTicker", self._fetch_book_tickers)
+        by_symbol = {ticker.get("symbol"): ticker for ticker in tickers or []}
+
+        prices = {}
+        for token in tokens:
+            symbol = self.book_key(token)
+            ticker = by_symbol.get(symbol)
+            if ticker is None:
+                continue
+            scale = self.market_scale(symbol)
+            ask_price, bid_price = ticker.get("askPrice") or 0, ticker.get("bidPrice") or 0
+            ask = scale.parse_price(ask_price)
+            bid = scale.parse_price(bid_price)
+            if ask <= 0 or bid <= 0:
+                continue
+            prices[token] = {
+                'best_sell': scale.display_price(ask),
+                'best_buy': scale.display_price(bid),
+                'asks': [[ask_price, ticker.get("askQty") or 0]],
+                'bids': [[bid_price, ticker.get("bidQty") or 0]]
+            }
+        hot_log.debug("%s: bookTicker: %d ринків, відстежуваних з цінами: %d", self.name, len(by_symbol), len(prices))
+        return prices
+
+    async def _fetch_book_tickers(self) -> List[Dict[str, Any]]:
+        """Запит найкращих цін усіх ринків (GET /api/v3/ticker/bookTicker без символу)."""
+        timeout = self.transport.aiohttp_timeout(self.request_timeout)
+        async with self.http_client.get("https://api.mexc.com/api/v3/ticker/bookTicker", timeout=timeout) as response:
             return await response.json()
 
+    def has_live_stream(self, token: str) -> bool:
+        """
+        Перевірка, чи книга токена оновлюється потоком: у diff-режимі - книга синхронізована,
+        у limit-режимі - знімок з потоку надходив не раніше ніж push_stale_after секунд тому.
+
+        Args:
+            token (str): Символ токена
+
+        Returns:
+            bool: True, якщо з'єднання активне і потік книги не зупинився
+        """
+        if not self.is_connected:
+            return False
+        symbol = self.book_key(token)
+        if self.depth_mode == "diff":
+            return self._is_depth_synced(symbol)
+        max_age = self.config.get('push_stale_after', PUSH_STALE_AFTER)
+        return time.time() - self._stream_updated.get(symbol, 0) <= max_age
+
     async def listen(self):
         while self.is_connected:
             try:
@@ -160,12 +247,15 @@ class MEXCClient(BaseExchangeClient):
 
     async def _process_message(self, message: str):
         try:
-            data = json.loads(message)
+            # Кадри ринків, які не відстежуються, відкидаємо без розбору
+            if self.decoder.skip_untracked(message, "s"):
+                return
+            data = self.decoder.loads(message)
             if "id" in data and "result" in data:
                 logger.info(f"{self.name}: Підписка підтверджена: {data}")
                 return
-            if "channel" in data:
-                channel = data["channel"]
+            if "channel" in data or "c" in data:
+                channel = data.get("channel") or data["c"]
                 symbol = data.get("s")
                 subscription_key = f"{symbol}_{channel}"
                 if subscription_key in self.callbacks:
@@ -174,7 +264,9 @@ class MEXCClient(BaseExchangeClient):
                             await callback(data)
                         except Exception as e:
                             logger.error(f"{self.name}: Помилка при виклику callback для {subscription_key}: {e}")
-                if channel == "public.limit.depth.v3.api":
+                if "increase.depth" in channel:
+                    await self._handle_diff_depth(data)
+                elif "limit.depth" in channel:
                     await self._handle_depth_update(data)
         except json.JSONDecodeError:
             logger.error(f"{self.name}: Помилка декодування JSON: {message}")
@@ -184,28 +276,183 @@ class MEXCClient(BaseExchangeClient):
 
     async def _handle_depth_update(self, data: Dict[str, Any]):
         try:
-            logger.info(f"{self.name}: Отримано оновлення даних: {data}")
+            hot_log.payload("%s: Отримано оновлення даних: %s", self.name, data)
             if "s" not in data:
                 logger.error(f"{self.name}: Відсутній символ в даних: {data}")
                 return
             symbol = data["s"]
-            if symbol not in self.orderbooks:
-                self.orderbooks[symbol] = {"asks": [], "bids": [], "last_update": 0}
-                logger.info(f"{self.name}: Створено новий ордербук для {symbol}")
             asks = data.get("d", {}).get("asks", [])
             bids = data.get("d", {}).get("bids", [])
             if not asks and not bids:
                 logger.warning(f"{self.name}: Отримано пусті дані для {symbol}")
                 return
-            # Сортування: bids за спаданням ціни, asks за зростанням; але для відображення asks – використаємо зворотній порядок
-            self.orderbooks[symbol]["asks"] = sorted(asks, key=lambda x: float(x["p"]))
-            self.orderbooks[symbol]["bids"] = sorted(bids, key=lambda x: float(x["p"]), reverse=True)
-            self.orderbooks[symbol]["last_update"] = data.get("t", 0)
-            logger.info(f"{self.name}: Оновлено ордербук для {symbol}. Кількість asks: {len(asks)}, bids: {len(bids)}")
+            # Канал limit.depth щоразу надсилає повний стан верхніх рівнів, тож замінюємо книгу цілком;
+            # сортування виконує рушій ордербуку
+            self._load_snapshot(symbol, asks, bids)
+            self._stream_updated[symbol] = time.time()
+            hot_log.debug("%s: Оновлено ордербук для %s. Кількість asks: %d, bids: %d", self.name, symbol, len(asks), len(bids))
         except Exception as e:
             logger.error(f"{self.name}: Помилка при обробці оновлення ордербука: {e}")
             logger.error(f"{self.name}: Дані, що викликали помилку: {data}")
 
+    def _depth_channel(self, symbol: str) -> str:
+        """
+        Назва каналу глибини для символу відповідно до режиму.
+
+        Args:
+            symbol (str): Символ ринку (наприклад, BTCUSDT)
+
+        Returns:
+            str: Канал для підписки
+        """
+        if self.depth_mode == "diff":
+            return f"spot@public.increase.depth.v3.api@{symbol}"
+        return f"spot@public.limit.depth.v3.api@{symbol}@5"
+
+    def _reset_depth_sync(self):
+        """Скидання стану синхронізації всіх diff-книг."""
+        for state in self._depth_sync.values():
+            task = state.get('task')
+            if task and not task.done():
+                task.cancel()
+        self._depth_sync = {}
+
+    def _is_depth_synced(self, symbol: str) -> bool:
+        """Перевірка, чи diff-книга символу синхронізована зі знімком."""
+        state = self._depth_sync.get(symbol)
+        return bool(state and state['synced'])
+
+    async def _handle_diff_depth(self, data: Dict[str, Any]):
+        """
+        Обробка інкрементального оновлення глибини (канал increase.depth).
+
+        До синхронізації події буферизуються (не більше depth_buffer_limit), а знімок
+        запитується один раз. Після синхронізації версії мають йти без пропусків,
+        інакше книга синхронізується заново.
+        """
+        symbol = data.get("s")
+        depth = data.get("d", {})
+        if not symbol or "r" not in depth:
+            logger.error(f"{self.name}: Некоректне diff-оновлення глибини: {data}")
+            return
+
+        version = int(depth["r"])
+        state = self._depth_sync.setdefault(symbol, {'synced': False, 'buffer': [], 'task': None})
+
+        if not state['synced']:
+            if len(state['buffer']) >= self.depth_buffer_limit:
+                logger.warning(f"{self.name}: Буфер diff-оновлень для {symbol} переповнений "
+                               f"({len(state['buffer'])}). Повторна синхронізація...")
+                self._restart_depth_sync(symbol, state, version, depth)
+                return
+            state['buffer'].append((version, depth))
+            if state['task'] is None or state['task'].done():
+                state['task'] = asyncio.create_task(self._sync_depth_snapshot(symbol))
+            return
+
+        book = self.orderbooks[symbol]
+        if version <= book.sequence:
+            return
+        if version != book.sequence + 1:
+            logger.warning(f"{self.name}: Пропуск версій для {symbol}: очікували {book.sequence + 1}, "
+                           f"отримали {version}. Повторна синхронізація...")
+            self._restart_depth_sync(symbol, state, version, depth)
+            return
+
+        self._apply_depth_diff(symbol, book, version, depth)
+
+    def _restart_depth_sync(self, symbol: str, state: Dict[str, Any], version: int, depth: Dict[str, Any]):
+        """
+        Синхронізація diff-книги заново: попередній запит знімка скасовується, буфер
+        починається з поточної події.
+
+        Args:
+            symbol (str): Символ ринку
+            state (Dict[str, Any]): Стан синхронізації символу
+            version (int): Версія поточної події
+            depth (Dict[str, Any]): Дані поточної події
+        """
+        task = state['task']
+        if task is not None and not task.done():
+            task.cancel()
+        state['synced'] = False
+        state['buffer'] = [(version, depth)]
+        state['task'] = asyncio.create_task(self._sync_depth_snapshot(symbol))
+
+    def _apply_depth_diff(self, symbol: str, book: OrderBook, version: int, depth: Dict[str, Any]):
+        """
+        Застосування змінених рівнів до книги (нульовий обсяг видаляє рівень).
+
+        Args:
+            symbol (str): Символ ринку
+            book (OrderBook): Ордербук
+            version (int): Версія оновлення
+            depth (Dict[str, Any]): Дані оновлення з asks і bids
+        """
+        changed = False
+        for price, amount in self._parse_levels(depth.get("asks", []), book.scale):
+            changed |= book.update_ask(price, amount)
+        for price, amount in self._parse_levels(depth.get("bids", []), book.scale):
+            changed |= book.update_bid(price, amount)
+        book.sequence = version
+        if changed:
+            self._notify_book_update(symbol)
+
+    async def _sync_depth_snapshot(self, symbol: str):
+        """
+        Синхронізація diff-книги: один REST-знімок + буферизовані події з вищими версіями.
+        Якщо знімок відстає від потоку, запит повторюється із затримкою; якщо знімок
+        отримати не вдалося, буфер відкидається.
+
+        Args:
+            symbol (str): Символ ринку (наприклад, BTCUSDT)
+        """
+        try:
+            while symbol in self._depth_sync:
+                snapshot = await self._fetch_depth_snapshot(symbol, self.depth_snapshot_limit)
+                state = self._depth_sync.get(symbol)
+                if state is None:
+                    return
+                if not snapshot or "lastUpdateId" not in snapshot:
+                    logger.error(f"{self.name}: Не вдалося отримати знімок глибини для {symbol}: {snapshot}")
+                    # Наступний знімок буде новішим за буферизовані події - не накопичуємо їх
+                    state['buffer'] = []
+                    await asyncio.sleep(self.reconnect_interval)
+                    continue
+
+                book = self._load_snapshot(symbol, snapshot.get('asks', []), snapshot.get('bids', []))
+                book.sequence = int(snapshot["lastUpdateId"])
+
+                # Відкидаємо події, які вже враховані в знімку, решта має йти без пропусків
+                lagging = False
+                for version, depth in sorted(state['buffer'], key=lambda item: item[0]):
+                    if version <= book.sequence:
+                        continue
+                    if version != book.sequence + 1:
+                        lagging = True
+                        break
+                    self._apply_depth_diff(symbol, book, version, depth)
+
+                if lagging:
+                    logger.warning(f"{self.name}: Знімок для {symbol} відстає від потоку "
+                                   f"(версія знімка {snapshot['lastUpdateId']}), повторюємо")
+                    state['buffer'] = [item for item in state['buffer'] if item[0] > book.sequence]
+                    await asyncio.sleep(1)
+                    continue
+
+                state['buffer'] = []
+                state['synced'] = True
+                logger.info(f"{self.name}: Diff-книгу {symbol} синхронізовано на версії {book.sequence}")
+                return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"{self.name}: Помилка синхронізації глибини для {symbol}: {e}")
+            # Наступна подія запустить синхронізацію заново з порожнім буфером
+            state = self._depth_sync.get(symbol)
+            if state is not None:
+                state['buffer'] = []
+
     async def _ping(self):
         while self.is_connected:
             try:
@@ -225,82 +472,35 @@ class MEXCClient(BaseExchangeClient):
             logger.error(f"{self.name}: Max reconnection attempts reached")
             self.is_connected = False
 
+    def book_key(self, token: str) -> str:
+        """Ордербуки MEXC зберігаються за символом ринку (наприклад, BTCUSDT)."""
+        return token if token.endswith("USDT") else f"{token}USDT"
+
     async def add_token(self, token: str):
         if token not in self.tokens:
             self.tokens.append(token)
+            self.decoder.track(self.book_key(token))
             logger.info(f"{self.name}: Added token {token}")
             if self.is_connected:
                 await self.subscribe(token, "public.limit.depth.v3.api", self._handle_depth_update)
-            symbol = f"{token}USDT"
+            symbol = self.book_key(token)
+            # get_orderbook завантажує початковий знімок у локальну книгу
             orderbook = await self.get_orderbook(symbol)
             if orderbook:
-                self.orderbooks[symbol] = {
-                    "asks": orderbook.get("asks", []),
-                    "bids": orderbook.get("bids", []),
-                    "last_update": 0
-                }
                 logger.info(f"{self.name}: Initial orderbook loaded for {symbol}")
 
     async def remove_token(self, token: str):
         if token in self.tokens:
             self.tokens.remove(token)
+            self.decoder.untrack(self.book_key(token))
+            self._stream_updated.pop(self.book_key(token), None)
+            self.bbo_tops.pop(self.book_key(token), None)
+            # Без стану синхронізації запущений запит знімка завершує цикл
+            state = self._depth_sync.pop(self.book_key(token), None)
+            if state and state['task'] and not state['task'].done():
+                state['task'].cancel()
             logger.info(f"{self.name}: Removed token {token}")
 
-    def get_best_prices(self, token: str, threshold: float = 5.0) -> tuple:
-        symbol = f"{token}USDT"
-        if symbol not in self.orderbooks:
-            return "X X X", "X X X"
-        orderbook = self.orderbooks[symbol]
-        asks = orderbook.get('asks', [])
-        bids = orderbook.get('bids', [])
-        if not asks or not bids:
-            return "X X X", "X X X"
-        cumulative_volume = 0
-        best_sell = None
-        best_buy = None
-        for ask in asks:
-            price, volume = float(ask[0]), float(ask[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                # Форматуємо ціну в залежності від її значення
-                if price >= 1000:
-                    best_sell = f"{price:.2f}"
-                elif price >= 100:
-                    best_sell = f"{price:.3f}"
-                elif price >= 10:
-                    best_sell = f"{price:.4f}"
-                elif price >= 1:
-                    best_sell = f"{price:.5f}"
-                elif price >= 0.1:
-                    best_sell = f"{price:.6f}"
-                elif price >= 0.01:
-                    best_sell = f"{price:.7f}"
-                else:
-                    best_sell = f"{price:.8f}"
-                break
-        cumulative_volume = 0
-        for bid in bids:
-            price, volume = float(bid[0]), float(bid[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                # Форматуємо ціну в залежності від її значення
-                if price >= 1000:
-                    best_buy = f"{price:.2f}"
-                elif price >= 100:
-                    best_buy = f"{price:.3f}"
-                elif price >= 10:
-                    best_buy = f"{price:.4f}"
-                elif price >= 1:
-                    best_buy = f"{price:.5f}"
-                elif price >= 0.1:
-                    best_buy = f"{price:.6f}"
-                elif price >= 0.01:
-                    best_buy = f"{price:.7f}"
-                else:
-                    best_buy = f"{price:.8f}"
-                break
-        return best_sell or "X X X", best_buy or "X X X"
-
     async def subscribe_to_orderbook(self, token: str):
         if self.is_connected:
             await self.subscribe(token, "public.limit.depth.v3.api", self._handle_depth_update)
@@ -311,10 +511,13 @@ class MEXCClient(BaseExchangeClient):
             symbol = f"{token}USDT"
             unsubscribe_message = {
                 "method": "UNSUBSCRIBE",
-                "params": [f"spot@public.limit.depth.v3.api@{symbol}@5"],
+                "params": [self._depth_channel(symbol)],
                 "id": len(self.subscriptions) + 1
             }
             await self.ws.send(json.dumps(unsubscribe_message))
+            state = self._depth_sync.pop(symbol, None)
+            if state and state['task'] and not state['task'].done():
+                state['task'].cancel()
             logger.info(f"{self.name}: Unsubscribed from orderbook for {token}")
 
     async def close(self):
@@ -0,0 +1,557 @@
+"""
+Спільний рушій ордербуку для всіх клієнтів бірж.
+
+Рівні цін зберігаються в компактних паралельних масивах, відсортованих так,
+що найкращий рівень кожної сторони завжди знаходиться в кінці масиву.
+Пошук рівня - бінарний (O(log n)), а вставки та видалення біля верхівки книги,
+де відбувається більшість змін, зводяться до операцій у кінці масиву.
+
+Ціни та обсяги зберігаються як цілі числа в одиницях кроку ціни (tick) та
+кроку обсягу (lot) ринку. Рядки біржі розбираються один раз при надходженні
+кадру, а назад у рядки числа форматуються лише при серіалізації для клієнтів.
+"""
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils import log
+
+hot_log = log.get_logger(__name__)
+
+# Рівень ордербуку: (ціна в тіках, обсяг у лотах)
+Level = Tuple[int, int]
+
+# Точність за замовчуванням для ринків без налаштованих tick_size / lot_size
+DEFAULT_PRICE_DECIMALS = 12
+DEFAULT_SIZE_DECIMALS = 8
+
+# Найбільше значення тіків і лотів, яке вміщують масиви сторін книги (int64, array('q'))
+MAX_UNITS = 2 ** 63 - 1
+
+
+def _step_decimals(step: Any) -> int:
+    """
+    Кількість знаків після коми в кроці ціни або обсягу ("0.01" -> 2).
+
+    Args:
+        step (Any): Крок у вигляді рядка або числа
+
+    Returns:
+        int: Кількість десяткових знаків
+    """
+    exponent = Decimal(str(step)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+def _to_units(value: Any, decimals: int) -> int:
+    """
+    Точне перетворення десяткового значення в ціле число одиниць 10^-decimals.
+
+    Рядки без експоненти (звичайний формат бірж) розбираються без Decimal;
+    зайві знаки округлюються до найближчої одиниці.
+
+    Args:
+        value (Any): Значення (рядок, int або float)
+        decimals (int): Кількість десяткових знаків одиниці
+
+    Returns:
+        int: Кількість одиниць
+    """
+    if isinstance(value, str):
+        text = value.strip()
+        if 'e' not in text and 'E' not in text:
+            negative = text.startswith('-')
+            if negative or text.startswith('+'):
+                text = text[1:]
+            whole, _, frac = text.partition('.')
+            if len(frac) > decimals:
+                rest = frac[decimals:]
+                if not rest.isdigit():
+                    raise ValueError(f"Invalid decimal value: {value!r}")
+                units = int((whole or '0') + frac[:decimals]) + (rest[0] >= '5')
+            else:
+                units = int((whole or '0') + frac.ljust(decimals, '0'))
+            return -units if negative else units
+        number = Decimal(text)
+    elif isinstance(value, int):
+        return value * 10 ** decimals
+    else:
+        # repr(float) - найкоротший рядок, що однозначно відповідає числу
+        number = Decimal(repr(float(value)))
+    return int(number.scaleb(decimals).to_integral_value(ROUND_HALF_UP))
+
+
+def _format_units(units: int, decimals: int) -> str:
+    """
+    Точне форматування цілого числа одиниць у десятковий рядок без зайвих нулів.
+
+    Args:
+        units (int): Кількість одиниць
+        decimals (int): Кількість десяткових знаків одиниці
+
+    Returns:
+        str: Десятковий рядок (наприклад, "101.5")
+    """
+    if not decimals:
+        return str(units)
+    sign = '-' if units < 0 else ''
+    whole, frac = divmod(abs(units), 10 ** decimals)
+    if not frac:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{str(frac).rjust(decimals, '0').rstrip('0')}"
+
+
+def format_display_price(price: float) -> str:
+    """
+    Форматування ціни для відображення: кількість знаків залежить від величини ціни.
+
+    Args:
+        price (float): Ціна
+
+    Returns:
+        str: Відформатована ціна
+    """
+    if price >= 1000:
+        return f"{price:.2f}"
+    elif price >= 100:
+        return f"{price:.3f}"
+    elif price >= 10:
+        return f"{price:.4f}"
+    elif price >= 1:
+        return f"{price:.5f}"
+    elif price >= 0.1:
+        return f"{price:.6f}"
+    elif price >= 0.01:
+        return f"{price:.7f}"
+    else:
+        return f"{price:.8f}"
+
+
+class MarketScale:
+    """
+    Масштаб цілочисельного представлення цін і обсягів одного ринку.
+
+    Ціна зберігається як кількість тіків (10^-price_decimals), обсяг - як
+    кількість лотів (10^-size_decimals). Порівняння таких чисел точні, тож
+    зміни книги визначаються без похибок float.
+    """
+
+    __slots__ = ('price_decimals', 'size_decimals', 'price_factor', 'size_factor')
+
+    def __init__(self, price_decimals: int = DEFAULT_PRICE_DECIMALS, size_decimals: int = DEFAULT_SIZE_DECIMALS):
+        """
+        Ініціалізація масштабу.
+
+        Args:
+            price_decimals (int): Кількість знаків після коми в кроці ціни
+            size_decimals (int): Кількість знаків після коми в кроці обсягу
+        """
+        self.price_decimals = price_decimals
+        self.size_decimals = size_decimals
+        self.price_factor = 10 ** price_decimals
+        self.size_factor = 10 ** size_decimals
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> 'MarketScale':
+        """
+        Створення масштабу з налаштувань ринку.
+
+        Підтримуються ключі tick_size / lot_size (наприклад, "0.01") або
+        price_decimals / size_decimals. Відсутні значення беруться за замовчуванням.
+
+        Args:
+            config (Optional[Dict[str, Any]]): Налаштування ринку
+
+        Returns:
+            MarketScale: Масштаб ринку
+        """
+        config = config or {}
+        price_decimals = config.get('price_decimals', DEFAULT_PRICE_DECIMALS)
+        size_decimals = config.get('size_decimals', DEFAULT_SIZE_DECIMALS)
+        if 'tick_size' in config:
+            price_decimals = _step_decimals(config['tick_size'])
+        if 'lot_size' in config:
+            size_decimals = _step_decimals(config['lot_size'])
+        return cls(price_decimals, size_decimals)
+
+    def parse_price(self, value: Any) -> int:
+        """Розбір ціни у тіки."""
+        return _to_units(value, self.price_decimals)
+
+    def parse_size(self, value: Any) -> int:
+        """Розбір обсягу в лоти."""
+        return _to_units(value, self.size_decimals)
+
+    def parse_level(self, level: Any) -> Level:
+        """
+        Розбір рівня ордербуку з будь-якого формату, який надсилають біржі.
+
+        Підтримуються формати:
+          - [price, amount] / (price, amount)
+          - {"price": ..., "quantity": ...} або {"price": ..., "amount": ...}
+          - {"p": ..., "v": ...} (MEXC)
+
+        Обсяг, що не вміщується в int64-масиви книги, обмежується MAX_UNITS, щоб рівень лишився в книзі
+        (інакше пропущений рівень інкрементального потоку назавжди лишив би книгу неповною).
+
+        Args:
+            level (Any): Рівень у форматі біржі
+
+        Returns:
+            Level: (ціна в тіках, обсяг у лотах); ValueError, якщо ціна не вміщується в int64
+        """
+        if isinstance(level, dict):
+            if 'p' in level:
+                price, amount = level['p'], level['v']
+            else:
+                price = level['price']
+                amount = level['quantity'] if 'quantity' in level else level['amount']
+        else:
+            price, amount = level[0], level[1]
+        ticks = _to_units(price, self.price_decimals)
+        lots = _to_units(amount, self.size_decimals)
+        if abs(ticks) > MAX_UNITS:
+            hot_log.throttled(logging.WARNING, "Ціна рівня %r не вміщується в int64 при %d знаках - рівень відкинуто",
+                              level, self.price_decimals)
+            raise ValueError(f"Price out of int64 range: {level!r}")
+        if abs(lots) > MAX_UNITS:
+            hot_log.throttled(logging.WARNING, "Обсяг рівня %r не вміщується в int64 при %d знаках - обмежено до %d лотів",
+                              level, self.size_decimals, MAX_UNITS)
+            lots = MAX_UNITS if lots > 0 else -MAX_UNITS
+        return ticks, lots
+
+    def price(self, ticks: int) -> float:
+        """Ціна у вигляді float (для обчислень, де точність не критична)."""
+        return ticks / self.price_factor
+
+    def size(self, lots: int) -> float:
+        """Обсяг у вигляді float."""
+        return lots / self.size_factor
+
+    def notional_units(self, notional: float) -> int:
+        """
+        Перетворення суми в котирувальній валюті (USDT) в одиниці добутку тіків на лоти.
+
+        Args:
+            notional (float): Сума в USDT
+
+        Returns:
+            int: Сума в одиницях price_factor * size_factor
+        """
+        return _to_units(notional, self.price_decimals + self.size_decimals)
+
+    def format_price(self, ticks: int) -> str:
+        """Точний десятковий рядок ціни."""
+        return _format_units(ticks, self.price_decimals)
+
+    def format_size(self, lots: int) -> str:
+        """Точний десятковий рядок обсягу."""
+        return _format_units(lots, self.size_decimals)
+
+    def display_price(self, ticks: int) -> str:
+        """Ціна, відформатована для відображення (див. format_display_price)."""
+        return format_display_price(ticks / self.price_factor)
+
+
+# Масштаб для ринків без власних налаштувань
+DEFAULT_SCALE = MarketScale()
+
+
+def parse_level(level: Any, scale: MarketScale = DEFAULT_SCALE) -> Level:
+    """
+    Розбір рівня ордербуку у цілочисельне представлення ринку.
+
+    Args:
+        level (Any): Рівень у форматі біржі
+        scale (MarketScale): Масштаб ринку
+
+    Returns:
+        Level: (ціна в тіках, обсяг у лотах)
+    """
+    return scale.parse_level(level)
+
+
+class _BookSide:
+    """
+    Одна сторона ордербуку (asks або bids).
+
+    Ключі зберігаються за зростанням. Для bids ключ - це сама ціна, для asks -
+    ціна з протилежним знаком, тож найкращий рівень завжди останній.
+
+    Додатково сторона тримає префіксні суми обсягу в котирувальній валюті
+    (тіки * лоти), впорядковані від найкращого рівня: _cum[d] - сума рівнів
+    0..d. Зміна рівня на відстані d від верхівки обрізає суми з індексу d, а
+    добудовуються вони ліниво і лише до глибини, потрібної запиту.
+    """
+
+    __slots__ = ('_sign', '_keys', '_sizes', '_cum')
+
+    def __init__(self, is_ask: bool):
+        self._sign = -1 if is_ask else 1
+        self._keys = array('q')
+        self._sizes = array('q')
+        self._cum: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, price: int, size: int) -> bool:
+        """
+        Вставка, оновлення або видалення (size <= 0) рівня.
+
+        Args:
+            price (int): Ціна рівня в тіках
+            size (int): Новий обсяг рівня в лотах
+
+        Returns:
+            bool: True, якщо сторона змінилася
+        """
+        keys = self._keys
+        key = price * self._sign
+        i = bisect_left(keys, key)
+        found = i < len(keys) and keys[i] == key
+
+        if size > 0:
+            if found:
+                if self._sizes[i] == size:
+                    return False
+                self._sizes[i] = size
+            else:
+                keys.insert(i, key)
+                self._sizes.insert(i, size)
+            self._invalidate(len(keys) - 1 - i)
+            return True
+
+        if found:
+            self._invalidate(len(keys) - 1 - i)
+            del keys[i]
+            del self._sizes[i]
+            return True
+        return False
+
+    def replace(self, levels: Iterable[Level]):
+        """
+        Повна заміна сторони новим набором рівнів (снапшот).
+
+        Args:
+            levels (Iterable[Level]): Рівні (тіки, лоти) у довільному порядку
+        """
+        sign = self._sign
+        merged: Dict[int, int] = {}
+        for price, size in levels:
+            if size > 0:
+                merged[price * sign] = size
+            else:
+                merged.pop(price * sign, None)
+
+        ordered = sorted(merged)
+        self._keys = array('q', ordered)
+        self._sizes = array('q', (merged[key] for key in ordered))
+        self._cum = []
+
+    def clear(self):
+        """Видалення всіх рівнів."""
+        self._keys = array('q')
+        self._sizes = array('q')
+        self._cum = []
+
+    def best(self) -> Optional[Level]:
+        """
+        Найкращий рівень сторони за O(1).
+
+        Returns:
+            Optional[Level]: (тіки, лоти) або None, якщо сторона порожня
+        """
+        if not self._keys:
+            return None
+        return self._keys[-1] * self._sign, self._sizes[-1]
+
+    def top(self, depth: Optional[int] = None) -> List[Level]:
+        """
+        Перші N рівнів, починаючи з найкращого, за O(N).
+
+        Args:
+            depth (Optional[int]): Кількість рівнів; None - всі рівні
+
+        Returns:
+            List[Level]: Рівні від найкращого до найгіршого
+        """
+        keys = self._keys
+        sizes = self._sizes
+        sign = self._sign
+        count = len(keys) if depth is None else min(depth, len(keys))
+        last = len(keys) - 1
+        return [(keys[last - i] * sign, sizes[last - i]) for i in range(count)]
+
+    def price_for_notional(self, notional: int) -> Optional[int]:
+        """
+        Ціна рівня, на якому кумулятивний обсяг від верхівки досягає notional.
+
+        Args:
+            notional (int): Поріг у одиницях тіки * лоти (MarketScale.notional_units)
+
+        Returns:
+            Optional[int]: Ціна в тіках або None, якщо обсягу сторони недостатньо
+        """
+        cum = self._extend(target=notional)
+        depth = bisect_left(cum, notional)
+        if depth == len(cum):
+            return None
+        return self._keys[len(self._keys) - 1 - depth] * self._sign
+
+    def notional_at_price(self, price: int) -> int:
+        """
+        Кумулятивний обсяг усіх рівнів від верхівки до ціни price включно.
+
+        Args:
+            price (int): Ціна в тіках
+
+        Returns:
+            int: Обсяг у одиницях тіки * лоти
+        """
+        depth = len(self._keys) - bisect_left(self._keys, price * self._sign)
+        if not depth:
+            return 0
+        return self._extend(depth=depth)[depth - 1]
+
+    def _invalidate(self, depth: int):
+        """Відкидання префіксних сум, починаючи з рівня на відстані depth від верхівки."""
+        if depth < len(self._cum):
+            del self._cum[depth:]
+
+    def _extend(self, depth: Optional[int] = None, target: Optional[int] = None) -> List[int]:
+        """
+        Добудова префіксних сум до глибини depth або до досягнення суми target.
+
+        Args:
+            depth (Optional[int]): Потрібна кількість префіксних сум
+            target (Optional[int]): Сума, до якої достатньо добудувати
+
+        Returns:
+            List[int]: Префіксні суми від верхівки
+        """
+        cum = self._cum
+        keys = self._keys
+        sizes = self._sizes
+        sign = self._sign
+        last = len(keys) - 1
+        limit = len(keys) if depth is None else min(depth, len(keys))
+        total = cum[-1] if cum else 0
+        d = len(cum)
+        while d < limit and (target is None or total < target):
+            total += keys[last - d] * sign * sizes[last - d]
+            cum.append(total)
+            d += 1
+        return cum
+
+
+class OrderBook:
+    """
+    Ордербук одного ринку на біржі.
+
+    Зберігає asks і bids у відсортованих паралельних масивах та надає
+    найкращі ціни за O(1) і перші N рівнів за O(N).
+    """
+
+    __slots__ = ('scale', 'asks', 'bids', 'sequence', 'updated_at')
+
+    def __init__(self, scale: MarketScale = DEFAULT_SCALE):
+        # Масштаб цілочисельного представлення цін і обсягів ринку
+        self.scale = scale
+        self.asks = _BookSide(is_ask=True)
+        self.bids = _BookSide(is_ask=False)
+        # Номер послідовності останнього застосованого оновлення (якщо біржа його надає)
+        self.sequence = 0
+        # Час останньої зміни книги (time.time())
+        self.updated_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.asks) + len(self.bids)
+
+    def is_empty(self) -> bool:
+        """Перевірка, чи немає в книзі жодного рівня."""
+        return not self.asks and not self.bids
+
+    def update_ask(self, price: int, size: int) -> bool:
+        """Застосування зміни рівня asks (size <= 0 видаляє рівень)."""
+        changed = self.asks.update(price, size)
+        if changed:
+            self.updated_at = time.time()
+        return changed
+
+    def update_bid(self, price: int, size: int) -> bool:
+        """Застосування зміни рівня bids (size <= 0 видаляє рівень)."""
+        changed = self.bids.update(price, size)
+        if changed:
+            self.updated_at = time.time()
+        return changed
+
+    def load_snapshot(self, asks: Iterable[Level], bids: Iterable[Level], sequence: Optional[int] = None):
+        """
+        Завантаження повного стану книги.
+
+        Args:
+            asks (Iterable[Level]): Рівні asks (тіки, лоти)
+            bids (Iterable[Level]): Рівні bids (тіки, лоти)
+            sequence (Optional[int]): Номер послідовності снапшоту
+        """
+        self.asks.replace(asks)
+        self.bids.replace(bids)
+        if sequence is not None:
+            self.sequence = sequence
+        self.updated_at = time.time()
+
+    def clear(self):
+        """Очищення книги."""
+        self.asks.clear()
+        self.bids.clear()
+        self.sequence = 0
+        self.updated_at = time.time()
+
+    def best_ask(self) -> Optional[Level]:
+        """Найкращий ask (найнижча ціна продажу)."""
+        return self.asks.best()
+
+    def best_bid(self) -> Optional[Level]:
+        """Найкращий bid (найвища ціна покупки)."""
+        return self.bids.best()
+
+    def top_asks(self, depth: Optional[int] = None) -> List[Level]:
+        """Перші N asks за зростанням ціни."""
+        return self.asks.top(depth)
+
+    def top_bids(self, depth: Optional[int] = None) -> List[Level]:
+        """Перші N bids за спаданням ціни."""
+        return self.bids.top(depth)
+
+    def effective_prices(self, notional: int) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Ціни, за якими можна виконати ринкову угоду на суму notional.
+
+        Args:
+            notional (int): Сума в одиницях тіки * лоти (MarketScale.notional_units)
+
+        Returns:
+            Tuple[Optional[int], Optional[int]]: (ціна купівлі по asks, ціна продажу по bids) у тіках
+        """
+        return self.asks.price_for_notional(notional), self.bids.price_for_notional(notional)
+
+    def to_dict(self, depth: Optional[int] = None) -> Dict[str, List[List[str]]]:
+        """
+        Представлення книги у форматі, який очікує фронтенд.
+
+        Args:
+            depth (Optional[int]): Кількість рівнів на кожну сторону; None - всі
+
+        Returns:
+            Dict[str, List[List[str]]]: {'asks': [[price, amount], ...], 'bids': [...]}
+        """
+        format_price = self.scale.format_price
+        format_size = self.scale.format_size
+        return {
+            'asks': [[format_price(price), format_size(size)] for price, size in self.asks.top(depth)],
+            'bids': [[format_price(price), format_size(size)] for price, size in self.bids.top(depth)]
+        }
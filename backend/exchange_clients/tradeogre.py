@@ -6,9 +6,11 @@ import logging
 from typing import Dict, List, Any, Tuple
 
 from exchange_clients.http_client import HttpExchangeClient
+from utils import log
 
 # Налаштування логгера
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
 
 
 class TradeOgreClient(HttpExchangeClient):
@@ -56,7 +58,7 @@ class TradeOgreClient(HttpExchangeClient):
         
         try:
             # Виконання HTTP-запиту
-            response = await self.http_client.get(endpoint)
+            response = await self.http_get(endpoint)
             response.raise_for_status()
             
             # Розбір JSON-відповіді
@@ -67,54 +69,42 @@ class TradeOgreClient(HttpExchangeClient):
                 logger.error(f"{self.name}: API error: {data.get('error', 'Unknown error')}")
                 return
                 
-            # Отримання даних ордербуку
-            # Для sell ордерів беремо тільки ті, що мають ненульову кількість
-            asks = [[float(price), float(amount)] for price, amount in data.get('sell', {}).items() if float(amount) > 0]
-            # Для buy ордерів беремо тільки ті, що мають ненульову кількість
-            bids = [[float(price), float(amount)] for price, amount in data.get('buy', {}).items() if float(amount) > 0]
-            
-            # Сортування ордерів
-            asks.sort(key=lambda x: x[0])  # Сортування за зростанням ціни
-            bids.sort(key=lambda x: x[0], reverse=True)  # Сортування за спаданням ціни
-            
-            # Оновлення локального ордербуку
-            self.orderbooks[token] = {
-                'asks': asks,
-                'bids': bids
-            }
+            # Оновлення локального ордербуку (рушій сам сортує рівні і відкидає нульові)
+            book = self._load_snapshot(self.book_key(token), data.get('sell', {}).items(), data.get('buy', {}).items())
+            asks = book.top_asks()
+            bids = book.top_bids()
             
             # Отримання найкращих цін
             best_buy = None
             best_sell = None
             
             if bids:
-                best_buy = bids[0][0]  # Перший ордер з відсортованих bids
+                best_buy = book.scale.format_price(bids[0][0])  # Перший ордер з відсортованих bids
             if asks:
-                best_sell = asks[0][0]  # Перший ордер з відсортованих asks
+                best_sell = book.scale.format_price(asks[0][0])  # Перший ордер з відсортованих asks
                 
-            logger.debug(f"{self.name}: Updated orderbook for {token}, asks: {len(asks)}, bids: {len(bids)}")
-            logger.debug(f"{self.name}: Best prices for {token}: sell={best_sell}, buy={best_buy}")
-            if asks:
-                logger.debug(f"{self.name}: Sample asks for {token}: {asks[:3]}")
-            if bids:
-                logger.debug(f"{self.name}: Sample bids for {token}: {bids[:3]}")
+            hot_log.debug("%s: Updated orderbook for %s, asks: %d, bids: %d", self.name, token, len(asks), len(bids))
+            hot_log.debug("%s: Best prices for %s: sell=%s, buy=%s", self.name, token, best_sell, best_buy)
+            if asks or bids:
+                hot_log.payload("%s: Sample levels for %s: %s", self.name, token, log.lazy(book.to_dict, depth=3))
             
         except Exception as e:
             logger.error(f"{self.name}: Error fetching orderbook for {token}: {str(e)}")
 
-    async def get_orderbook(self, symbol: str) -> Dict[str, Any]:
+    async def _fetch_orderbook(self, symbol: str) -> Dict[str, Any]:
         """Отримання ордербука для вказаного символу"""
         try:
-            logger.info(f"Getting orderbook for {symbol} on TradeOgre")
-            endpoint = self.get_endpoint_url(symbol.replace('USDT', ''))
-            logger.info(f"Generated endpoint URL: {endpoint}")
+            hot_log.debug("Getting orderbook for %s on TradeOgre", symbol)
+            token = symbol.replace('USDT', '')
+            endpoint = self.get_endpoint_url(token)
+            hot_log.debug("Generated endpoint URL: %s", endpoint)
             
-            response = await self.http_client.get(endpoint)
-            logger.info(f"Response status: {response.status_code}")
+            response = await self.http_get(endpoint)
+            hot_log.debug("Response status: %s", response.status_code)
             response.raise_for_status()
             
             data = response.json()
-            logger.info(f"Raw response from TradeOgre: {data}")
+            hot_log.payload("Raw response from TradeOgre: %s", data)
             
             if 'success' in data and not data['success']:
                 logger.error(f"{self.name}: API error: {data.get('error', 'Unknown error')}")
@@ -122,63 +112,22 @@ class TradeOgreClient(HttpExchangeClient):
                 
             # Конвертуємо дані в правильний формат
             try:
-                # Для sell ордерів беремо тільки ті, що мають ненульову кількість
-                asks = [[float(price), float(amount)] for price, amount in data.get('sell', {}).items() if float(amount) > 0]
-                # Для buy ордерів беремо тільки ті, що мають ненульову кількість
-                bids = [[float(price), float(amount)] for price, amount in data.get('buy', {}).items() if float(amount) > 0]
+                # Оновлюємо локальний ордербук (рушій сам сортує рівні і відкидає нульові)
+                book = self._load_snapshot(self.book_key(token), data.get('sell', {}).items(), data.get('buy', {}).items())
+                orderbook = book.to_dict()
                 
-                # Сортуємо ордери
-                asks.sort(key=lambda x: float(x[0]))  # Сортування за зростанням ціни
-                bids.sort(key=lambda x: float(x[0]), reverse=True)  # Сортування за спаданням ціни
-                
-                logger.info(f"Converted orders - asks: {len(asks)}, bids: {len(bids)}")
-                if asks:
-                    logger.info(f"Sample asks: {asks[:3]}")
-                    best_sell = float(asks[0][0])
-                    # Форматуємо ціну в залежності від її значення
-                    if best_sell >= 1000:
-                        best_sell = f"{best_sell:.2f}"
-                    elif best_sell >= 100:
-                        best_sell = f"{best_sell:.3f}"
-                    elif best_sell >= 10:
-                        best_sell = f"{best_sell:.4f}"
-                    elif best_sell >= 1:
-                        best_sell = f"{best_sell:.5f}"
-                    elif best_sell >= 0.1:
-                        best_sell = f"{best_sell:.6f}"
-                    elif best_sell >= 0.01:
-                        best_sell = f"{best_sell:.7f}"
-                    else:
-                        best_sell = f"{best_sell:.8f}"
-                else:
-                    best_sell = 'X X X'
-                    
-                if bids:
-                    logger.info(f"Sample bids: {bids[:3]}")
-                    best_buy = float(bids[0][0])
-                    # Форматуємо ціну в залежності від її значення
-                    if best_buy >= 1000:
-                        best_buy = f"{best_buy:.2f}"
-                    elif best_buy >= 100:
-                        best_buy = f"{best_buy:.3f}"
-                    elif best_buy >= 10:
-                        best_buy = f"{best_buy:.4f}"
-                    elif best_buy >= 1:
-                        best_buy = f"{best_buy:.5f}"
-                    elif best_buy >= 0.1:
-                        best_buy = f"{best_buy:.6f}"
-                    elif best_buy >= 0.01:
-                        best_buy = f"{best_buy:.7f}"
-                    else:
-                        best_buy = f"{best_buy:.8f}"
-                else:
-                    best_buy = 'X X X'
+                hot_log.debug("Converted orders - asks: %d, bids: %d", len(orderbook['asks']), len(orderbook['bids']))
+                best_ask = book.best_ask()
+                best_bid = book.best_bid()
+                if best_ask:
+                    hot_log.payload("Sample asks: %s", orderbook['asks'][:3])
+                if best_bid:
+                    hot_log.payload("Sample bids: %s", orderbook['bids'][:3])
                     
                 return {
-                    'asks': asks,
-                    'bids': bids,
-                    'best_sell': best_sell,
-                    'best_buy': best_buy
+                    **orderbook,
+                    'best_sell': book.scale.display_price(best_ask[0]) if best_ask else 'X X X',
+                    'best_buy': book.scale.display_price(best_bid[0]) if best_bid else 'X X X'
                 }
                 
             except Exception as e:
@@ -188,57 +137,3 @@ class TradeOgreClient(HttpExchangeClient):
         except Exception as e:
             logger.error(f"Error getting orderbook for {symbol} on TradeOgre: {str(e)}")
             return None
-
-    def get_best_prices(self, token: str, threshold: float = 5.0) -> tuple:
-        if token not in self.orderbooks:
-            return "X X X", "X X X"
-        orderbook = self.orderbooks[token]
-        asks = orderbook.get('asks', [])
-        bids = orderbook.get('bids', [])
-        if not asks or not bids:
-            return "X X X", "X X X"
-        cumulative_volume = 0
-        best_sell = None
-        best_buy = None
-        for ask in asks:
-            price, volume = float(ask[0]), float(ask[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                # Форматуємо ціну в залежності від її значення
-                if price >= 1000:
-                    best_sell = f"{price:.2f}"
-                elif price >= 100:
-                    best_sell = f"{price:.3f}"
-                elif price >= 10:
-                    best_sell = f"{price:.4f}"
-                elif price >= 1:
-                    best_sell = f"{price:.5f}"
-                elif price >= 0.1:
-                    best_sell = f"{price:.6f}"
-                elif price >= 0.01:
-                    best_sell = f"{price:.7f}"
-                else:
-                    best_sell = f"{price:.8f}"
-                break
-        cumulative_volume = 0
-        for bid in bids:
-            price, volume = float(bid[0]), float(bid[1])
-            cumulative_volume += volume * price
-            if cumulative_volume >= threshold:
-                # Форматуємо ціну в залежності від її значення
-                if price >= 1000:
-                    best_buy = f"{price:.2f}"
-                elif price >= 100:
-                    best_buy = f"{price:.3f}"
-                elif price >= 10:
-                    best_buy = f"{price:.4f}"
-                elif price >= 1:
-                    best_buy = f"{price:.5f}"
-                elif price >= 0.1:
-                    best_buy = f"{price:.6f}"
-                elif price >= 0.01:
-                    best_buy = f"{price:.7f}"
-                else:
-                    best_buy = f"{price:.8f}"
-                break
-        return best_sell or "X X X", best_buy or "X X X"
\ No newline at end of file
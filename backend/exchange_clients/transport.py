@@ -0,0 +1,107 @@
+"""
+Спільний HTTP-транспорт для REST-запитів клієнтів бірж.
+
+Усі клієнти використовують одні пули з'єднань замість власних сесій, тож
+повторні запити до біржі йдуть через вже відкриті keep-alive з'єднання без
+нового TCP+TLS рукостискання. Клієнти на aiohttp (CoinEx, MEXC) отримують
+спільну ClientSession з кешем DNS і обмеженням з'єднань на хост, HTTP-клієнти
+(HttpExchangeClient) - спільний httpx.AsyncClient, який використовує HTTP/2,
+якщо встановлено пакет h2 і сервер його підтримує.
+"""
+import importlib.util
+import logging
+from typing import Optional
+
+import aiohttp
+import httpx
+
+from config import HTTP2_ENABLED, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE, HTTP_POOL_PER_HOST, HTTP_POOL_SIZE
+
+# Налаштування логгера
+logger = logging.getLogger(__name__)
+
+
+class HttpTransport:
+    """
+    Пули HTTP-з'єднань, спільні для всіх клієнтів бірж.
+    Сесії створюються при першому запиті (всередині циклу подій) і закриваються методом close().
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, pool_per_host: int = HTTP_POOL_PER_HOST,
+                 keepalive: float = HTTP_KEEPALIVE, dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                 http2: bool = HTTP2_ENABLED):
+        """
+        Ініціалізація транспорту.
+
+        Args:
+            pool_size (int): Максимальна кількість з'єднань
+            pool_per_host (int): Максимальна кількість з'єднань до одного хоста
+            keepalive (float): Час утримання неактивного з'єднання (секунди)
+            dns_cache_ttl (int): Час кешування DNS (секунди)
+            http2 (bool): Використовувати HTTP/2 для httpx, якщо встановлено пакет h2
+        """
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.keepalive = keepalive
+        self.dns_cache_ttl = dns_cache_ttl
+        self.http2 = http2 and importlib.util.find_spec('h2') is not None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def session(self) -> aiohttp.ClientSession:
+        """Спільна aiohttp-сесія з пулом з'єднань і кешем DNS."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            logger.info(f"HttpTransport: створено aiohttp-сесію (з'єднань: {self.pool_size}, на хост: {self.pool_per_host})")
+        return self._session
+
+    def client(self) -> httpx.AsyncClient:
+        """Спільний httpx-клієнт з пулом keep-alive з'єднань (HTTP/2, якщо доступно)."""
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive
+            )
+            self._client = httpx.AsyncClient(limits=limits, http2=self.http2)
+            logger.info(f"HttpTransport: створено httpx-клієнт (HTTP/2: {self.http2})")
+        return self._client
+
+    @staticmethod
+    def aiohttp_timeout(seconds: float) -> aiohttp.ClientTimeout:
+        """
+        Граничний час запиту для aiohttp.
+
+        Args:
+            seconds (float): Граничний час усього запиту (секунди)
+
+        Returns:
+            aiohttp.ClientTimeout: Параметр timeout для запиту
+        """
+        return aiohttp.ClientTimeout(total=seconds)
+
+    async def close(self):
+        """Закриття всіх з'єднань."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._session = None
+        self._client = None
+
+
+_shared_transport: Optional[HttpTransport] = None
+
+
+def get_transport() -> HttpTransport:
+    """Транспорт за замовчуванням для клієнтів, яким його не передав менеджер."""
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = HttpTransport()
+    return _shared_transport
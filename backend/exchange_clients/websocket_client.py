@@ -10,6 +10,7 @@ import websockets
 from websockets.exceptions import ConnectionClosed
 
 from exchange_clients.base_client import BaseExchangeClient
+from exchange_clients.frame_decoder import FrameDecoder
 
 # Налаштування логгера
 logger = logging.getLogger(__name__)
@@ -35,6 +36,7 @@ class WebSocketExchangeClient(BaseExchangeClient):
         self.ping_task = None
         self.listener_task = None
         self.message_handlers = {}
+        self.decoder = FrameDecoder()  # Розбір вхідних кадрів (orjson, якщо встановлений)
         
     async def connect(self):
         """
@@ -150,7 +152,7 @@ class WebSocketExchangeClient(BaseExchangeClient):
         """
         try:
             # Базова реалізація припускає JSON-формат
-            data = json.loads(message)
+            data = self.decoder.loads(message)
             
             # Перевірка на pong (якщо біржа його відправляє)
             if 'pong' in data or data.get('op') == 'pong':
@@ -245,4 +247,7 @@ class WebSocketExchangeClient(BaseExchangeClient):
         Returns:
             Dict[str, List]: Словник з asks і bids
         """
-        return self.orderbooks.get(token, {'asks': [], 'bids': []})
\ No newline at end of file
+        book = self.get_book(token)
+        if book is None:
+            return {'asks': [], 'bids': []}
+        return book.to_dict()
\ No newline at end of file
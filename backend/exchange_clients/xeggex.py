@@ -14,8 +14,10 @@ from typing import Dict, Any, List, Optional
 import websockets
 
 from exchange_clients.websocket_client import WebSocketExchangeClient
+from utils import log
 
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
 
 class XeggexClient(WebSocketExchangeClient):
     """
@@ -24,6 +26,12 @@ class XeggexClient(WebSocketExchangeClient):
     Підтримує формат списку словників та формат списку списків для asks/bids.
     """
 
+    # Зміни книги з потоку біржі надходять у менеджер подіями
+    push_updates = True
+
+    # Методи повідомлень, які обробляє _process_message (решта відкидається до розбору)
+    HANDLED_METHODS = frozenset({"snapshotOrderbook", "orderbookUpdate", "updateOrderbook"})
+
     def __init__(self, name: str, url: str, config: Dict[str, Any] = None):
         super().__init__(name, url, config)
         # Створення SSL-контексту для безпечного WebSocket-з'єднання
@@ -31,10 +39,12 @@ class XeggexClient(WebSocketExchangeClient):
         self.ssl_context.check_hostname = False
         self.ssl_context.verify_mode = ssl.CERT_NONE
 
-        # Основний кеш ордербуків {symbol: {"asks": [...], "bids": [...], "last_update": ...}}
-        self.orderbook_cache: Dict[str, Dict[str, Any]] = {}
         self.tokens: List[str] = []
 
+        # Токени, що очікують новий снапшот після пропуску в послідовності {token: задача перепідписки}
+        self._resyncing: Dict[str, asyncio.Task] = {}
+        self.resync_timeout = self.config.get('resync_timeout', 10)
+
         # Лічильник ping-повідомлень
         self.ping_id = 0
 
@@ -105,10 +115,13 @@ class XeggexClient(WebSocketExchangeClient):
         """
         Підписка на оновлення ордербуку для конкретного токена (наприклад, 'BTC').
         Для Xeggex символ: 'BTC/USDT'.
+
+        Returns:
+            bool: True, якщо запит на підписку відправлено
         """
         if not self.is_connected or not self.ws:
             logger.error(f"{self.name}: WebSocket not connected. Cannot subscribe.")
-            return
+            return False
 
         symbol = f"{token}/USDT"
         subscribe_message = {
@@ -127,15 +140,21 @@ class XeggexClient(WebSocketExchangeClient):
         if token not in self.tokens:
             self.tokens.append(token)
             logger.info(f"{self.name}: Added token {token}. Current tokens: {self.tokens}")
+        self.decoder.track(symbol)
 
         try:
-            await self.send_message(subscribe_message)
+            if not await self.send_message(subscribe_message):
+                logger.error(f"{self.name}: Failed to send subscription for {symbol}")
+                return False
             logger.info(f"{self.name}: Successfully subscribed to {symbol}")
+            return True
         except Exception as e:
             logger.error(f"{self.name}: Failed to subscribe to {symbol}: {str(e)}")
             if token in self.tokens:
                 self.tokens.remove(token)
+                self.decoder.untrack(symbol)
                 logger.info(f"{self.name}: Removed token {token} due to subscription failure")
+            return False
 
     async def unsubscribe_from_orderbook(self, token: str):
         """
@@ -211,12 +230,22 @@ class XeggexClient(WebSocketExchangeClient):
           - Список списків: [["price", "quantity"], ...]
         """
         try:
-            data = json.loads(message)
-            logger.info(f"{self.name}: Отримано повідомлення: {json.dumps(data, indent=2)}")
+            # Кадри з методами, які не обробляються, і кадри ринків, які не відстежуються (наприклад,
+            # після відписки), відкидаємо без розбору; символ вкладений у params, тож читається,
+            # лише якщо поле symbol у кадрі одне
+            if (self.decoder.skip_unhandled(message, "method", self.HANDLED_METHODS)
+                    or self.decoder.skip_untracked(message, "symbol", nested=True)):
+                return
+            data = self.decoder.loads(message)
+
+            # Символ, який не вдалося прочитати з сирого кадру, перевіряємо після розбору
+            params = data.get('params') if isinstance(data, dict) else None
+            if isinstance(params, dict) and 'symbol' in params and self.decoder.skip_symbol(params['symbol']):
+                return
 
             if "method" in data:
                 method = data["method"]
-                logger.info(f"{self.name}: Метод повідомлення: {method}")
+                hot_log.debug("%s: Метод повідомлення: %s", self.name, method)
 
                 if method == "snapshotOrderbook":
                     params = data.get('params', {})
@@ -229,71 +258,55 @@ class XeggexClient(WebSocketExchangeClient):
 
                     asks = params.get('asks', [])
                     bids = params.get('bids', [])
-                    logger.info(f"{self.name}: Кількість asks: {len(asks)}, bids: {len(bids)}")
-
-                    # Форматуємо ціни незалежно від формату вхідних даних
-                    if asks:
-                        logger.info(f"{self.name}: Конвертуємо asks для {symbol}")
-                        asks = [{"price": self._format_price(ask["price"]), "amount": str(ask["quantity"])} for ask in asks]
-                        logger.info(f"{self.name}: Приклад ask після конвертації: {json.dumps(asks[0], indent=2)}")
-                        logger.info(f"{self.name}: Перші 3 asks після конвертації: {json.dumps(asks[:3], indent=2)}")
-
-                    if bids:
-                        logger.info(f"{self.name}: Конвертуємо bids для {symbol}")
-                        bids = [{"price": self._format_price(bid["price"]), "amount": str(bid["quantity"])} for bid in bids]
-                        logger.info(f"{self.name}: Приклад bid після конвертації: {json.dumps(bids[0], indent=2)}")
-                        logger.info(f"{self.name}: Перші 3 bids після конвертації: {json.dumps(bids[:3], indent=2)}")
-
-                    # Оновлюємо кеш
-                    self.orderbook_cache[symbol] = {
-                        'asks': asks,
-                        'bids': bids,
-                        'last_update': asyncio.get_event_loop().time()
-                    }
-                    logger.info(f"{self.name}: Оновлено кеш ордербуку для {symbol}")
-                    logger.info(f"{self.name}: Поточний стан кешу: {json.dumps(self.orderbook_cache.get(symbol, {}), indent=2)}")
-
-                elif method == "orderbookUpdate":
+                    hot_log.debug("%s: Кількість asks: %d, bids: %d", self.name, len(asks), len(bids))
+
+                    # Оновлюємо ордербук (рушій сам сортує рівні та відкидає нульові обсяги)
+                    book = self._load_snapshot(symbol, asks, bids)
+                    book.sequence = self._get_sequence(params) or 0
+                    self._stop_resync(symbol)
+                    logger.info(f"{self.name}: Оновлено ордербук для {symbol}: best_ask={book.best_ask()}, best_bid={book.best_bid()}")
+
+                elif method in ("orderbookUpdate", "updateOrderbook"):
                     params = data.get('params', {})
                     symbol = params.get('symbol', '').replace('/USDT', '')
 
-                    if not symbol or symbol not in self.orderbook_cache:
+                    book = self.orderbooks.get(symbol)
+                    if not symbol or book is None:
                         logger.error(f"{self.name}: Невідомий або відсутній символ в оновленні: {symbol}")
                         return
 
-                    asks = params.get('asks', [])
-                    bids = params.get('bids', [])
+                    if symbol in self._resyncing:
+                        # Чекаємо новий снапшот після перепідписки (повтори виконує задача _resync)
+                        return
 
-                    # Форматуємо ціни незалежно від формату вхідних даних
-                    if asks:
-                        logger.info(f"{self.name}: Конвертуємо оновлення asks для {symbol}")
-                        if isinstance(asks[0], list):
-                            asks = [{"price": self._format_price(ask[0]), "amount": str(ask[1])} for ask in asks]
-                        else:
-                            asks = [{"price": self._format_price(ask["price"]), "amount": str(ask["quantity"])} for ask in asks]
-                    if bids:
-                        logger.info(f"{self.name}: Конвертуємо оновлення bids для {symbol}")
-                        if isinstance(bids[0], list):
-                            bids = [{"price": self._format_price(bid[0]), "amount": str(bid[1])} for bid in bids]
-                        else:
-                            bids = [{"price": self._format_price(bid["price"]), "amount": str(bid["quantity"])} for bid in bids]
-
-                    # Логуємо конвертовані дані для оновлення
-                    logger.info(f"{self.name}: Конвертовані дані оновлення - asks={json.dumps(asks[:3], indent=2)}, bids={json.dumps(bids[:3], indent=2)}")
-
-                    # Застосовуємо оновлення
-                    if asks:
-                        self.orderbook_cache[symbol]['asks'] = asks
-                    if bids:
-                        self.orderbook_cache[symbol]['bids'] = bids
-
-                    self.orderbook_cache[symbol]['last_update'] = asyncio.get_event_loop().time()
-                    logger.info(f"{self.name}: Оновлено ордербук для {symbol}")
-                    logger.info(f"{self.name}: Поточний стан кешу після оновлення: {json.dumps(self.orderbook_cache.get(symbol, {}), indent=2)}")
+                    sequence = self._get_sequence(params)
+                    if sequence is not None and book.sequence:
+                        if sequence <= book.sequence:
+                            logger.debug(f"{self.name}: Застаріле оновлення для {symbol}: {sequence} <= {book.sequence}")
+                            return
+                        if sequence != book.sequence + 1:
+                            logger.warning(f"{self.name}: Пропуск у послідовності для {symbol}: "
+                                           f"очікували {book.sequence + 1}, отримали {sequence}. Перепідписка...")
+                            self._start_resync(symbol)
+                            return
+
+                    # Зливаємо змінені рівні в книгу; нульовий обсяг видаляє рівень
+                    changed = False
+                    for price, amount in self._parse_levels(params.get('asks', []), book.scale):
+                        changed |= book.update_ask(price, amount)
+                    for price, amount in self._parse_levels(params.get('bids', []), book.scale):
+                        changed |= book.update_bid(price, amount)
+                    if changed:
+                        self._notify_book_update(symbol)
+
+                    if sequence is not None:
+                        book.sequence = sequence
+                    hot_log.debug("%s: Оновлено ордербук для %s (seq=%s): best_ask=%s, best_bid=%s",
+                                  self.name, symbol, book.sequence, log.lazy(book.best_ask), log.lazy(book.best_bid))
 
             elif "result" in data:
                 # Це відповіді на запити (наприклад, ping/pong)
-                logger.info(f"{self.name}: Обробка результату повідомлення")
+                hot_log.debug("%s: Обробка результату повідомлення", self.name)
                 # Можна додати обробку "pong" тощо
                 pass
             else:
@@ -305,104 +318,130 @@ class XeggexClient(WebSocketExchangeClient):
             logger.error(f"{self.name}: Помилка при обробці повідомлення: {str(e)}")
             logger.error(f"{self.name}: Повідомлення: {message}")
 
+    @staticmethod
+    def _get_sequence(params: Dict[str, Any]) -> Optional[int]:
+        """
+        Номер послідовності зі снапшоту або оновлення ордербуку.
+
+        Returns:
+            Optional[int]: Номер послідовності або None, якщо біржа його не надіслала
+        """
+        sequence = params.get('sequence')
+        try:
+            return int(sequence) if sequence is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def has_live_stream(self, token: str) -> bool:
+        """
+        Перевірка, чи книга токена оновлюється потоком: з'єднання активне, снапшот отримано
+        і токен не очікує новий снапшот після перепідписки.
+
+        Args:
+            token (str): Символ токена
+
+        Returns:
+            bool: True, якщо книга синхронізована з потоком
+        """
+        book = self.get_book(token)
+        return self.is_connected and token not in self._resyncing and book is not None and not book.is_empty()
+
+    def _start_resync(self, token: str):
+        """
+        Запуск перепідписки токена, якщо вона ще не виконується.
+
+        Args:
+            token (str): Символ токена
+        """
+        if token not in self._resyncing:
+            self._resyncing[token] = asyncio.create_task(self._resync(token))
+
+    def _stop_resync(self, token: str):
+        """
+        Завершення перепідписки токена (отримано снапшот або токен видалено).
+
+        Args:
+            token (str): Символ токена
+        """
+        task = self._resyncing.pop(token, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _resync(self, token: str):
+        """
+        Перепідписка на ордербук одного токена після пропуску в послідовності.
+        До отримання нового снапшоту оновлення для токена ігноруються; якщо снапшот не надійшов
+        за resync_timeout секунд або перепідписка не вдалася, вона повторюється за таймером -
+        незалежно від того, чи надходять кадри з підписки, яка могла зникнути.
+
+        Args:
+            token (str): Символ токена
+        """
+        try:
+            while token in self.tokens:
+                await self.unsubscribe_from_orderbook(token)
+                if not await self.subscribe_to_orderbook(token):
+                    logger.warning(f"{self.name}: Перепідписка на {token} не вдалася")
+                await asyncio.sleep(self.resync_timeout)
+                logger.warning(f"{self.name}: Снапшот для {token} не отримано, повторна перепідписка...")
+        finally:
+            if self._resyncing.get(token) is asyncio.current_task():
+                del self._resyncing[token]
+
     async def get_orderbook(self, token: str) -> Dict[str, Any]:
         """
-        Отримання даних ордербуку для токена.
+        Отримання даних ордербуку для токена з книги, яку підтримує потік (REST-запиту немає).
         
         Args:
             token (str): Символ токена
             
         Returns:
-            Dict[str, Any]: Дані ордербуку
+            Dict[str, Any]: Дані ордербуку; None, якщо книга порожня або очікує снапшот після перепідписки
         """
         try:
-            # Отримуємо дані з кешу WebSocket
-            orderbook = self.orderbook_cache.get(token)
-            if not orderbook:
-                logger.warning(f"Xeggex: No orderbook data for {token}")
+            # Після пропуску в послідовності книга неповна до нового снапшоту - не віддаємо її
+            if token in self._resyncing:
+                logger.warning(f"Xeggex: Orderbook for {token} is resyncing")
                 return None
                 
-            # Отримуємо asks та bids
-            asks = orderbook.get('asks', [])
-            bids = orderbook.get('bids', [])
-            
-            if not asks or not bids:
-                logger.warning(f"Xeggex: Empty orderbook for {token}")
+            # Отримуємо дані з ордербуку, який підтримується через WebSocket
+            book = self.get_book(token)
+            if book is None or book.is_empty():
+                logger.warning(f"Xeggex: No orderbook data for {token}")
                 return None
                 
-            # Отримуємо найкращі ціни (вони вже відформатовані)
-            best_sell = asks[0]['price'] if asks else None
-            best_buy = bids[0]['price'] if bids else None
+            best_ask = book.best_ask()
+            best_bid = book.best_bid()
             
-            if not best_sell or not best_buy:
+            if not best_ask or not best_bid:
                 logger.warning(f"Xeggex: Missing best prices for {token}")
                 return None
                 
-            logger.info(f"Xeggex: Got orderbook data for {token}: sell={best_sell}, buy={best_buy}")
-            return {
-                'asks': asks,
-                'bids': bids,
-                'best_sell': best_sell,
-                'best_buy': best_buy
-            }
+            payload = self._orderbook_payload(book)
+            hot_log.debug("Xeggex: Got orderbook data for %s: sell=%s, buy=%s", token, payload['best_sell'], payload['best_buy'])
+            return payload
             
         except Exception as e:
             logger.error(f"Error getting Xeggex orderbook for {token}: {str(e)}")
             return None
 
-    def _format_price(self, price_str: str) -> str:
-        """
-        Форматування ціни з відповідною кількістю десяткових знаків.
-        """
-        try:
-            # Конвертуємо наукову нотацію в звичайне число
-            price = float(price_str)
-            
-            # Визначаємо кількість десяткових знаків на основі значення
-            if price >= 1000:
-                return f"{price:.2f}"
-            elif price >= 100:
-                return f"{price:.3f}"
-            elif price >= 10:
-                return f"{price:.4f}"
-            elif price >= 1:
-                return f"{price:.5f}"
-            elif price >= 0.1:
-                return f"{price:.6f}"
-            elif price >= 0.01:
-                return f"{price:.7f}"
-            else:
-                # Для дуже малих чисел використовуємо 8 знаків після коми
-                formatted = f"{price:.8f}"
-                # Прибираємо зайві нулі в кінці
-                return formatted.rstrip('0').rstrip('.')
-        except (ValueError, TypeError):
-            logger.warning(f"{self.name}: Не вдалося форматувати ціну: {price_str}")
-            return price_str
-
     def get_best_prices(self, token: str) -> Dict[str, str]:
         """
         Отримання найкращих цін (best_sell, best_buy) для заданого токена.
-        Ціни вже відформатовані в _process_message.
         """
         try:
-            ob = self.get_orderbook(token)
-            if not ob:
-                logger.warning(f"{self.name}: No orderbook data for {token}")
-                return {'best_sell': 'X X X', 'best_buy': 'X X X'}
-
-            asks = ob.get('asks', [])
-            bids = ob.get('bids', [])
+            book = self.get_book(token)
+            best_ask = book.best_ask() if book is not None else None
+            best_bid = book.best_bid() if book is not None else None
 
-            if not asks or not bids:
+            if not best_ask or not best_bid:
                 logger.warning(f"{self.name}: Empty orderbook for {token}")
                 return {'best_sell': 'X X X', 'best_buy': 'X X X'}
 
-            # Ціни вже відформатовані в _process_message
-            best_sell_str = asks[0]['price']
-            best_buy_str = bids[0]['price']
+            best_sell_str = book.scale.display_price(best_ask[0])
+            best_buy_str = book.scale.display_price(best_bid[0])
 
-            logger.info(f"{self.name}: Best prices for {token}: sell={best_sell_str}, buy={best_buy_str}")
+            hot_log.debug("%s: Best prices for %s: sell=%s, buy=%s", self.name, token, best_sell_str, best_buy_str)
             return {'best_sell': best_sell_str, 'best_buy': best_buy_str}
 
         except Exception as e:
@@ -422,9 +461,8 @@ class XeggexClient(WebSocketExchangeClient):
             
         try:
             message_str = json.dumps(message)
-            logger.info(f"{self.name}: Sending message: {message_str}")
+            hot_log.payload("%s: Sending message: %s", self.name, message_str)
             await self.ws.send(message_str)
-            logger.info(f"{self.name}: Message sent successfully")
             return True
         except websockets.exceptions.ConnectionClosed as cc:
             logger.warning(f"{self.name}: Connection closed while sending message (code: {cc.code}, reason: {cc.reason})")
@@ -449,9 +487,8 @@ class XeggexClient(WebSocketExchangeClient):
                     continue
                 
                 try:
-                    logger.debug(f"{self.name}: Waiting for message...")
                     message = await self.ws.recv()
-                    logger.info(f"{self.name}: Received raw message: {message[:200]}...")
+                    hot_log.payload("%s: Received raw message: %.200s", self.name, message)
                     await self._process_message(message)
                 except websockets.exceptions.ConnectionClosed as cc:
                     logger.warning(f"{self.name}: WebSocket connection closed (code: {cc.code}, reason: {cc.reason}), reconnecting...")
@@ -479,9 +516,8 @@ class XeggexClient(WebSocketExchangeClient):
                     continue
                 
                 try:
-                    logger.debug(f"{self.name}: Waiting for message...")
                     message = await self.ws.recv()
-                    logger.info(f"{self.name}: Received raw message: {message[:200]}...")
+                    hot_log.payload("%s: Received raw message: %.200s", self.name, message)
                     await self._process_message(message)
                 except websockets.exceptions.ConnectionClosed as cc:
                     logger.warning(f"{self.name}: WebSocket connection closed (code: {cc.code}, reason: {cc.reason}), reconnecting...")
@@ -504,6 +540,7 @@ class XeggexClient(WebSocketExchangeClient):
         """
         if token not in self.tokens:
             self.tokens.append(token)
+            self.decoder.track(f"{token}/USDT")
             logger.info(f"{self.name}: Added token {token}. Current tokens: {self.tokens}")
             
             # Якщо клієнт вже підключений, підписуємося на оновлення
@@ -521,15 +558,16 @@ class XeggexClient(WebSocketExchangeClient):
         """
         if token in self.tokens:
             self.tokens.remove(token)
+            self.decoder.untrack(f"{token}/USDT")
             logger.info(f"{self.name}: Removed token {token}. Current tokens: {self.tokens}")
             
             # Якщо клієнт підключений, відписуємося від оновлень
             if self.is_connected:
                 await self.unsubscribe_from_orderbook(token)
                 
-            # Видаляємо дані з кешу
-            if token in self.orderbook_cache:
-                del self.orderbook_cache[token]
-                logger.info(f"{self.name}: Removed orderbook cache for {token}")
+            # Видаляємо ордербук токена
+            self._stop_resync(token)
+            if self.orderbooks.pop(token, None) is not None:
+                logger.info(f"{self.name}: Removed orderbook for {token}")
         else:
             logger.debug(f"{self.name}: Token {token} not found in the list")
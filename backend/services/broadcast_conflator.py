@@ -0,0 +1,103 @@
+"""
+Злиття (conflation) вихідних оновлень ордербуків.
+
+Оновлення накопичуються за ключем (біржа, токен) протягом вікна
+BROADCAST_CONFLATION_WINDOW; для кожного ключа зберігається лише останній
+стан, який відправляється один раз за вікно. Частота вихідних повідомлень
+обмежена кількістю ключів, а не частотою повідомлень бірж.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from config import BROADCAST_CONFLATION_WINDOW
+
+# Налаштування логгера
+logger = logging.getLogger(__name__)
+
+
+class BroadcastConflator:
+    """
+    Буфер останніх станів за ключем з періодичним скиданням.
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable], window: float = BROADCAST_CONFLATION_WINDOW,
+                 send_batch: Optional[Callable[[List[Dict[str, Any]]], Awaitable]] = None):
+        """
+        Ініціалізація буфера.
+
+        Args:
+            send (Callable[[Dict[str, Any]], Awaitable]): Корутина відправки одного повідомлення
+            window (float): Вікно злиття в секундах; 0 - відправляти без затримки
+            send_batch (Optional[Callable[[List[Dict[str, Any]]], Awaitable]]): Корутина відправки
+                всіх повідомлень тіку разом; якщо не задано, повідомлення відправляються по одному
+        """
+        self.send = send
+        self.send_batch = send_batch
+        self.window = window
+        self._pending: Dict[Hashable, Dict[str, Any]] = {}  # Порядок ключів - порядок першої зміни у вікні
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'published': 0,
+            'conflated': 0,
+            'sent': 0
+        }
+
+    async def publish(self, key: Hashable, message: Dict[str, Any]):
+        """
+        Додавання повідомлення; попереднє невідправлене повідомлення з тим самим ключем замінюється.
+
+        Args:
+            key (Hashable): Ключ стану (наприклад, (біржа, токен))
+            message (Dict[str, Any]): Повідомлення
+        """
+        self.stats['published'] += 1
+        if self.window <= 0:
+            self.stats['sent'] += 1
+            await self.send(message)
+            return
+
+        if key in self._pending:
+            self.stats['conflated'] += 1
+        self._pending[key] = message
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def flush(self):
+        """Відправка всіх накопичених повідомлень."""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        if self.send_batch is not None:
+            try:
+                await self.send_batch(list(pending.values()))
+                self.stats['sent'] += len(pending)
+            except Exception as e:
+                logger.error(f"Помилка при відправці злитих оновлень: {str(e)}")
+            return
+
+        for message in pending.values():
+            try:
+                await self.send(message)
+                self.stats['sent'] += 1
+            except Exception as e:
+                logger.error(f"Помилка при відправці злитого оновлення: {str(e)}")
+
+    async def stop(self):
+        """Зупинка скидання та відправка залишку."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Скидання раз за вікно, поки надходять нові оновлення."""
+        while self._pending:
+            await asyncio.sleep(self.window)
+            await self.flush()
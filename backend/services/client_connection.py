@@ -0,0 +1,175 @@
+"""
+Вихідна черга та задача запису для одного WebSocket-клієнта.
+
+Кожен клієнт має власну обмежену чергу, тож повільне з'єднання не затримує
+інших клієнтів і код, що відправляє оновлення. Повідомлення з ключем
+(наприклад, оновлення ордербуку (біржа, токен)) замінюють невідправлений
+попередній стан з тим самим ключем.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi import WebSocket
+
+from config import WS_CLIENT_QUEUE_SIZE, WS_SEND_TIMEOUT, WS_SLOW_CLIENT_TIMEOUT
+
+# Налаштування логгера
+logger = logging.getLogger(__name__)
+
+
+class ClientConnection:
+    """
+    Обмежена черга вихідних повідомлень клієнта з окремою задачею запису.
+    """
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[[WebSocket], Awaitable],
+                 max_queue: int = WS_CLIENT_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT,
+                 slow_timeout: float = WS_SLOW_CLIENT_TIMEOUT, binary: bool = False,
+                 batch: bool = False):
+        """
+        Ініціалізація черги клієнта.
+
+        Args:
+            websocket (WebSocket): З'єднання клієнта
+            on_failure (Callable[[WebSocket], Awaitable]): Викликається, якщо запис у з'єднання не вдався
+            max_queue (int): Максимальна кількість повідомлень у черзі
+            send_timeout (float): Граничний час відправки одного повідомлення (секунди)
+            slow_timeout (float): Скільки секунд черга може залишатися переповненою до відключення клієнта
+            binary (bool): Клієнт обрав бінарний формат оновлень (utils.binary_codec)
+            batch (bool): Клієнт отримує оновлення одного тіку злиття одним кадром
+        """
+        self.websocket = websocket
+        self.on_failure = on_failure
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.slow_timeout = slow_timeout
+        self.binary = binary
+        self.batch = batch
+        self._queue: OrderedDict = OrderedDict()  # {ключ: повідомлення}; цілі ключі - повідомлення без ключа
+        self._seq = 0
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.overflow_since: Optional[float] = None  # Час, відколи черга переповнена
+        self.closed = False
+        self.stats = {
+            'sent': 0,
+            'replaced': 0,
+            'dropped': 0
+        }
+
+    @property
+    def depth(self) -> int:
+        """Кількість повідомлень, що очікують відправки."""
+        return len(self._queue)
+
+    def start(self):
+        """Запуск задачі запису."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    def enqueue(self, payload: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        Додавання повідомлення до черги без очікування відправки.
+
+        Якщо у черзі вже є повідомлення з тим самим ключем, воно замінюється новим.
+        Якщо черга заповнена, відкидається найстаріший стан з ключем (або найстаріше
+        повідомлення, якщо таких немає).
+
+        Args:
+            payload (Any): Підготовлене повідомлення (рядок JSON або бінарний кадр)
+            key (Optional[Hashable]): Ключ стану; None - повідомлення не замінюється
+
+        Returns:
+            bool: False, якщо клієнт закритий або занадто довго не встигає читати
+        """
+        if self.closed:
+            return False
+
+        if key is not None and key in self._queue:
+            self._queue[key] = payload
+            self.stats['replaced'] += 1
+            return True
+
+        if key is None:
+            self._seq += 1
+            key = self._seq
+
+        if len(self._queue) >= self.max_queue:
+            self._drop_oldest()
+            now = time.monotonic()
+            if self.overflow_since is None:
+                self.overflow_since = now
+            elif now - self.overflow_since > self.slow_timeout:
+                return False
+
+        self._queue[key] = payload
+        self._ready.set()
+        return True
+
+    async def close(self, code: Optional[int] = None):
+        """
+        Зупинка задачі запису.
+
+        Args:
+            code (Optional[int]): Код закриття з'єднання; None - з'єднання вже закрите клієнтом
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+        if code is not None:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика черги клієнта."""
+        return {
+            'client_id': id(self.websocket),
+            'format': 'binary' if self.binary else 'json',
+            'batch': self.batch,
+            'queue_depth': self.depth,
+            'overflowing': self.overflow_since is not None,
+            **self.stats
+        }
+
+    def _drop_oldest(self):
+        """Відкидання найстарішого стану з ключем або, якщо таких немає, найстарішого повідомлення."""
+        for key in self._queue:
+            if not isinstance(key, int):
+                del self._queue[key]
+                break
+        else:
+            self._queue.popitem(last=False)
+        self.stats['dropped'] += 1
+
+    async def _writer(self):
+        """Відправка повідомлень черги у порядку надходження."""
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    _, payload = self._queue.popitem(last=False)
+                    if isinstance(payload, bytes):
+                        await asyncio.wait_for(self.websocket.send_bytes(payload), self.send_timeout)
+                    else:
+                        await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+                    self.stats['sent'] += 1
+                self.overflow_since = None
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Client {id(self.websocket)}: перевищено час відправки ({self.send_timeout} с)")
+            await self.on_failure(self.websocket)
+        except Exception as e:
+            logger.error(f"Error sending message to client: {str(e)}")
+            await self.on_failure(self.websocket)
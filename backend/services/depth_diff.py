@@ -0,0 +1,74 @@
+"""
+Рівневі різниці глибини ордербуку для клієнтів.
+
+Для кожної книги і кількості рівнів зберігається стан, уже відправлений
+клієнтам. Нова підписка отримує снапшот цього стану з номером послідовності,
+далі відправляються лише змінені рівні (ціна, новий обсяг; обсяг 0 - рівень
+видалено або вийшов за межі вікна). Номер послідовності кожної різниці більший
+за попередній рівно на 1: пропуск означає, що клієнт має підписатися повторно.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from exchange_clients.orderbook import Level, OrderBook
+
+
+def _diff_side(previous: Dict[int, int], current: Dict[int, int]) -> List[Level]:
+    """
+    Змінені рівні однієї сторони книги.
+
+    Args:
+        previous (Dict[int, int]): Попередній стан {ціна: обсяг}
+        current (Dict[int, int]): Поточний стан {ціна: обсяг}
+
+    Returns:
+        List[Level]: [(ціна, новий обсяг)], обсяг 0 - рівень видалено
+    """
+    changes = [(price, size) for price, size in current.items() if previous.get(price) != size]
+    changes.extend((price, 0) for price in previous if price not in current)
+    changes.sort()
+    return changes
+
+
+class DepthDiffTracker:
+    """
+    Відправлений клієнтам стан верхніх рівнів однієї книги.
+    """
+
+    __slots__ = ('levels', 'sequence', 'asks', 'bids')
+
+    def __init__(self, levels: int):
+        """
+        Ініціалізація стану.
+
+        Args:
+            levels (int): Кількість рівнів на сторону
+        """
+        self.levels = levels
+        self.sequence = 0
+        self.asks: Dict[int, int] = {}
+        self.bids: Dict[int, int] = {}
+
+    def update(self, book: OrderBook) -> Optional[Tuple[List[Level], List[Level]]]:
+        """
+        Порівняння книги з відправленим станом і перехід до нового стану.
+
+        Args:
+            book (OrderBook): Поточний ордербук
+
+        Returns:
+            Optional[Tuple[List[Level], List[Level]]]: Змінені рівні (asks, bids) або None, якщо змін немає
+        """
+        asks = dict(book.top_asks(self.levels))
+        bids = dict(book.top_bids(self.levels))
+        ask_changes = _diff_side(self.asks, asks)
+        bid_changes = _diff_side(self.bids, bids)
+        if not ask_changes and not bid_changes:
+            return None
+
+        self.asks, self.bids = asks, bids
+        self.sequence += 1
+        return ask_changes, bid_changes
+
+    def snapshot(self) -> Tuple[List[Level], List[Level]]:
+        """Відправлений стан: (asks за зростанням ціни, bids за спаданням)."""
+        return sorted(self.asks.items()), sorted(self.bids.items(), reverse=True)
@@ -0,0 +1,334 @@
+"""
+Єдиний планувальник запитів ордербуків до бірж.
+
+Усі періодичні REST-запити (опитування HTTP-бірж, опитування клієнтів без
+push-оновлень, примусове оновлення CoinEx) виконуються через цей планувальник.
+Завдання розкладаються на хешованому колесі таймерів, кожне джерело має власну
+частоту, а для кожної пари (біржа, токен) одночасно виконується не більше
+одного запиту.
+"""
+import asyncio
+import logging
+import math
+import random
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import FETCH_CONCURRENCY, FETCH_TIMEOUT, INGEST_JITTER, INGEST_TICK, INGEST_WHEEL_SIZE
+
+# Налаштування логгера
+logger = logging.getLogger(__name__)
+
+# Ключ завдання: (джерело, токен)
+JobKey = Tuple[str, str]
+
+# Токен єдиного завдання джерела, яке одним запитом оновлює всі токени
+ALL_TOKENS = "*"
+
+
+class IngestSource:
+    """
+    Джерело даних: функція отримання ордербуку токена та параметри її виклику.
+    """
+
+    __slots__ = ('name', 'fetch', 'cadence', 'cadence_fn', 'timeout', 'semaphore', 'bulk', 'manual')
+
+    def __init__(self, name: str, fetch: Callable[[str], Awaitable], cadence: float,
+                 concurrency: int = FETCH_CONCURRENCY, timeout: float = FETCH_TIMEOUT,
+                 cadence_fn: Optional[Callable[[str], float]] = None, bulk: bool = False, manual: bool = False):
+        """
+        Ініціалізація джерела.
+
+        Args:
+            name (str): Назва джерела (зазвичай назва біржі)
+            fetch (Callable[[str], Awaitable]): Корутина отримання даних для токена
+            cadence (float): Інтервал між запитами для одного токена (секунди)
+            concurrency (int): Максимальна кількість одночасних запитів джерела
+            timeout (float): Граничний час одного запиту (секунди)
+            cadence_fn (Optional[Callable[[str], float]]): Інтервал для конкретного токена;
+                якщо задано, використовується замість cadence
+            bulk (bool): Джерело оновлює всі токени одним запитом (одне завдання з токеном ALL_TOKENS)
+            manual (bool): Джерело лише для позапланових запитів run_now (без періодичного опитування)
+        """
+        self.name = name
+        self.fetch = fetch
+        self.cadence = cadence
+        self.cadence_fn = cadence_fn
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bulk = bulk
+        self.manual = manual
+
+    def next_cadence(self, token: str) -> float:
+        """Інтервал до наступного запиту для токена (секунди)."""
+        if self.cadence_fn is not None:
+            return self.cadence_fn(token)
+        return self.cadence
+
+
+class IngestScheduler:
+    """
+    Планувальник запитів на хешованому колесі таймерів.
+
+    Колесо складається з INGEST_WHEEL_SIZE слотів по INGEST_TICK секунд.
+    Завдання з затримкою, більшою за оберт колеса, чекають потрібну кількість
+    обертів у своєму слоті. Після завершення запиту завдання перепланується
+    з інтервалом джерела та випадковим відхиленням (jitter), тож запити не
+    синхронізуються між токенами і біржами.
+    """
+
+    def __init__(self, tick: float = INGEST_TICK, wheel_size: int = INGEST_WHEEL_SIZE, jitter: float = INGEST_JITTER):
+        """
+        Ініціалізація планувальника.
+
+        Args:
+            tick (float): Тривалість одного слота колеса (секунди)
+            wheel_size (int): Кількість слотів колеса
+            jitter (float): Відносне випадкове відхилення інтервалу (0.1 = ±10%)
+        """
+        self.tick = tick
+        self.jitter = jitter
+        self._wheel: List[List[Tuple[int, JobKey, int]]] = [[] for _ in range(wheel_size)]  # [(оберти, ключ, покоління)]
+        self._cursor = 0
+        self._sources: Dict[str, IngestSource] = {}
+        self._generations: Dict[JobKey, int] = {}  # Заплановані завдання та їх актуальне покоління
+        self._in_flight: Dict[JobKey, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'fetches': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'skipped_in_flight': 0
+        }
+
+    def register_source(self, name: str, fetch: Callable[[str], Awaitable], cadence: float,
+                        tokens: Optional[List[str]] = None, concurrency: int = FETCH_CONCURRENCY,
+                        timeout: float = FETCH_TIMEOUT, cadence_fn: Optional[Callable[[str], float]] = None,
+                        bulk: bool = False, manual: bool = False):
+        """
+        Реєстрація джерела і планування запитів для його токенів.
+
+        Args:
+            name (str): Назва джерела
+            fetch (Callable[[str], Awaitable]): Корутина отримання даних для токена
+            cadence (float): Інтервал між запитами для одного токена (секунди)
+            tokens (Optional[List[str]]): Токени, які потрібно опитувати
+            concurrency (int): Максимальна кількість одночасних запитів джерела
+            timeout (float): Граничний час одного запиту (секунди)
+            cadence_fn (Optional[Callable[[str], float]]): Інтервал для конкретного токена
+                (адаптивне опитування); якщо не задано, всі токени опитуються з інтервалом cadence
+            bulk (bool): Джерело оновлює всі токени одним запитом: замість завдань для токенів
+                планується одне завдання (name, ALL_TOKENS), а fetch отримує ALL_TOKENS
+            manual (bool): Джерело лише для позапланових запитів run_now: токени не плануються,
+                але запити мають ті самі обмеження паралельності й таймаут
+        """
+        self._sources[name] = IngestSource(name, fetch, cadence, concurrency, timeout, cadence_fn, bulk, manual)
+        if manual:
+            tokens = []
+        elif bulk:
+            tokens = [ALL_TOKENS]
+        for token in tokens or []:
+            self.schedule(name, token)
+        logger.info(f"Ingest: зареєстровано джерело {name} (інтервал {cadence} с, токенів: {len(tokens or [])})")
+
+    def unregister_source(self, name: str):
+        """
+        Видалення джерела та всіх його завдань.
+
+        Args:
+            name (str): Назва джерела
+        """
+        self._sources.pop(name, None)
+        for key in [key for key in self._generations if key[0] == name]:
+            del self._generations[key]
+
+    def has_source(self, name: str) -> bool:
+        """Перевірка, чи зареєстроване джерело."""
+        return name in self._sources
+
+    def set_cadence(self, name: str, cadence: float):
+        """
+        Зміна інтервалу опитування джерела (діє з наступного планування токенів без cadence_fn).
+
+        Args:
+            name (str): Назва джерела
+            cadence (float): Новий інтервал (секунди)
+        """
+        source = self._sources.get(name)
+        if source is not None:
+            source.cadence = cadence
+
+    def schedule(self, name: str, token: str):
+        """
+        Планування опитування токена джерелом.
+        Перший запит розподіляється випадково в межах частки інтервалу, щоб не стартувати всі разом.
+
+        Args:
+            name (str): Назва джерела
+            token (str): Символ токена
+        """
+        source = self._sources.get(name)
+        key = (name, token)
+        if source is None or source.manual or key in self._generations:
+            return
+        self._generations[key] = 0
+        self._schedule(key, random.uniform(0, source.cadence * self.jitter))
+
+    def unschedule(self, name: str, token: str):
+        """
+        Скасування опитування токена джерелом. Запит, що вже виконується, буде завершено.
+
+        Args:
+            name (str): Назва джерела
+            token (str): Символ токена
+        """
+        self._generations.pop((name, token), None)
+
+    def add_token(self, token: str):
+        """Планування опитування токена всіма періодичними джерелами з окремим запитом для кожного токена."""
+        for name, source in self._sources.items():
+            if not source.bulk:
+                self.schedule(name, token)
+
+    def remove_token(self, token: str):
+        """Скасування опитування токена всіма джерелами."""
+        for key in [key for key in self._generations if key[1] == token]:
+            del self._generations[key]
+
+    async def run_now(self, name: str, token: str):
+        """
+        Позаплановий запит для токена.
+
+        Якщо запит для (name, token) вже виконується, очікуємо його завершення
+        замість запуску другого. Після запиту наступний плановий запит
+        відкладається на повний інтервал джерела.
+
+        Args:
+            name (str): Назва джерела
+            token (str): Символ токена
+        """
+        key = (name, token)
+        task = self._in_flight.get(key)
+        if task is None:
+            source = self._sources.get(name)
+            if source is None:
+                return
+            task = self._dispatch(key, source)
+        await asyncio.shield(task)
+
+    @property
+    def in_flight(self) -> int:
+        """Кількість запитів, що виконуються зараз."""
+        return len(self._in_flight)
+
+    def start(self):
+        """Запуск колеса таймерів."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("Ingest: планувальник запущено")
+
+    async def stop(self):
+        """Зупинка колеса таймерів та скасування запитів, що виконуються."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Ingest: планувальник зупинено")
+
+    def _schedule(self, key: JobKey, delay: float):
+        """
+        Розміщення завдання на колесі.
+        Нове покоління робить недійсними попередні записи цього завдання на колесі.
+
+        Args:
+            key (JobKey): Ключ завдання
+            delay (float): Затримка до запиту (секунди)
+        """
+        generation = self._generations[key] + 1
+        self._generations[key] = generation
+
+        size = len(self._wheel)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % size
+        self._wheel[slot].append(((ticks - 1) // size, key, generation))
+
+    def _next_delay(self, cadence: float) -> float:
+        """Інтервал до наступного запиту з випадковим відхиленням."""
+        return cadence * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def _run(self):
+        """Обертання колеса: кожен тік обробляється один слот."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+            self._cursor = (self._cursor + 1) % len(self._wheel)
+            due = self._wheel[self._cursor]
+            self._wheel[self._cursor] = waiting = []
+
+            for rounds, key, generation in due:
+                if self._generations.get(key) != generation:
+                    # Завдання скасоване або вже переплановане
+                    continue
+                if rounds:
+                    waiting.append((rounds - 1, key, generation))
+                    continue
+
+                source = self._sources.get(key[0])
+                if source is None:
+                    self._generations.pop(key, None)
+                elif key in self._in_flight:
+                    # Попередній запит ще виконується - не дублюємо його
+                    self.stats['skipped_in_flight'] += 1
+                    self._schedule(key, self._next_delay(source.next_cadence(key[1])))
+                else:
+                    self._dispatch(key, source)
+
+    def _dispatch(self, key: JobKey, source: IngestSource) -> asyncio.Task:
+        """
+        Запуск запиту для завдання.
+
+        Args:
+            key (JobKey): Ключ завдання
+            source (IngestSource): Джерело
+
+        Returns:
+            asyncio.Task: Задача запиту
+        """
+        task = self._in_flight[key] = asyncio.create_task(self._execute(key, source))
+        return task
+
+    async def _execute(self, key: JobKey, source: IngestSource):
+        """
+        Виконання запиту з обмеженням паралельності та таймаутом і перепланування завдання.
+
+        Args:
+            key (JobKey): Ключ завдання
+            source (IngestSource): Джерело
+        """
+        name, token = key
+        try:
+            async with source.semaphore:
+                await asyncio.wait_for(source.fetch(token), source.timeout)
+            self.stats['fetches'] += 1
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            logger.warning(f"Ingest: перевищено час очікування ({source.timeout} с) для {token} на {name}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Ingest: помилка запиту для {token} на {name}: {str(e)}")
+        finally:
+            self._in_flight.pop(key, None)
+            if key in self._generations and self._sources.get(name) is source:
+                self._schedule(key, self._next_delay(source.next_cadence(token)))
@@ -5,12 +5,20 @@ import asyncio
 import importlib
 import logging
 import time
-import json
+from functools import partial
 from typing import Dict, List, Any, Optional, Set, Tuple
 
-from config import CUMULATIVE_THRESHOLD
+from config import (
+    BULK_BBO_INTERVAL, CUMULATIVE_THRESHOLD, EFFECTIVE_PRICE_THRESHOLDS, FETCH_CONCURRENCY, FETCH_TIMEOUT,
+    ORDERBOOK_MAX_AGE, PUSH_STALE_AFTER
+)
 from services.websocket_manager import WebSocketManager
-from exchange_clients.base_client import BaseExchangeClient
+from services.ingest_scheduler import ALL_TOKENS, IngestScheduler
+from utils import log
+from exchange_clients.base_client import BaseExchangeClient, BulkBboMixin
+from exchange_clients.http_client import HttpExchangeClient
+from exchange_clients.orderbook import OrderBook
+from exchange_clients.transport import HttpTransport
 from exchange_clients.mexc import MEXCClient
 from exchange_clients.tradeogre import TradeOgreClient
 from exchange_clients.coinex import CoinExClient
@@ -18,6 +26,7 @@ from exchange_clients.xeggex import XeggexClient
 
 # Налаштування логгера
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
 
 
 class OrderbookManager:
@@ -38,20 +47,32 @@ class OrderbookManager:
         self.orderbooks: Dict[str, Dict[str, Dict[str, Any]]] = {}  # {token: {exchange: {'best_sell': '...', 'best_buy': '...'}}}
         self.polling_task = None
         self.last_update_time: Dict[str, Dict[str, float]] = {}  # {token: {exchange: timestamp}}
+        self.last_tops: Dict[Tuple[str, str], Tuple] = {}  # {(token, exchange): (best_ask, best_bid)} у тіках і лотах
         self.listen_tasks = {}  # Завдання для прослуховування WebSocket
-        self.polling_tasks = {}  # Завдання для polling HTTP бірж
-        self.connected_clients = set()  # Множина підключених WebSocket клієнтів
+        self.event_task = None  # Завдання обробки подій змін книг
+        self._pending_events: Dict[Tuple[str, str], None] = {}  # Впорядкована множина (token, exchange), що змінилися
+        self._events_ready = asyncio.Event()
         self.update_stats = {
             'total_updates': 0,
             'successful_updates': 0,
             'failed_updates': 0,
-            'last_error': None
+            'timeouts': 0,
+            'last_error': None,
+            'last_cycle_time': 0.0,
+            'cycle_times': {}  # {exchange: тривалість останнього циклу опитування, с}
         }
+        self.scheduler = IngestScheduler()  # Єдиний планувальник усіх періодичних запитів до бірж
+        self.transport = HttpTransport()  # Спільні пули HTTP-з'єднань для REST-запитів усіх бірж
     
     async def initialize(self, tokens: List[str], exchanges: List[Dict[str, Any]]):
         """Ініціалізація менеджера ордербуків"""
         self.tokens = tokens
         
+        # Ініціалізуємо структури даних
+        for token in tokens:
+            self.orderbooks[token] = {}
+            self.last_update_time[token] = {}
+        
         # Ініціалізуємо біржі
         for exchange_data in exchanges:
             try:
@@ -77,6 +98,10 @@ class OrderbookManager:
                         logger.warning(f"Unknown HTTP exchange: {exchange_name}")
                         continue
                 
+                # Підписуємося на події змін книг клієнта
+                client.on_book_update = self.notify_book_update
+                client.transport = self.transport
+                
                 # Додаємо токени до клієнта
                 for token in tokens:
                     await client.add_token(token)
@@ -87,6 +112,13 @@ class OrderbookManager:
                 # Зберігаємо клієнта
                 self.exchanges[exchange_name] = client
                 
+                # Книги, завантажені до реєстрації клієнта, обробляємо разом з першими подіями
+                for token in tokens:
+                    self.notify_book_update(exchange_name, token)
+                
+                # Плануємо періодичні запити, якщо біржа їх потребує
+                self._register_ingest(exchange_name, client)
+                
                 # Відправляємо статус підключення
                 await self.websocket_manager.broadcast({
                     "type": "exchange_status",
@@ -101,14 +133,7 @@ class OrderbookManager:
                     "exchange": exchange_name,
                     "status": "error"
                 })
-        
-        # Ініціалізуємо структури даних
-        for token in tokens:
-            self.orderbooks[token] = {}
-            self.last_update_time[token] = {}
-            
-        # Оновлюємо дані
-        await self.update_orderbooks()
+
     
     async def add_exchange(self, exchange_data: Dict[str, Any]):
         """
@@ -147,6 +172,10 @@ class OrderbookManager:
                     from exchange_clients.http_client import HttpExchangeClient
                     client = HttpExchangeClient(name, url, config)
             
+            # Підписуємося на події змін книг клієнта
+            client.on_book_update = self.notify_book_update
+            client.transport = self.transport
+            
             # Додаємо токени до клієнта
             for token in self.tokens:
                 await client.add_token(token)
@@ -164,30 +193,19 @@ class OrderbookManager:
             
             # Додаємо клієнта до списку
             self.exchanges[name] = client
+            for token in self.tokens:
+                self.notify_book_update(name, token)
+            self._register_ingest(name, client)
             
             # Запускаємо прослуховування для WebSocket клієнтів
             if hasattr(client, 'listen') and name != "Xeggex":
                 self.listen_tasks[name] = asyncio.create_task(client.listen())
             
-            # Запускаємо polling для HTTP клієнтів
-            if client_type == 'http':
-                self.polling_tasks[name] = asyncio.create_task(self._poll_exchange(name))
-            
             logger.info(f"Added exchange {name}")
             
         except Exception as e:
             logger.error(f"Error adding exchange {name}: {str(e)}")
     
-    async def _poll_exchange(self, exchange_name: str):
-        """Оновлення даних для конкретної біржі."""
-        while True:
-            try:
-                await self.update_orderbooks()
-                await asyncio.sleep(1)  # Оновлюємо кожну секунду
-            except Exception as e:
-                logger.error(f"Error polling exchange {exchange_name}: {str(e)}")
-                await asyncio.sleep(1)  # Чекаємо перед повторною спробою
-    
     async def remove_exchange(self, exchange_name: str):
         """
         Видалення біржі.
@@ -205,11 +223,16 @@ class OrderbookManager:
                 self.listen_tasks[exchange_name].cancel()
                 del self.listen_tasks[exchange_name]
             
+            # Зупиняємо планові запити до біржі
+            self.scheduler.unregister_source(exchange_name)
+            self.scheduler.unregister_source(self._bbo_source(exchange_name))
+            
             # Відключаємо клієнта
             await self.exchanges[exchange_name].close()
             
             # Видаляємо клієнта зі списку
             del self.exchanges[exchange_name]
+            self.update_stats['cycle_times'].pop(exchange_name, None)
             
             # Видаляємо запис для цієї біржі з ордербуків
             for token in self.orderbooks:
@@ -218,6 +241,8 @@ class OrderbookManager:
                 
                 if token in self.last_update_time and exchange_name in self.last_update_time[token]:
                     del self.last_update_time[token][exchange_name]
+                
+                self.last_tops.pop((token, exchange_name), None)
             
             logger.info(f"Removed exchange {exchange_name}")
             
@@ -253,6 +278,9 @@ class OrderbookManager:
                 }
                 self.last_update_time[token][exchange_name] = 0
             
+            # Плануємо запити для токена в усіх джерелах планувальника
+            self.scheduler.add_token(token)
+            
             logger.info(f"Added token {token}")
             
         except Exception as e:
@@ -272,6 +300,7 @@ class OrderbookManager:
         try:
             # Видаляємо токен зі списку
             self.tokens.remove(token)
+            self.scheduler.remove_token(token)
             
             # Видаляємо токен з усіх клієнтів бірж
             for exchange_name, client in self.exchanges.items():
@@ -284,370 +313,269 @@ class OrderbookManager:
             if token in self.last_update_time:
                 del self.last_update_time[token]
             
+            for exchange_name in self.exchanges:
+                self.last_tops.pop((token, exchange_name), None)
+            
             logger.info(f"Removed token {token}")
             
         except Exception as e:
             logger.error(f"Error removing token {token}: {str(e)}")
     
-    async def _get_coinex_orderbook(self, client, token: str) -> Dict[str, Any]:
+    def _is_valid_top(self, top: Optional[Tuple]) -> bool:
         """
-        Отримання даних ордербуку для CoinEx.
+        Перевірка валідності верхівки ордербуку.
+        
+        Ціни порівнюються як цілі числа тіків, тож рядки не розбираються повторно.
         
         Args:
-            client: Клієнт CoinEx
-            token (str): Символ токена
+            top (Optional[Tuple]): (best_ask, best_bid) біржі для токена (BaseExchangeClient.get_top)
             
         Returns:
-            Dict[str, Any]: Дані ордербуку
+            bool: True якщо ціни валідні, False в іншому випадку
         """
-        try:
-            # Отримуємо дані через REST API
-            orderbook = await client.get_orderbook(token)
-            if not orderbook:
-                logger.warning(f"CoinEx: No orderbook data for {token}")
-                return None
-                
-            # Форматуємо дані
-            asks = orderbook.get('asks', [])
-            bids = orderbook.get('bids', [])
+        if top is None:
+            return False
             
-            if not asks or not bids:
-                logger.warning(f"CoinEx: Empty orderbook for {token}")
-                return None
-                
-            # Отримуємо найкращі ціни
-            best_sell = orderbook.get('best_sell')
-            best_buy = orderbook.get('best_buy')
+        best_ask, best_bid = top
+        
+        # Перевіряємо наявність обох сторін книги
+        if not best_ask or not best_bid:
+            return False
             
-            if not best_sell or not best_buy:
-                logger.warning(f"CoinEx: Missing best prices for {token}")
-                return None
-                
-            return {
-                'asks': asks,
-                'bids': bids,
-                'best_sell': best_sell,
-                'best_buy': best_buy
-            }
+        # Перевіряємо на позитивні значення
+        if best_ask[0] <= 0 or best_bid[0] <= 0:
+            return False
             
+        # Перевіряємо на розумну різницю між цінами
+        return best_ask[0] >= best_bid[0]
+
+    async def _broadcast_update(self, exchange: str, token: str, data: Dict[str, Any]):
+        """Відправка оновлення ордербуку всім підключеним клієнтам."""
+        try:
+            await self.websocket_manager.broadcast_orderbook_update(
+                exchange, token, data.get('best_sell'), data.get('best_buy')
+            )
         except Exception as e:
-            logger.error(f"Error getting CoinEx orderbook for {token}: {str(e)}")
-            return None
+            logger.error(f"Error broadcasting update: {str(e)}")
 
-    async def _get_standard_orderbook(self, client, token: str) -> Dict[str, Any]:
+    async def update_orderbooks(self, exchange_names: Optional[List[str]] = None):
+        """
+        Позапланове оновлення ордербуків для всіх токенів на біржах.
+        
+        Біржі оновлюються паралельно через планувальник: запит, що вже виконується,
+        не дублюється, а паралельність і таймаут визначає джерело біржі, тож час
+        циклу визначається найповільнішим окремим запитом, а не їх сумою.
+        
+        Args:
+            exchange_names (Optional[List[str]]): Біржі для оновлення; None - всі біржі
+        """
+        self.update_stats['total_updates'] += 1
+        start_time = time.perf_counter()
+        
+        logger.info(f"Початок оновлення ордербуків. Всього бірж: {len(self.exchanges)}, токенів: {len(self.tokens)}")
+        
+        await asyncio.gather(*(
+            self._update_exchange(exchange_name)
+            for exchange_name in list(self.exchanges)
+            if exchange_names is None or exchange_name in exchange_names
+        ))
+        
+        self.update_stats['last_cycle_time'] = time.perf_counter() - start_time
+        logger.info(f"Завершено оновлення ордербуків. Статистика: {self.update_stats}")
+    
+    async def _update_exchange(self, exchange_name: str):
+        """
+        Позаплановий запит усіх токенів однієї біржі через її джерело в планувальнику.
+        
+        Args:
+            exchange_name (str): Назва біржі
+        """
+        start_time = time.perf_counter()
+        
+        await asyncio.gather(*(self.refresh_token(exchange_name, token) for token in list(self.tokens)))
+        
+        cycle_time = time.perf_counter() - start_time
+        self.update_stats['cycle_times'][exchange_name] = cycle_time
+        logger.info(f"Біржу {exchange_name} оновлено за {cycle_time:.3f} с")
+    
+    async def refresh_token(self, exchange_name: str, token: str):
         """
-        Отримання даних ордербуку в стандартному форматі.
+        Позаплановий запит одного токена біржі через її джерело в планувальнику.
         
         Args:
-            client: Клієнт біржі
+            exchange_name (str): Назва біржі
             token (str): Символ токена
-            
-        Returns:
-            Dict[str, Any]: Дані ордербуку
         """
-        try:
-            # Отримуємо дані ордербуку
-            orderbook_data = await client.get_orderbook(token)
-            if not orderbook_data:
-                logger.warning(f"No orderbook data received for {token}")
-                return None
-                
-            # Перевіряємо наявність необхідних полів
-            if not isinstance(orderbook_data, dict):
-                logger.warning(f"Invalid orderbook data format for {token}")
-                return None
-                
-            # Отримуємо asks та bids
-            asks = orderbook_data.get('asks', [])
-            bids = orderbook_data.get('bids', [])
-            
-            if not asks or not bids:
-                logger.warning(f"Empty orderbook for {token}")
-                return None
-                
-            # Отримуємо найкращі ціни
-            best_sell = asks[0][0] if asks else None
-            best_buy = bids[0][0] if bids else None
-            
-            if not best_sell or not best_buy:
-                logger.warning(f"Missing best prices for {token}")
-                return None
-                
-            # Форматуємо дані
-            formatted_data = {
-                'asks': asks,
-                'bids': bids,
-                'best_sell': best_sell,
-                'best_buy': best_buy
-            }
-            
-            logger.info(f"Formatted orderbook data for {token}: sell={best_sell}, buy={best_buy}")
-            return formatted_data
-            
-        except Exception as e:
-            logger.error(f"Error getting standard orderbook for {token}: {str(e)}")
-            return None
-
-    def _is_valid_prices(self, best_sell: Any, best_buy: Any) -> bool:
+        bbo_source = self._bbo_source(exchange_name)
+        if self.scheduler.has_source(bbo_source):
+            # Книги з живим потоком актуальні, решту оновлює джерело найкращих цін одним запитом
+            await self.scheduler.run_now(bbo_source, ALL_TOKENS)
+        else:
+            await self.scheduler.run_now(exchange_name, token)
+    
+    async def _poll_token(self, exchange_name: str, token: str):
         """
-        Перевірка валідності цін.
+        Запит ордербуку через обробник біржі (викликається планувальником: плановий для бірж
+        без push-оновлень, позаплановий при ручному оновленні - для решти).
         
         Args:
-            best_sell: Найкраща ціна продажу
-            best_buy: Найкраща ціна покупки
-            
-        Returns:
-            bool: True якщо ціни валідні, False в іншому випадку
+            exchange_name (str): Назва біржі
+            token (str): Символ токена
         """
-        try:
-            # Перевіряємо на None або пусті значення
-            if best_sell is None or best_buy is None:
-                return False
-                
-            # Перевіряємо на плейсхолдер
-            if best_sell == 'X X X' or best_buy == 'X X X':
-                return False
-                
-            # Перевіряємо на числові значення
-            sell_price = float(best_sell)
-            buy_price = float(best_buy)
-            
-            # Перевіряємо на позитивні значення
-            if sell_price <= 0 or buy_price <= 0:
-                return False
-                
-            # Перевіряємо на розумну різницю між цінами
-            if sell_price < buy_price:
-                return False
-                
-            return True
-            
-        except (ValueError, TypeError):
-            return False
-
-    def _update_orderbook_cache(self, exchange: str, token: str, data: Dict[str, Any]):
+        client = self.exchanges.get(exchange_name)
+        if client is None:
+            return
+        # Завантажена книга надходить у кеш і клієнтам подією зміни (_handle_book_event)
+        if not await client.get_orderbook(token):
+            logger.warning(f"Не отримано даних ордербуку для {token} на {exchange_name}")
+            self.update_stats['failed_updates'] += 1
+    
+    async def _poll_bulk_bbo(self, exchange_name: str, key: str = ALL_TOKENS):
         """
-        Оновлення кешу ордербуку.
+        Плановий запит найкращих цін усіх токенів біржі одним запитом (викликається планувальником).
+        
+        Ціни запитуються лише для книг без живого потоку і надходять у менеджер подіями змін книг,
+        тож кеш і last_tops оновлюються так само, як для потокових оновлень; глибину книг вони не
+        замінюють. Книги без потоку, які переглядають клієнти, отримують повний знімок глибини.
+        
+        Args:
+            exchange_name (str): Назва біржі
+            key (str): Токен завдання планувальника (ALL_TOKENS)
+        """
+        client = self.exchanges.get(exchange_name)
+        if client is None:
+            return
+        depth_tokens = [
+            token for token in self.tokens
+            if self.websocket_manager.has_depth_subscribers(token, exchange_name) and not client.has_live_stream(token)
+        ]
+        bbo_tokens = [token for token in self.tokens if token not in depth_tokens]
+        await asyncio.gather(
+            client.refresh_bulk_bbo(bbo_tokens),
+            *(client.get_orderbook(token) for token in depth_tokens)
+        )
+    
+    async def refresh_all(self):
+        """Примусове оновлення ордербуків на всіх біржах."""
+        await self.update_orderbooks()
+    
+    def notify_book_update(self, exchange: str, token: str):
+        """
+        Прийом події про зміну книги від клієнта біржі.
+        
+        Події для одного (token, exchange) зливаються до обробки, тож сплеск
+        оновлень книги дає одне порівняння верхівки.
         
         Args:
             exchange (str): Назва біржі
             token (str): Символ токена
-            data (Dict[str, Any]): Дані ордербуку
         """
-        try:
-            if not data or not isinstance(data, dict):
-                logger.warning(f"Invalid orderbook data for {token} on {exchange}")
-                return
-                
-            # Спеціальна обробка для Xeggex
-            if exchange == "Xeggex":
-                logger.info(f"Оновлення кешу ордербуку для {token} на {exchange}")
-                asks = data.get('asks', [])
-                bids = data.get('bids', [])
-                
-                logger.info(f"Кількість asks: {len(asks)}, bids: {len(bids)}")
-                logger.info(f"Xeggex data in _update_orderbook_cache: asks={asks}, bids={bids}")
-                
-                if not asks or not bids:
-                    logger.warning(f"Empty orderbook for {token} on Xeggex")
-                    return
-                    
-                best_sell = asks[0]['price'] if asks else None
-                best_buy = bids[0]['price'] if bids else None
-                
-                logger.info(f"Найкращі ціни для {token}: sell={best_sell}, buy={best_buy}")
-                logger.info(f"Типи даних: sell={type(best_sell)}, buy={type(best_buy)}")
-                logger.info(f"Повні дані asks[0]: {json.dumps(asks[0], indent=2)}")
-                logger.info(f"Повні дані bids[0]: {json.dumps(bids[0], indent=2)}")
-                
-                if not best_sell or not best_buy:
-                    logger.warning(f"Missing best prices for {token} on Xeggex")
-                    return
-                    
-                # Оновлюємо кеш
-                self.orderbooks[token][exchange] = {
-                    'asks': asks,
-                    'bids': bids,
-                    'best_sell': best_sell,
-                    'best_buy': best_buy
-                }
-                self.last_update_time[token][exchange] = time.time()
-                
-                # Відправляємо оновлення
-                asyncio.create_task(self._broadcast_update(exchange, token, {
-                    'best_sell': best_sell,
-                    'best_buy': best_buy
-                }))
-            else:
-                # Стандартна обробка для інших бірж
-                best_sell = data.get('best_sell')
-                best_buy = data.get('best_buy')
-                
-                if best_sell and best_buy:
-                    self.orderbooks[token][exchange] = {
-                        'asks': data.get('asks', []),
-                        'bids': data.get('bids', []),
-                        'best_sell': best_sell,
-                        'best_buy': best_buy
-                    }
-                    self.last_update_time[token][exchange] = time.time()
-                    
-                    # Відправляємо оновлення
-                    asyncio.create_task(self._broadcast_update(exchange, token, data))
-                    
-        except Exception as e:
-            logger.error(f"Error updating orderbook cache for {token} on {exchange}: {str(e)}")
-
-    async def _broadcast_update(self, exchange: str, token: str, data: Dict[str, Any]):
-        """Відправка оновлення ордербуку всім підключеним клієнтам."""
-        try:
-            # Форматуємо дані для відправки
-            if exchange == "Xeggex":
-                # Для Xeggex використовуємо спеціальний формат
-                message = {
-                    "type": "orderbook_update",
-                    "exchange": exchange,
-                    "token": token,
-                    "data": {
-                        "best_sell": data.get('best_sell'),
-                        "best_buy": data.get('best_buy')
-                    }
-                }
-            else:
-                # Для інших бірж використовуємо стандартний формат
-                message = {
-                    "type": "orderbook_update",
-                    "exchange": exchange,
-                    "token": token,
-                    "data": {
-                        "asks": data.get('asks', []),
-                        "bids": data.get('bids', []),
-                        "best_sell": data.get('best_sell'),
-                        "best_buy": data.get('best_buy')
-                    }
-                }
+        self._pending_events[(token, exchange)] = None
+        self._events_ready.set()
+    
+    async def _process_book_events(self):
+        """Обробка подій змін книг у міру їх надходження."""
+        while True:
+            await self._events_ready.wait()
+            self._events_ready.clear()
             
-            # Відправляємо оновлення всім підключеним клієнтам
-            for websocket in self.connected_clients:
+            events, self._pending_events = self._pending_events, {}
+            for token, exchange in events:
                 try:
-                    await websocket.send(json.dumps(message))
+                    await self._handle_book_event(token, exchange)
                 except Exception as e:
-                    logger.error(f"Error sending update to client: {str(e)}")
-                    await self._remove_client(websocket)
-                    
-        except Exception as e:
-            logger.error(f"Error broadcasting update: {str(e)}")
-
-    async def _handle_error(self, exchange: str, token: str, error: Exception):
+                    logger.error(f"Помилка при обробці оновлення {token} на {exchange}: {str(e)}")
+                    self.update_stats['failed_updates'] += 1
+                    self.update_stats['last_error'] = str(e)
+    
+    async def _handle_book_event(self, token: str, exchange: str):
         """
-        Обробка помилок при оновленні ордербуку.
+        Реакція на зміну книги: оновлення кешу і відправка нових найкращих цін.
         
         Args:
-            exchange (str): Назва біржі
             token (str): Символ токена
-            error (Exception): Об'єкт помилки
+            exchange (str): Назва біржі
         """
-        try:
-            # Логуємо помилку
-            logger.error(f"Error updating orderbook for {token} on {exchange}: {str(error)}")
-            
-            # Оновлюємо статистику
-            self.update_stats['failed_updates'] += 1
-            
-            # Відправляємо повідомлення про помилку
-            error_message = {
-                "type": "error",
-                "exchange": exchange,
-                "token": token,
-                "message": str(error)
-            }
+        client = self.exchanges.get(exchange)
+        if client is None or token not in self.orderbooks:
+            return
             
-            # Відправляємо повідомлення всім підключеним клієнтам
-            for websocket in self.connected_clients:
-                try:
-                    await websocket.send(json.dumps(error_message))
-                except Exception as e:
-                    logger.error(f"Error sending error message to client: {str(e)}")
-                    await self._remove_client(websocket)
-                    
-        except Exception as e:
-            logger.error(f"Error handling error: {str(e)}")
-
-    async def update_orderbooks(self):
-        """Оновлення ордербуків для всіх токенів на всіх біржах"""
+        book = client.get_book(token)
+        top = client.get_top(token)
+        
+        # Глибину отримують лише клієнти, які відкрили цю книгу, незалежно від зміни верхівки
+        if book is not None and self.websocket_manager.has_depth_subscribers(token, exchange):
+            await self.websocket_manager.broadcast_orderbook_depth(exchange, token, book)
+        
+        # Точне порівняння цілочисельної верхівки книги з попередньою
+        if top == self.last_tops.get((token, exchange)) or not self._is_valid_top(top):
+            return
+        self.last_tops[(token, exchange)] = top
+        
+        scale = client.market_scale(client.book_key(token))
+        data = {
+            'best_sell': scale.display_price(top[0][0]),
+            'best_buy': scale.display_price(top[1][0])
+        }
+        self.orderbooks[token][exchange] = data
+        self.last_update_time[token][exchange] = time.time()
         self.update_stats['total_updates'] += 1
-        current_time = time.time()
+        self.update_stats['successful_updates'] += 1
         
-        logger.info(f"Початок оновлення ордербуків. Всього бірж: {len(self.exchanges)}, токенів: {len(self.tokens)}")
+        await self._broadcast_update(exchange, token, data)
+    
+    def _register_ingest(self, exchange_name: str, client: BaseExchangeClient):
+        """
+        Реєстрація біржі в планувальнику запитів.
+        HTTP-біржі опитуються через власний запит клієнта, інші клієнти без push-оновлень -
+        через звичайне отримання ордербуку. Біржі з push-оновленнями періодично не опитуються,
+        крім найкращих цін одним запитом (bulk_bbo) для книг без живого потоку; без bulk_bbo
+        вони реєструються як джерело лише для ручного оновлення (run_now).
         
-        for exchange_name, client in self.exchanges.items():
-            logger.info(f"Обробка біржі {exchange_name}")
-            
-            for token in self.tokens:
-                try:
-                    # Перевіряємо час останнього оновлення
-                    last_update = self.last_update_time.get(token, {}).get(exchange_name, 0)
-                    if current_time - last_update < 1:  # Пропускаємо якщо пройшло менше 1 секунди
-                        logger.debug(f"Пропускаємо оновлення для {token} на {exchange_name} - занадто швидко")
-                        continue
-                        
-                    logger.info(f"Отримання даних ордербуку для {token} на {exchange_name}")
-                    
-                    # Отримуємо дані ордербуку
-                    orderbook_data = None
-                    if exchange_name == "CoinEx":
-                        orderbook_data = await self._get_coinex_orderbook(client, token)
-                    elif exchange_name == "TradeOgre":
-                        orderbook_data = await self._get_tradeogre_orderbook(client, token)
-                    elif exchange_name == "Xeggex":
-                        # Для Xeggex використовуємо спеціальну обробку
-                        orderbook_data = await self._get_xeggex_orderbook(client, token)
-                    else:
-                        orderbook_data = await self._get_standard_orderbook(client, token)
-                        
-                    if orderbook_data:
-                        best_sell = orderbook_data.get('best_sell')
-                        best_buy = orderbook_data.get('best_buy')
-                        
-                        logger.info(f"Отримано дані для {token} на {exchange_name}: sell={best_sell}, buy={best_buy}")
-                        
-                        # Перевіряємо чи змінилися ціни
-                        current_data = self.orderbooks.get(token, {}).get(exchange_name, {})
-                        current_sell = current_data.get('best_sell')
-                        current_buy = current_data.get('best_buy')
-                        
-                        if (best_sell != current_sell or best_buy != current_buy) and self._is_valid_prices(best_sell, best_buy):
-                            logger.info(f"Ціни змінилися для {token} на {exchange_name}")
-                            logger.info(f"Стара ціна: sell={current_sell}, buy={current_buy}")
-                            logger.info(f"Нова ціна: sell={best_sell}, buy={best_buy}")
-                            
-                            # Оновлюємо кеш
-                            self._update_orderbook_cache(exchange_name, token, orderbook_data)
-                            
-                            # Відправляємо оновлення
-                            await self._broadcast_update(exchange_name, token, orderbook_data)
-                            
-                            self.update_stats['successful_updates'] += 1
-                        else:
-                            logger.debug(f"Ціни не змінилися для {token} на {exchange_name}")
-                    else:
-                        logger.warning(f"Не отримано даних ордербуку для {token} на {exchange_name}")
-                        self.update_stats['failed_updates'] += 1
-                        
-                except Exception as e:
-                    logger.error(f"Помилка при оновленні ордербуку для {token} на {exchange_name}: {str(e)}")
-                    self.update_stats['failed_updates'] += 1
-                    self.update_stats['last_error'] = str(e)
-                    await self._handle_error(exchange_name, token, e)
-                    
-        logger.info(f"Завершено оновлення ордербуків. Статистика: {self.update_stats}")
-        await asyncio.sleep(0.1)  # Невелика затримка між циклами
+        Args:
+            exchange_name (str): Назва біржі
+            client (BaseExchangeClient): Клієнт біржі
+        """
+        if isinstance(client, BulkBboMixin) and client.bulk_bbo:
+            # Книги без живого потоку - найкращі ціни всіх токенів одним запитом
+            self.scheduler.register_source(
+                self._bbo_source(exchange_name), partial(self._poll_bulk_bbo, exchange_name),
+                client.config.get('bulk_bbo_interval', BULK_BBO_INTERVAL),
+                timeout=client.config.get('fetch_timeout', FETCH_TIMEOUT),
+                bulk=True
+            )
+        
+        cadence_fn = None
+        manual = False
+        if isinstance(client, HttpExchangeClient):
+            # Інтервал кожного токена адаптується до частоти змін його книги
+            fetch, cadence, cadence_fn = client.poll_once, client.polling_interval, client.next_poll_interval
+        elif not client.push_updates:
+            fetch, cadence = partial(self._poll_token, exchange_name), client.config.get('polling_interval', 1)
+        elif self.scheduler.has_source(self._bbo_source(exchange_name)):
+            return
+        else:
+            fetch, cadence, manual = partial(self._poll_token, exchange_name), 0, True
+        
+        self.scheduler.register_source(
+            exchange_name, fetch, cadence,
+            tokens=self.tokens,
+            concurrency=client.config.get('fetch_concurrency', FETCH_CONCURRENCY),
+            timeout=client.config.get('fetch_timeout', FETCH_TIMEOUT),
+            cadence_fn=cadence_fn,
+            manual=manual
+        )
+    
+    @staticmethod
+    def _bbo_source(exchange_name: str) -> str:
+        """Назва джерела планувальника для найкращих цін біржі одним запитом."""
+        return f"{exchange_name}:bbo"
     
     async def start_polling(self):
-        """Запуск періодичного оновлення ордербуків."""
-        while True:
-            await self.update_orderbooks()
-            await asyncio.sleep(1)  # Оновлюємо кожну секунду
+        """Запуск обробки подій змін книг та планувальника запитів до бірж."""
+        if self.event_task is None or self.event_task.done():
+            self.event_task = asyncio.create_task(self._process_book_events())
+        self.scheduler.start()
     
     async def close_all_connections(self):
         """Закриття всіх з'єднань."""
@@ -656,30 +584,121 @@ class OrderbookManager:
             task.cancel()
         self.listen_tasks.clear()
         
+        # Зупиняємо обробку подій змін книг
+        if self.event_task is not None:
+            self.event_task.cancel()
+            self.event_task = None
+        
+        # Зупиняємо планувальник запитів
+        await self.scheduler.stop()
+        
         # Закриваємо всі з'єднання
         for exchange_name, client in self.exchanges.items():
             try:
                 await client.close()
             except Exception as e:
                 logger.error(f"Error closing connection for {exchange_name}: {str(e)}")
+        
+        # Закриваємо спільні HTTP-з'єднання
+        await self.transport.close()
     
     def get_all_orderbooks(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
         """Отримання всіх ордербуків."""
         return self.orderbooks
 
-    async def get_orderbook(self, token: str, exchange: str) -> Optional[Dict[str, List[Dict[str, str]]]]:
-        """Отримання даних ордербуку для конкретного токена на біржі."""
+    async def get_effective_prices(self, token: str, thresholds: Optional[List[float]] = None,
+                                   exchange: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Ціни виконання для кількох порогів обсягу на одній або всіх біржах.
+        
+        Порожні або застарілі локальні книги спершу оновлюються повною глибиною через get_orderbook клієнта.
+        
+        Args:
+            token (str): Символ токена
+            thresholds (Optional[List[float]]): Пороги в USDT; за замовчуванням EFFECTIVE_PRICE_THRESHOLDS
+            exchange (Optional[str]): Назва біржі; None - всі біржі
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: {exchange: [{'threshold', 'best_sell', 'best_buy'}, ...]}
+        """
+        thresholds = thresholds or EFFECTIVE_PRICE_THRESHOLDS
+        exchanges = [exchange] if exchange else list(self.exchanges)
+        
+        clients = {}
+        for exchange_name in exchanges:
+            client = self.exchanges.get(exchange_name)
+            if client is None:
+                logger.warning(f"Exchange {exchange_name} not found")
+                continue
+            clients[exchange_name] = client
+            
+        await asyncio.gather(*(self._ensure_depth(client, token) for client in clients.values()))
+        return {
+            exchange_name: client.get_effective_prices(token, thresholds)
+            for exchange_name, client in clients.items()
+        }
+    
+    async def _ensure_depth(self, client: BaseExchangeClient, token: str):
+        """
+        Запит глибини в біржі, якщо локальна книга токена порожня або застаріла
+        (get_orderbook клієнта оновлює локальну книгу).
+        
+        Args:
+            client (BaseExchangeClient): Клієнт біржі
+            token (str): Символ токена
+        """
+        book = client.get_book(token)
+        if book is not None and self._is_fresh_book(client, token, book):
+            return
+        try:
+            await client.get_orderbook(token)
+        except Exception as e:
+            logger.error(f"Error getting orderbook for {token} on {client.name}: {str(e)}")
+
+    def get_book(self, token: str, exchange: str) -> Optional[OrderBook]:
+        """
+        Локальний ордербук токена на біржі.
+        
+        Args:
+            token (str): Символ токена
+            exchange (str): Назва біржі
+            
+        Returns:
+            Optional[OrderBook]: Ордербук або None, якщо біржа чи токен не відстежуються
+        """
+        client = self.exchanges.get(exchange)
+        return client.get_book(token) if client is not None else None
+    
+    async def get_orderbook(self, token: str, exchange: str) -> Optional[Dict[str, Any]]:
+        """
+        Отримання даних ордербуку для конкретного токена на біржі.
+        Відповідь формується з локальної книги, яку підтримують потоки бірж і планувальник запитів;
+        REST-запит до біржі виконується лише якщо книга порожня або застаріла.
+        
+        Args:
+            token (str): Символ токена
+            exchange (str): Назва біржі
+            
+        Returns:
+            Optional[Dict[str, Any]]: {'asks', 'bids', 'updated_at' (мс), 'source' ('memory' або 'rest')}
+        """
         if exchange not in self.exchanges:
             logger.error(f"Exchange {exchange} not found")
             return None
             
-        try:
-            # Отримуємо дані ордербуку від клієнта біржі
-            client = self.exchanges[exchange]
-            logger.info(f"Запит ордербуку для {token} на {exchange}")
+        client = self.exchanges[exchange]
+        book = client.get_book(token)
+        if book is not None and self._is_fresh_book(client, token, book):
+            return {
+                **book.to_dict(),
+                "updated_at": int(book.updated_at * 1000),
+                "source": "memory"
+            }
             
+        try:
+            # Локальна книга порожня або застаріла - запитуємо біржу
+            logger.info(f"Запит ордербуку для {token} на {exchange} через REST")
             orderbook_data = await client.get_orderbook(token)
-            logger.info(f"Отримані дані ордербуку для {token} на {exchange}: {json.dumps(orderbook_data, indent=2, ensure_ascii=False)}")
             
             if not orderbook_data:
                 logger.warning(f"Немає даних ордербуку для {token} на {exchange}")
@@ -690,14 +709,13 @@ class OrderbookManager:
                 
             asks = orderbook_data.get('asks', [])
             bids = orderbook_data.get('bids', [])
-            
-            logger.info(f"Форматовані дані для {token} на {exchange}:")
-            logger.info(f"asks: {json.dumps(asks[:5], indent=2)}")
-            logger.info(f"bids: {json.dumps(bids[:5], indent=2)}")
+            hot_log.debug("REST ордербук для %s на %s: asks=%d, bids=%d", token, exchange, len(asks), len(bids))
             
             return {
                 "asks": asks,
-                "bids": bids
+                "bids": bids,
+                "updated_at": int(time.time() * 1000),
+                "source": "rest"
             }
             
         except Exception as e:
@@ -706,106 +724,48 @@ class OrderbookManager:
                 "asks": [],
                 "bids": []
             }
-
-    async def _get_tradeogre_orderbook(self, client, token: str) -> Dict[str, Any]:
+    
+    def _is_fresh_book(self, client: BaseExchangeClient, token: str, book: OrderBook) -> bool:
         """
-        Отримання даних ордербуку для TradeOgre.
+        Перевірка, чи можна відповісти локальною книгою без запиту до біржі.
+        
+        Книга потокового клієнта з живим потоком токена (client.has_live_stream) актуальна, поки
+        змінювалася не раніше ніж push_stale_after секунд тому (довша тиша означає, що потік для книги
+        міг зупинитися). Для інших клієнтів і книг без живого потоку (потік перепідписується чи
+        синхронізується) книга має бути оновлена не раніше ніж orderbook_max_age секунд тому
+        (для HTTP-бірж - не менше двох інтервалів опитування токена).
         
         Args:
-            client: Клієнт TradeOgre
+            client (BaseExchangeClient): Клієнт біржі
             token (str): Символ токена
+            book (OrderBook): Локальна книга
             
         Returns:
-            Dict[str, Any]: Дані ордербуку
+            bool: True, якщо книга непорожня і актуальна
         """
-        try:
-            # Отримуємо дані через REST API
-            orderbook = await client.get_orderbook(token)
-            if not orderbook:
-                logger.warning(f"TradeOgre: No orderbook data for {token}")
-                return None
-                
-            # Форматуємо дані
-            asks = orderbook.get('asks', [])
-            bids = orderbook.get('bids', [])
-            
-            if not asks or not bids:
-                logger.warning(f"TradeOgre: Empty orderbook for {token}")
-                return None
-                
-            # Отримуємо найкращі ціни
-            best_sell = orderbook.get('best_sell')
-            best_buy = orderbook.get('best_buy')
-            
-            if not best_sell or not best_buy:
-                logger.warning(f"TradeOgre: Missing best prices for {token}")
-                return None
-                
-            return {
-                'asks': asks,
-                'bids': bids,
-                'best_sell': best_sell,
-                'best_buy': best_buy
-            }
-            
-        except Exception as e:
-            logger.error(f"Error getting TradeOgre orderbook for {token}: {str(e)}")
-            return None
+        if book.is_empty():
+            return False
+        if isinstance(client, HttpExchangeClient):
+            max_age = max(client.config.get('orderbook_max_age', ORDERBOOK_MAX_AGE), 2 * client.next_poll_interval(token))
+        elif client.push_updates and client.has_live_stream(token):
+            max_age = client.config.get('push_stale_after', PUSH_STALE_AFTER)
+        else:
+            max_age = client.config.get('orderbook_max_age', ORDERBOOK_MAX_AGE)
+        return time.time() - book.updated_at <= max_age
 
-    async def _get_xeggex_orderbook(self, client, token: str) -> Dict[str, Any]:
+    async def refresh_exchange(self, exchange_name: str, token: Optional[str] = None):
         """
-        Отримання даних ордербуку для Xeggex.
+        Позапланове оновлення біржі через планувальник із розсиланням статусу синхронізації.
         
         Args:
-            client: Клієнт Xeggex
-            token (str): Символ токена
-            
-        Returns:
-            Dict[str, Any]: Дані ордербуку
+            exchange_name (str): Назва біржі
+            token (Optional[str]): Символ токена; None - всі токени
         """
-        try:
-            # Отримуємо дані через асинхронний метод
-            orderbook_data = await client.get_orderbook(token)
-            if not orderbook_data:
-                logger.warning(f"Xeggex: No orderbook data for {token}")
-                return None
-                
-            logger.info(f"Xeggex: Got orderbook data for {token}: {json.dumps(orderbook_data, indent=2)}")
-            return orderbook_data
-            
-        except Exception as e:
-            logger.error(f"Error getting Xeggex orderbook for {token}: {str(e)}")
-            return None
-
-    async def _remove_client(self, websocket):
-        """Видалення відключеного клієнта"""
-        if websocket in self.connected_clients:
-            self.connected_clients.remove(websocket)
-            logger.info(f"Client removed. Total clients: {len(self.connected_clients)}")
-
-    async def add_client(self, websocket):
-        """Додавання нового клієнта"""
-        self.connected_clients.add(websocket)
-        logger.info(f"New client added. Total clients: {len(self.connected_clients)}")
-
-    async def broadcast_update(self, message: Dict[str, Any]):
-        """Відправка оновлення всім підключеним клієнтам"""
-        for websocket in self.connected_clients:
-            try:
-                await websocket.send(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error sending update to client: {str(e)}")
-                await self._remove_client(websocket)
-
-    async def refresh_exchange(self, exchange_name: str):
-        """Оновлення даних для конкретної біржі"""
         try:
             if exchange_name not in self.exchanges:
                 logger.error(f"Exchange {exchange_name} not found")
                 return
                 
-            exchange = self.exchanges[exchange_name]
-            
             # Відправляємо статус синхронізації
             await self.websocket_manager.broadcast({
                 "type": "exchange_status",
@@ -813,18 +773,11 @@ class OrderbookManager:
                 "status": "syncing"
             })
             
-            # Оновлюємо дані
-            for token in self.tokens:
-                try:
-                    await exchange.refresh_token(token)
-                except Exception as e:
-                    logger.error(f"Error refreshing token {token} on {exchange_name}: {str(e)}")
-                    await self.websocket_manager.broadcast({
-                        "type": "exchange_status",
-                        "exchange": exchange_name,
-                        "status": "error"
-                    })
-                    return
+            # Запити виконує джерело біржі в планувальнику, а зміни книг розсилаються подіями
+            if token is None:
+                await self._update_exchange(exchange_name)
+            else:
+                await self.refresh_token(exchange_name, token)
             
             # Відправляємо статус успішного оновлення
             await self.websocket_manager.broadcast({
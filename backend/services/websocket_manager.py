@@ -1,15 +1,26 @@
 """
 Модуль для управління WebSocket-з'єднаннями з клієнтами.
 """
-import json
 import logging
 import time
-from typing import Dict, List, Set, Any, Optional
+from typing import Dict, List, Set, Any, Optional, Tuple
 
 from fastapi import WebSocket
 
+from config import DEPTH_CHANNEL_LEVELS
+from exchange_clients.orderbook import OrderBook
+from services.broadcast_conflator import BroadcastConflator
+from services.client_connection import ClientConnection
+from services.depth_diff import DepthDiffTracker
+from utils import json_codec, log
+from utils.binary_codec import SymbolTable, encode_orderbook_update
+
 # Налаштування логгера
 logger = logging.getLogger(__name__)
+hot_log = log.get_logger(__name__)
+
+# Код закриття з'єднання для клієнтів, які не встигають читати повідомлення
+SLOW_CLIENT_CLOSE_CODE = 1013
 
 
 class WebSocketManager:
@@ -21,36 +32,77 @@ class WebSocketManager:
         # Активні з'єднання з клієнтами
         self.active_connections: List[WebSocket] = []
         
+        # Вихідні черги клієнтів {client_id: ClientConnection}
+        self.clients: Dict[int, ClientConnection] = {}
+        
         # Підписки клієнтів на токени та біржі
         # {client_id: {'tokens': ['BTC', 'ETH'], 'exchanges': ['MEXC', 'CoinEx']}}
         self.subscriptions: Dict[int, Dict[str, List[str]]] = {}
         
+        # Інвертований індекс підписок для маршрутизації оновлень ордербуків.
+        # Порожній список токенів або бірж у підписці означає "всі"
+        self._pair_index: Dict[Tuple[str, str], Set[int]] = {}  # {(token, exchange): {client_id}}
+        self._token_index: Dict[str, Set[int]] = {}  # Клієнти, підписані на токен на всіх біржах
+        self._exchange_index: Dict[str, Set[int]] = {}  # Клієнти, підписані на всі токени біржі
+        self._all_subscribers: Set[int] = set()  # Клієнти, підписані на все
+        
+        # Канал глибини: лише книги, відкриті клієнтом у детальному перегляді
+        self._depth_index: Dict[Tuple[str, str], Dict[int, int]] = {}  # {(token, exchange): {client_id: levels}}
+        self._depth_subscriptions: Dict[int, Set[Tuple[str, str]]] = {}  # {client_id: {(token, exchange)}}
+        self._depth_trackers: Dict[Tuple[str, str, int], DepthDiffTracker] = {}  # {(token, exchange, levels): стан}
+        
         # Статистика відправки повідомлень
         self.stats = {
             'total_messages': 0,
             'successful_sends': 0,
             'failed_sends': 0,
-            'success_rate': 0
+            'success_rate': 0,
+            'slow_disconnects': 0
         }
+        
+        # Ідентифікатори токенів і бірж для клієнтів з бінарним форматом
+        self.symbols = SymbolTable()
+        
+        # Злиття оновлень ордербуків: не частіше одного повідомлення на (біржа, токен) за вікно
+        self.conflator = BroadcastConflator(self.broadcast, send_batch=self.broadcast_batch)
     
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, binary: bool = False, batch: bool = False):
         """
         Додати нове WebSocket з'єднання.
+        
+        Args:
+            websocket (WebSocket): З'єднання клієнта
+            binary (bool): Відправляти оновлення найкращих цін у бінарному форматі
+            batch (bool): Об'єднувати оновлення одного тіку злиття в один кадр
         """
         # Примітка: НЕ викликаємо accept тут - він повинен бути викликаний у app.py
         self.active_connections.append(websocket)
         self.subscriptions[id(websocket)] = {'tokens': [], 'exchanges': []}
+        self._index_subscription(id(websocket))
+        
+        client = self.clients[id(websocket)] = ClientConnection(websocket, self.disconnect, binary=binary, batch=batch)
+        client.start()
         logger.info(f"Client connected: {id(websocket)}")
     
-    async def disconnect(self, websocket: WebSocket):
+    async def disconnect(self, websocket: WebSocket, code: Optional[int] = None):
         """
         Видалити WebSocket з'єднання.
+        
+        Args:
+            websocket (WebSocket): З'єднання клієнта
+            code (Optional[int]): Код закриття, якщо з'єднання закриває сервер
         """
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
         
         if id(websocket) in self.subscriptions:
+            self._unindex_subscription(id(websocket))
             del self.subscriptions[id(websocket)]
+        self._remove_depth_subscriptions(id(websocket))
+        
+        client = self.clients.pop(id(websocket), None)
+        if client is not None:
+            await client.close(code)
             
         logger.info(f"Client disconnected: {id(websocket)}")
     
@@ -60,18 +112,22 @@ class WebSocketManager:
         """
         client_id = id(websocket)
         
+        if client_id not in self.subscriptions:
+            return
+        self._unindex_subscription(client_id)
+        
         # Якщо обидва списки порожні - клієнт хоче отримувати всі дані
         if not tokens and not exchanges:
             self.subscriptions[client_id] = {'tokens': [], 'exchanges': []}
-            return
-        
-        if client_id in self.subscriptions:
+        else:
             if tokens:
-                self.subscriptions[client_id]['tokens'] = tokens
+                self.subscriptions[client_id]['tokens'] = list(tokens)
             if exchanges:
-                self.subscriptions[client_id]['exchanges'] = exchanges
+                self.subscriptions[client_id]['exchanges'] = list(exchanges)
                 
             logger.info(f"Client {client_id} subscribed to tokens: {tokens}, exchanges: {exchanges}")
+        
+        self._index_subscription(client_id)
     
     async def unsubscribe(self, websocket: WebSocket):
         """
@@ -79,65 +135,401 @@ class WebSocketManager:
         """
         client_id = id(websocket)
         if client_id in self.subscriptions:
+            self._unindex_subscription(client_id)
             self.subscriptions[client_id] = {'tokens': [], 'exchanges': []}
+            self._index_subscription(client_id)
             logger.info(f"Client {client_id} unsubscribed from all")
     
+    async def subscribe_depth(self, websocket: WebSocket, token: str, exchange: str, book: OrderBook,
+                              levels: int = DEPTH_CHANNEL_LEVELS):
+        """
+        Підписка клієнта на глибину ордербуку пари (токен, біржа).
+        Клієнт отримує снапшот з номером послідовності, далі - різниці рівнів.
+        
+        Args:
+            websocket (WebSocket): З'єднання клієнта
+            token (str): Символ токена
+            exchange (str): Назва біржі
+            book (OrderBook): Поточний ордербук
+            levels (int): Кількість рівнів на сторону
+        """
+        client = self.clients.get(id(websocket))
+        if client is None:
+            return
+        self.unsubscribe_depth(websocket, token, exchange)
+        
+        # Спочатку доводимо спільний стан до поточної книги (наявні підписники отримують різницю),
+        # щоб снапшот нового клієнта і наступні різниці мали спільну точку відліку
+        tracker_key = (token, exchange, levels)
+        tracker = self._depth_trackers.get(tracker_key)
+        if tracker is None:
+            tracker = self._depth_trackers[tracker_key] = DepthDiffTracker(levels)
+        await self._send_depth_diff(exchange, token, book, tracker)
+        
+        self._depth_index.setdefault((token, exchange), {})[id(websocket)] = levels
+        self._depth_subscriptions.setdefault(id(websocket), set()).add((token, exchange))
+        logger.info(f"Client {id(websocket)} subscribed to depth of {token} on {exchange} ({levels} levels)")
+        
+        asks, bids = tracker.snapshot()
+        snapshot = json_codec.dumps({
+            "type": "orderbook_depth",
+            "exchange": exchange,
+            "token": token,
+            "sequence": tracker.sequence,
+            "asks": self._format_levels(book, asks),
+            "bids": self._format_levels(book, bids),
+            "timestamp": int(time.time() * 1000)
+        })
+        if not client.enqueue(snapshot):
+            await self._disconnect_slow(websocket)
+    
+    def unsubscribe_depth(self, websocket: WebSocket, token: Optional[str] = None, exchange: Optional[str] = None):
+        """
+        Відписка клієнта від глибини ордербуку.
+        
+        Args:
+            websocket (WebSocket): З'єднання клієнта
+            token (Optional[str]): Символ токена; None - всі токени
+            exchange (Optional[str]): Назва біржі; None - всі біржі
+        """
+        client_id = id(websocket)
+        keys = [key for key in self._depth_subscriptions.get(client_id, ())
+                if (token is None or key[0] == token) and (exchange is None or key[1] == exchange)]
+        for key in keys:
+            self._remove_depth_subscription(client_id, key)
+    
+    def has_depth_subscribers(self, token: str, exchange: str) -> bool:
+        """Перевірка, чи відкрита книга пари (токен, біржа) хоча б в одного клієнта."""
+        return (token, exchange) in self._depth_index
+    
+    async def broadcast_orderbook_depth(self, exchange: str, token: str, book: OrderBook):
+        """
+        Відправка змінених рівнів книги клієнтам, підписаним на її глибину.
+        Різниця обчислюється і кодується один раз для кожної запитаної кількості рівнів.
+        
+        Args:
+            exchange (str): Назва біржі
+            token (str): Символ токена
+            book (OrderBook): Ордербук
+        """
+        subscribers = self._depth_index.get((token, exchange))
+        if not subscribers:
+            return
+        for levels in set(subscribers.values()):
+            tracker = self._depth_trackers.get((token, exchange, levels))
+            if tracker is not None:
+                await self._send_depth_diff(exchange, token, book, tracker)
+    
+    async def _send_depth_diff(self, exchange: str, token: str, book: OrderBook, tracker: DepthDiffTracker):
+        """
+        Відправка різниці між станом трекера і книгою підписникам з тією ж кількістю рівнів.
+        
+        Різниці не замінюють одна одну в черзі клієнта; якщо переповнена черга
+        все ж відкине різницю, клієнт побачить пропуск номера послідовності і підпишеться повторно.
+        
+        Args:
+            exchange (str): Назва біржі
+            token (str): Символ токена
+            book (OrderBook): Ордербук
+            tracker (DepthDiffTracker): Стан, відправлений підписникам
+        """
+        changes = tracker.update(book)
+        if changes is None:
+            return
+        
+        recipients = [self.clients[client_id] for client_id, levels in self._depth_index.get((token, exchange), {}).items()
+                      if levels == tracker.levels and client_id in self.clients]
+        if not recipients:
+            return
+        
+        asks, bids = changes
+        frame = json_codec.dumps({
+            "type": "orderbook_depth_diff",
+            "exchange": exchange,
+            "token": token,
+            "sequence": tracker.sequence,
+            "asks": self._format_levels(book, asks),
+            "bids": self._format_levels(book, bids),
+            "timestamp": int(time.time() * 1000)
+        })
+        slow_connections = [client.websocket for client in recipients if not client.enqueue(frame)]
+        for connection in slow_connections:
+            await self._disconnect_slow(connection)
+    
+    @staticmethod
+    def _format_levels(book: OrderBook, levels: List[Tuple[int, int]]) -> List[List[str]]:
+        """Рівні у форматі клієнта: [[ціна, обсяг], ...] точними рядками."""
+        scale = book.scale
+        return [[scale.format_price(price), scale.format_size(size)] for price, size in levels]
+    
+    def _remove_depth_subscription(self, client_id: int, key: Tuple[str, str]):
+        """Видалення однієї підписки на глибину разом зі станом, який більше нікому не потрібен."""
+        subscribers = self._depth_index.get(key)
+        if subscribers is not None:
+            levels = subscribers.pop(client_id, None)
+            if levels is not None and levels not in subscribers.values():
+                self._depth_trackers.pop((*key, levels), None)
+            if not subscribers:
+                del self._depth_index[key]
+        keys = self._depth_subscriptions.get(client_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._depth_subscriptions[client_id]
+    
+    def _remove_depth_subscriptions(self, client_id: int):
+        """Видалення всіх підписок клієнта на глибину."""
+        for key in list(self._depth_subscriptions.get(client_id, ())):
+            self._remove_depth_subscription(client_id, key)
+    
+    def _subscription_entries(self, client_id: int) -> List[Tuple[Dict[Any, Set[int]], Any]]:
+        """
+        Записи індексу, до яких належить підписка клієнта.
+        
+        Args:
+            client_id (int): Ідентифікатор клієнта
+            
+        Returns:
+            List[Tuple[Dict[Any, Set[int]], Any]]: Пари (індекс, ключ); None як індекс - підписка на все
+        """
+        subscription = self.subscriptions[client_id]
+        tokens, exchanges = subscription['tokens'], subscription['exchanges']
+        
+        if tokens and exchanges:
+            return [(self._pair_index, (token, exchange)) for token in tokens for exchange in exchanges]
+        if tokens:
+            return [(self._token_index, token) for token in tokens]
+        if exchanges:
+            return [(self._exchange_index, exchange) for exchange in exchanges]
+        return [(None, None)]
+    
+    def _index_subscription(self, client_id: int):
+        """Додавання підписки клієнта до індексу."""
+        for index, key in self._subscription_entries(client_id):
+            if index is None:
+                self._all_subscribers.add(client_id)
+            else:
+                index.setdefault(key, set()).add(client_id)
+    
+    def _unindex_subscription(self, client_id: int):
+        """Видалення підписки клієнта з індексу разом з порожніми множинами."""
+        for index, key in self._subscription_entries(client_id):
+            if index is None:
+                self._all_subscribers.discard(client_id)
+                continue
+            clients = index.get(key)
+            if clients is not None:
+                clients.discard(client_id)
+                if not clients:
+                    del index[key]
+    
+    def _subscribers(self, token: str, exchange: str) -> Set[int]:
+        """
+        Клієнти, підписані на оновлення пари (токен, біржа).
+        
+        Args:
+            token (str): Символ токена
+            exchange (str): Назва біржі
+            
+        Returns:
+            Set[int]: Ідентифікатори клієнтів
+        """
+        return self._all_subscribers.union(
+            self._pair_index.get((token, exchange), ()),
+            self._token_index.get(token, ()),
+            self._exchange_index.get(exchange, ())
+        )
+    
     async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
         """
-        Надіслати повідомлення конкретному клієнту.
+        Надіслати повідомлення конкретному клієнту (через його чергу, після вже запланованих повідомлень).
         """
-        await websocket.send_text(json.dumps(message))
+        client = self.clients.get(id(websocket))
+        frame = json_codec.dumps(message)
+        if client is None:
+            await websocket.send_text(frame)
+        elif not client.enqueue(frame):
+            await self._disconnect_slow(websocket)
     
     async def broadcast(self, message: Dict[str, Any]):
         """Відправка повідомлення всім підключеним клієнтам"""
         if not self.active_connections:
             logger.warning("Немає активних підключень для відправки оновлення")
             return
-       
-        # Додаємо тип повідомлення, якщо його немає
-        if 'type' not in message and 'exchange' in message and 'token' in message:
-            message['type'] = 'orderbook_update'
-       
-        # Додаємо додаткове логування для відстеження оновлень CoinEx
-        if message.get("type") == "orderbook_update" and message.get("exchange") == "CoinEx":
-            logger.info(f"WebSocketManager: відправка оновлення CoinEx для {message.get('token')}: sell={message.get('best_sell')}, buy={message.get('best_buy')}")
-        
-        # Формуємо JSON-рядок для відправки один раз
-        try:
-            message_json = json.dumps(message)
-        except Exception as e:
-            logger.error(f"Error serializing message to JSON: {str(e)}")
+        
+        prepared = await self._prepare(message)
+        if prepared is None:
             return
+        recipients, json_frame, binary_frame, key = prepared
        
-        # Відправляємо повідомлення всім клієнтам
+        # Ставимо повідомлення в черги клієнтів; відправку виконують задачі запису клієнтів
         successful_sends = 0
         failures = 0
-        failed_connections = []
+        slow_connections = []
         
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_json)
+        for client in recipients:
+            frame = binary_frame if client.binary and binary_frame is not None else json_frame
+            if client.enqueue(frame, key):
                 successful_sends += 1
-            except Exception as e:
+            else:
                 failures += 1
-                failed_connections.append(connection)
-                logger.error(f"Error sending message to client: {str(e)}")
+                slow_connections.append(client.websocket)
             
         # Логуємо результат відправки
         if message.get("type") == "orderbook_update":
-            logger.info(f"Broadcast result: {successful_sends} successful, {failures} failed")
+            hot_log.sampled(logging.INFO, "Broadcast result: %d queued, %d failed", successful_sends, failures)
+        
+        await self._finish_broadcast(successful_sends, failures, slow_connections)
+    
+    async def broadcast_batch(self, messages: List[Dict[str, Any]]):
+        """
+        Відправка оновлень одного тіку злиття.
+        Клієнти, що обрали пакетування (?batch=1), отримують усі свої оновлення одним кадром:
+        JSON {"type": "batch", "messages": [...]} або послідовність бінарних записів.
+        Інші клієнти отримують оновлення окремими повідомленнями.
+        
+        Args:
+            messages (List[Dict[str, Any]]): Повідомлення тіку
+        """
+        if not self.active_connections:
+            return
+        
+        batches: Dict[int, List[Any]] = {}  # {client_id: [кадри]}
+        successful_sends = 0
+        failures = 0
+        slow_connections = []
+        
+        for message in messages:
+            prepared = await self._prepare(message)
+            if prepared is None:
+                continue
+            recipients, json_frame, binary_frame, key = prepared
+            
+            for client in recipients:
+                frame = binary_frame if client.binary and binary_frame is not None else json_frame
+                if client.batch:
+                    batches.setdefault(id(client.websocket), []).append(frame)
+                elif client.enqueue(frame, key):
+                    successful_sends += 1
+                else:
+                    failures += 1
+                    slow_connections.append(client.websocket)
+        
+        for client_id, frames in batches.items():
+            client = self.clients.get(client_id)
+            if client is None:
+                continue
+            if all(client.enqueue(frame) for frame in self._batch_frames(frames)):
+                successful_sends += len(frames)
+            else:
+                failures += len(frames)
+                slow_connections.append(client.websocket)
+        
+        hot_log.sampled(logging.INFO, "Batch broadcast: %d updates, %d batched clients", len(messages), len(batches))
+        await self._finish_broadcast(successful_sends, failures, slow_connections)
+    
+    @staticmethod
+    def _batch_frames(frames: List[Any]) -> List[Any]:
+        """
+        Об'єднання вже закодованих кадрів без повторного кодування: один бінарний кадр
+        (записи фіксованої довжини йдуть підряд) та один JSON-кадр {"type": "batch", "messages": [...]}.
+        """
+        binary = [frame for frame in frames if isinstance(frame, bytes)]
+        text = [frame for frame in frames if not isinstance(frame, bytes)]
+        
+        result = []
+        if binary:
+            result.append(b''.join(binary))
+        if len(text) == 1:
+            result.append(text[0])
+        elif text:
+            result.append('{"type":"batch","messages":[' + ','.join(text) + ']}')
+        return result
+    
+    async def _prepare(self, message: Dict[str, Any]) -> Optional[Tuple[List[ClientConnection], Optional[str], Optional[bytes], Optional[Tuple[str, str]]]]:
+        """
+        Вибір отримувачів і кодування повідомлення один раз для кожного потрібного формату.
+        
+        Args:
+            message (Dict[str, Any]): Повідомлення
+            
+        Returns:
+            Optional[Tuple]: (отримувачі, JSON-кадр, бінарний кадр, ключ у черзі) або None, якщо відправляти нікому
+        """
+        # Додаємо тип повідомлення, якщо його немає
+        if 'type' not in message and 'exchange' in message and 'token' in message:
+            message['type'] = 'orderbook_update'
+       
+        if message.get("type") == "orderbook_update":
+            hot_log.debug("WebSocketManager: відправка оновлення %s для %s: sell=%s, buy=%s", message.get('exchange'),
+                          message.get('token'), message.get('best_sell'), message.get('best_buy'))
+        
+        # Оновлення ордербуку отримують лише підписані клієнти, інші повідомлення - всі
+        if message.get("type") == "orderbook_update":
+            recipients = [self.clients[client_id] for client_id in self._subscribers(message.get('token'), message.get('exchange'))
+                          if client_id in self.clients]
+        else:
+            recipients = [self.clients[id(connection)] for connection in self.active_connections if id(connection) in self.clients]
+        if not recipients:
+            return None
         
-        # Відключаємо клієнтів з помилками
-        for connection in failed_connections:
+        # Кодуємо повідомлення один раз для кожного формату; той самий кадр отримують усі клієнти формату
+        binary_frame = None
+        if message.get("type") == "orderbook_update" and any(client.binary for client in recipients):
+            await self.announce_symbols([message.get('token')], [message.get('exchange')])
+            binary_frame = encode_orderbook_update(self.symbols, message)
+        
+        json_frame = None
+        if binary_frame is None or not all(client.binary for client in recipients):
             try:
-                await self.disconnect(connection)
-                logger.info("Successfully disconnected failed client")
+                json_frame = json_codec.dumps(message)
+            except Exception as e:
+                logger.error(f"Error serializing message to JSON: {str(e)}")
+                return None
+       
+        # Оновлення ордербуку замінює невідправлений попередній стан тієї ж пари в черзі клієнта
+        key = (message.get('exchange'), message.get('token')) if message.get("type") == "orderbook_update" else None
+        return recipients, json_frame, binary_frame, key
+    
+    async def _finish_broadcast(self, successful_sends: int, failures: int, slow_connections: List[WebSocket]):
+        """Відключення клієнтів, які не встигають читати повідомлення, та оновлення статистики."""
+        for connection in slow_connections:
+            try:
+                await self._disconnect_slow(connection)
             except Exception as e:
                 logger.error(f"Error disconnecting client: {str(e)}")
             
         # Оновлюємо статистику
         self._update_stats(successful_sends, failures)
     
+    async def announce_symbols(self, tokens: List[str], exchanges: List[str]):
+        """
+        Реєстрація назв у таблиці ідентифікаторів і розсилка оновленої таблиці бінарним клієнтам.
+        Нові ідентифікатори призначаються лише тут, тож кожен підключений бінарний клієнт їх отримує.
+        
+        Args:
+            tokens (List[str]): Символи токенів
+            exchanges (List[str]): Назви бірж
+        """
+        if not self.symbols.register(tokens, exchanges):
+            return
+        
+        frame = json_codec.dumps({"type": "symbol_ids", **self.symbols.to_dict()})
+        slow_connections = [client.websocket for client in list(self.clients.values())
+                            if client.binary and not client.enqueue(frame)]
+        for connection in slow_connections:
+            await self._disconnect_slow(connection)
+    
+    async def _disconnect_slow(self, websocket: WebSocket):
+        """Відключення клієнта, черга якого надто довго залишається переповненою."""
+        logger.warning(f"Client {id(websocket)} is too slow, disconnecting")
+        self.stats['slow_disconnects'] += 1
+        await self.disconnect(websocket, SLOW_CLIENT_CLOSE_CODE)
+    
+    def get_client_stats(self) -> List[Dict[str, Any]]:
+        """Глибина черги та лічильники відправки для кожного клієнта."""
+        return [client.get_stats() for client in self.clients.values()]
+    
     def _update_stats(self, successful_sends: int, failures: int):
         """Оновлення статистики відправки повідомлень"""
         self.stats['total_messages'] += successful_sends + failures
@@ -157,4 +549,8 @@ class WebSocketManager:
             "best_buy": best_buy,
             "timestamp": int(time.time() * 1000)  # Додаємо часову мітку
         }
-        await self.broadcast(message)
\ No newline at end of file
+        await self.conflator.publish((exchange, token), message)
+    
+    async def close(self):
+        """Відправка накопичених оновлень та зупинка злиття."""
+        await self.conflator.stop()
\ No newline at end of file
@@ -0,0 +1,560 @@
+import asyncio
+import json
+import os
+import sys
+
+# Додаємо корневу директорію проекту до PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exchange_clients import mexc
+from exchange_clients.coinex import CoinExClient
+from exchange_clients.frame_decoder import FrameDecoder
+from exchange_clients.http_client import HttpExchangeClient
+from exchange_clients.mexc import MEXCClient
+from exchange_clients.transport import HttpTransport
+from exchange_clients.xeggex import XeggexClient
+
+
+class FakeWebSocket:
+    """З'єднання WebSocket у пам'яті: відправлені повідомлення зберігаються, вхідні кадри подаються з черги."""
+
+    def __init__(self):
+        self.sent = []
+        self.incoming = asyncio.Queue()
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+    async def recv(self):
+        return await self.incoming.get()
+
+    async def close(self):
+        pass
+
+
+def test_mexc_subscribes_tokens_added_before_connect(monkeypatch):
+    """Push-клієнт, підключений після add_token, підписується на токени і отримує оновлення."""
+    async def scenario():
+        ws = FakeWebSocket()
+
+        async def fake_connect(url):
+            return ws
+
+        monkeypatch.setattr(mexc.websockets, "connect", fake_connect)
+        client = MEXCClient("MEXC", "wss://example", {"depth_mode": "limit"})
+
+        async def no_rest(token):
+            return None
+
+        client._fetch_orderbook = no_rest
+        events = []
+        client.on_book_update = lambda exchange, token: events.append((exchange, token))
+
+        await client.add_token("BTC")
+        assert not ws.sent
+
+        await client.connect()
+        subscriptions = [message for message in ws.sent if message.get("method") == "SUBSCRIPTION"]
+        assert len(subscriptions) == 1
+        assert "BTC" in subscriptions[0]["params"][0]
+
+        await ws.incoming.put(json.dumps({
+            "c": "spot@public.limit.depth.v3.api@BTCUSDT@5",
+            "s": "BTCUSDT",
+            "d": {"asks": [{"p": "101", "v": "1"}], "bids": [{"p": "100", "v": "2"}]}
+        }))
+        for _ in range(20):
+            if events:
+                break
+            await asyncio.sleep(0.01)
+
+        assert events == [("MEXC", "BTC")]
+        assert client.get_book("BTC").best_ask() is not None
+        await client.disconnect()
+
+    asyncio.run(scenario())
+
+
+def test_mexc_bulk_bbo_parses_requested_tokens_with_prices():
+    """bookTicker розбирається лише для запитаних токенів з додатними цінами обох сторін."""
+    async def scenario():
+        client = MEXCClient("MEXC", "wss://example", {})
+
+        async def fake_tickers():
+            return [
+                {"symbol": "BTCUSDT", "askPrice": "101.5", "askQty": "2", "bidPrice": "101.4", "bidQty": "3"},
+                {"symbol": "ETHUSDT", "askPrice": "2000", "askQty": "1", "bidPrice": "0", "bidQty": "0"},
+                {"symbol": "XMRUSDT", "askPrice": "150", "askQty": "1", "bidPrice": "149", "bidQty": "1"}
+            ]
+
+        client._fetch_book_tickers = fake_tickers
+        prices = await client.get_bulk_bbo(["BTC", "ETH", "SOL"])
+
+        assert list(prices) == ["BTC"]
+        assert prices["BTC"]["best_sell"] == "101.500"
+        assert prices["BTC"]["best_buy"] == "101.400"
+        assert prices["BTC"]["asks"] == [["101.5", "2"]]
+        assert prices["BTC"]["bids"] == [["101.4", "3"]]
+
+    asyncio.run(scenario())
+
+
+def test_mexc_bulk_bbo_skips_books_with_live_stream():
+    """Найкращі ціни одним запитом завантажуються лише в книги, для яких потік не надходить."""
+    async def scenario():
+        client = MEXCClient("MEXC", "wss://example", {"depth_mode": "limit"})
+        client.tokens = ["BTC", "ETH"]
+        client.is_connected = True
+        requested = []
+
+        async def fake_tickers():
+            return [
+                {"symbol": "BTCUSDT", "askPrice": "101", "askQty": "1", "bidPrice": "100", "bidQty": "1"},
+                {"symbol": "ETHUSDT", "askPrice": "11", "askQty": "1", "bidPrice": "10", "bidQty": "1"}
+            ]
+
+        async def fake_get_bulk_bbo(tokens):
+            requested.extend(tokens)
+            return await MEXCClient.get_bulk_bbo(client, tokens)
+
+        client._fetch_book_tickers = fake_tickers
+        client.get_bulk_bbo = fake_get_bulk_bbo
+        events = []
+        client.on_book_update = lambda exchange, token: events.append(token)
+
+        await client._handle_depth_update({"s": "BTCUSDT", "d": {"asks": [{"p": "102", "v": "1"}], "bids": [{"p": "99", "v": "1"}]}})
+        events.clear()
+
+        assert await client.refresh_bulk_bbo(["BTC", "ETH"]) == 1
+        assert requested == ["ETH"]
+        assert events == ["ETH"]
+        assert client.get_top("BTC")[0] == client.get_book("BTC").scale.parse_level(["102", "1"])
+        assert client.get_top("ETH")[1] == client.market_scale("ETHUSDT").parse_level(["10", "1"])
+        assert client.get_book("ETH") is None
+
+    asyncio.run(scenario())
+
+
+def diff_frame(version, asks=(), bids=()):
+    """Кадр каналу increase.depth з версією та зміненими рівнями."""
+    return {
+        "s": "BTCUSDT",
+        "d": {
+            "r": str(version),
+            "asks": [{"p": price, "v": amount} for price, amount in asks],
+            "bids": [{"p": price, "v": amount} for price, amount in bids]
+        }
+    }
+
+
+def make_diff_client(snapshots, **config):
+    """MEXC-клієнт у diff-режимі, знімки глибини якого подаються зі списку."""
+    client = MEXCClient("MEXC", "wss://example", {"depth_mode": "diff", "reconnect_interval": 0, **config})
+    client.tokens = ["BTC"]
+    client.snapshot_requests = 0
+
+    async def fake_snapshot(symbol, limit):
+        client.snapshot_requests += 1
+        snapshot = snapshots.pop(0) if snapshots else {}
+        if isinstance(snapshot, asyncio.Event):
+            await snapshot.wait()
+            return {}
+        return snapshot
+
+    client._fetch_depth_snapshot = fake_snapshot
+    return client
+
+
+def test_mexc_diff_depth_applies_next_version_and_resyncs_on_gap():
+    """Після знімка застосовуються лише події з версією sequence + 1; пропуск версій запускає нову синхронізацію."""
+    async def scenario():
+        client = make_diff_client([
+            {"lastUpdateId": 10, "asks": [["101", "1"]], "bids": [["100", "1"]]},
+            {"lastUpdateId": 20, "asks": [["105", "1"]], "bids": [["104", "1"]]}
+        ])
+        scale = client.market_scale("BTCUSDT")
+
+        await client._handle_diff_depth(diff_frame(10, asks=[("99", "1")]))
+        await client._handle_diff_depth(diff_frame(11, bids=[("100.5", "2")]))
+        await client._depth_sync["BTCUSDT"]["task"]
+
+        book = client.get_book("BTC")
+        assert client._is_depth_synced("BTCUSDT")
+        assert book.sequence == 11
+        assert book.best_ask() == scale.parse_level(["101", "1"])
+        assert book.best_bid() == scale.parse_level(["100.5", "2"])
+
+        await client._handle_diff_depth(diff_frame(12, asks=[("101", "0")]))
+        await client._handle_diff_depth(diff_frame(12, asks=[("100.8", "1")]))
+        assert book.sequence == 12
+        assert book.best_ask() is None
+
+        await client._handle_diff_depth(diff_frame(14, asks=[("103", "1")]))
+        assert not client._is_depth_synced("BTCUSDT")
+        await client._depth_sync["BTCUSDT"]["task"]
+
+        assert client.snapshot_requests == 2
+        assert client._is_depth_synced("BTCUSDT")
+        assert book.sequence == 20
+        assert book.best_ask() == scale.parse_level(["105", "1"])
+
+    asyncio.run(scenario())
+
+
+def test_mexc_rest_request_does_not_overwrite_diff_book_synced_meanwhile():
+    """REST-запит, що завершився після синхронізації diff-книги, не перезаписує її і не змінює версію."""
+    async def scenario():
+        client = make_diff_client([{"lastUpdateId": 10, "asks": [["101", "1"]], "bids": [["100", "1"]]}])
+        sync_snapshot = client._fetch_depth_snapshot
+        gate = asyncio.Event()
+
+        async def fake_snapshot(symbol, limit):
+            if limit == 100:
+                await gate.wait()
+                return {"asks": [["200", "1"]], "bids": [["199", "1"]]}
+            return await sync_snapshot(symbol, limit)
+
+        client._fetch_depth_snapshot = fake_snapshot
+        fetch = asyncio.create_task(client._fetch_orderbook("BTC"))
+        await asyncio.sleep(0)
+        await client._handle_diff_depth(diff_frame(11, bids=[("100.5", "1")]))
+        await asyncio.sleep(0)
+        assert client._is_depth_synced("BTCUSDT")
+
+        gate.set()
+        payload = await fetch
+        book = client.get_book("BTC")
+        assert book.sequence == 11
+        assert book.best_ask() == book.scale.parse_level(["101", "1"])
+        assert book.best_bid() == book.scale.parse_level(["100.5", "1"])
+        assert payload["asks"] == [["101", "1"]]
+
+        client._depth_sync["BTCUSDT"]["synced"] = False
+        gate.clear()
+        gate.set()
+        assert (await client._fetch_orderbook("BTC"))["asks"] == [["200", "1"]]
+        assert book.best_ask() == book.scale.parse_level(["101", "1"])
+
+    asyncio.run(scenario())
+
+
+def test_mexc_diff_buffer_is_bounded_and_dropped_when_snapshot_fails():
+    """Буфер до синхронізації обмежений depth_buffer_limit; невдалий знімок відкидає буфер."""
+    async def scenario():
+        stalled = asyncio.Event()
+        client = make_diff_client([stalled, {}], depth_buffer_limit=3)
+
+        for version in range(1, 4):
+            await client._handle_diff_depth(diff_frame(version))
+        await asyncio.sleep(0)
+        state = client._depth_sync["BTCUSDT"]
+        first_task = state["task"]
+        assert len(state["buffer"]) == 3
+
+        await client._handle_diff_depth(diff_frame(4))
+        assert [version for version, _ in state["buffer"]] == [4]
+        await asyncio.sleep(0)
+        assert first_task.cancelled()
+
+        await asyncio.sleep(0.01)
+        assert client.snapshot_requests >= 2
+        assert state["buffer"] == []
+
+        task = state["task"]
+        await client.remove_token("BTC")
+        await asyncio.sleep(0)
+        assert "BTCUSDT" not in client._depth_sync
+        assert task.done()
+
+    asyncio.run(scenario())
+
+
+def test_http_transport_shares_sessions_until_closed():
+    """Клієнти отримують ту саму сесію aiohttp і той самий httpx-клієнт; після close() вони закриті й створюються знову."""
+    async def scenario():
+        transport = HttpTransport(http2=False)
+        session, client = transport.session(), transport.client()
+        assert transport.session() is session
+        assert transport.client() is client
+
+        await transport.close()
+        assert session.closed
+        assert client.is_closed
+
+        reopened = transport.session()
+        assert reopened is not session and not reopened.closed
+        assert transport.client() is not client
+        await transport.close()
+
+    asyncio.run(scenario())
+
+
+class OfflineTransport:
+    """Транспорт, що не дозволяє REST-запитів."""
+
+    def session(self):
+        raise AssertionError("REST-запит не очікувався")
+
+    @staticmethod
+    def aiohttp_timeout(seconds):
+        return seconds
+
+
+def test_coinex_merges_incremental_updates_after_snapshot():
+    """Інкрементальні оновлення зливаються з книгою лише після повного снапшоту, нульовий обсяг видаляє рівень."""
+    async def scenario():
+        client = CoinExClient("CoinEx", "wss://example", {})
+        client.tokens = ["BTC"]
+        events = []
+        client.on_book_update = lambda exchange, token: events.append(token)
+
+        await client._process_message({"method": "depth.update",
+                                       "params": [False, {"asks": [["90", "1"]]}, "BTCUSDT"]})
+        assert client.get_book("BTC") is None
+
+        await client._process_message({"method": "depth.update", "params": [
+            True, {"asks": [["101", "1"], ["102", "2"]], "bids": [["100", "1"]]}, "BTCUSDT"]})
+        await client._process_message({"method": "depth.update", "params": [
+            False, {"asks": [["101", "0"]], "bids": [["100.5", "3"]]}, "BTCUSDT"]})
+
+        book = client.get_book("BTC")
+        scale = book.scale
+        assert events == ["BTC", "BTC"]
+        assert book.best_ask() == scale.parse_level(["102", "2"])
+        assert book.best_bid() == scale.parse_level(["100.5", "3"])
+        assert len(book.bids) == 2
+
+    asyncio.run(scenario())
+
+
+def test_coinex_synced_book_is_served_without_rest_snapshot():
+    """Поки книга синхронізована потоком, _fetch_orderbook не перезаписує її REST-знімком."""
+    async def scenario():
+        client = CoinExClient("CoinEx", "wss://example", {})
+        client.tokens = ["BTC"]
+        client.transport = OfflineTransport()
+        client.is_connected = True
+
+        await client._process_message({"method": "depth.update", "params": [
+            True, {"asks": [["101", "1"]], "bids": [["100", "1"]]}, "BTCUSDT"]})
+        payload = await client._fetch_orderbook("BTC")
+
+        assert payload["best_sell"] == client.get_book("BTC").scale.display_price(client.get_book("BTC").best_ask()[0])
+        assert payload["asks"]
+
+        client.is_connected = False
+        assert (await client._fetch_orderbook("BTC"))["asks"] == []
+
+    asyncio.run(scenario())
+
+
+class GatedTransport:
+    """Транспорт, REST-відповідь якого повертається лише після gate.set()."""
+
+    def __init__(self, data):
+        self.data = data
+        self.gate = asyncio.Event()
+
+    def session(self):
+        return self
+
+    def get(self, url, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        await self.gate.wait()
+        return self.data
+
+    @staticmethod
+    def aiohttp_timeout(seconds):
+        return seconds
+
+
+def test_coinex_stream_snapshot_during_rest_request_is_not_overwritten():
+    """Снапшот з потоку, що надійшов під час REST-запиту, не перезаписується старішим REST-знімком."""
+    async def scenario():
+        client = CoinExClient("CoinEx", "wss://example", {})
+        client.tokens = ["BTC"]
+        client.transport = GatedTransport({"code": 0, "data": {"asks": [["200", "1"]], "bids": [["199", "1"]]}})
+        client.is_connected = True
+
+        fetch = asyncio.create_task(client._fetch_orderbook("BTC"))
+        await asyncio.sleep(0)
+        await client._process_message({"method": "depth.update", "params": [
+            True, {"asks": [["101", "1"]], "bids": [["100", "1"]]}, "BTCUSDT"]})
+        client.transport.gate.set()
+        payload = await fetch
+
+        book = client.get_book("BTC")
+        assert book.best_ask() == book.scale.parse_level(["101", "1"])
+        assert payload["asks"] == [["101", "1"]]
+
+    asyncio.run(scenario())
+
+
+def test_http_poll_interval_backs_off_resets_and_respects_budget():
+    """Інтервал опитування росте при однакових відповідях, скидається при зміні книги і розтягується бюджетом."""
+    client = HttpExchangeClient("Http", "https://example", {
+        "polling_interval": 1, "min_polling_interval": 0.5, "max_polling_interval": 4,
+        "polling_speedup": 0.5, "polling_backoff": 2, "request_budget": 0
+    })
+    client.tokens = ["BTC", "ETH"]
+
+    intervals = []
+    for _ in range(3):
+        client._adapt_interval("BTC", False)
+        intervals.append(client.next_poll_interval("BTC"))
+    assert intervals == [2, 4, 4]
+
+    for _ in range(4):
+        client._adapt_interval("BTC", True)
+    assert client.next_poll_interval("BTC") == 0.5
+
+    client._adapt_interval("ETH", True)
+    client.request_budget = 2
+    assert client.next_poll_interval("BTC") == 1.0
+    assert client.next_poll_interval("ETH") == 1.0
+
+
+def xeggex_frame(method, sequence, asks=(), bids=()):
+    """Кадр ордербуку Xeggex для BTC/USDT."""
+    return json.dumps({"method": method, "params": {
+        "symbol": "BTC/USDT", "sequence": sequence,
+        "asks": [{"price": price, "quantity": quantity} for price, quantity in asks],
+        "bids": [{"price": price, "quantity": quantity} for price, quantity in bids]
+    }})
+
+
+async def make_xeggex_client(**config):
+    """Підключений Xeggex-клієнт з WebSocket у пам'яті та завантаженим снапшотом (sequence 5)."""
+    client = XeggexClient("Xeggex", "wss://example", config)
+    await client.add_token("BTC")
+    client.ws = FakeWebSocket()
+    client.is_connected = True
+    await client._process_message(xeggex_frame("snapshotOrderbook", 5, asks=[("101", "1")], bids=[("100", "1")]))
+    return client
+
+
+def test_xeggex_applies_consecutive_sequences_and_resubscribes_on_gap():
+    """Оновлення з sequence + 1 зливаються, застарілі відкидаються, пропуск перепідписує до нового снапшоту."""
+    async def scenario():
+        client = await make_xeggex_client()
+        book = client.get_book("BTC")
+        scale = book.scale
+
+        await client._process_message(xeggex_frame("updateOrderbook", 6, bids=[("100.5", "2")]))
+        await client._process_message(xeggex_frame("updateOrderbook", 6, bids=[("100.7", "2")]))
+        assert book.sequence == 6
+        assert book.best_bid() == scale.parse_level(["100.5", "2"])
+
+        await client._process_message(xeggex_frame("updateOrderbook", 8, asks=[("100.9", "1")]))
+        await asyncio.sleep(0)
+        assert [message["method"] for message in client.ws.sent] == ["unsubscribeOrderbook", "subscribeOrderbook"]
+        assert "BTC" in client._resyncing
+
+        await client._process_message(xeggex_frame("updateOrderbook", 9, asks=[("100.9", "1")]))
+        assert book.best_ask() == scale.parse_level(["101", "1"])
+
+        await client._process_message(xeggex_frame("snapshotOrderbook", 20, asks=[("102", "1")], bids=[("99", "1")]))
+        assert "BTC" not in client._resyncing
+        await client._process_message(xeggex_frame("updateOrderbook", 21, asks=[("101.5", "1")]))
+        assert book.sequence == 21
+        assert book.best_ask() == scale.parse_level(["101.5", "1"])
+
+    asyncio.run(scenario())
+
+
+def test_xeggex_resync_is_retried_by_timer_when_snapshot_is_missing_or_subscribe_fails():
+    """Перепідписка повторюється за таймером без нових кадрів, доки не надійде снапшот."""
+    async def scenario():
+        client = await make_xeggex_client(resync_timeout=0.01)
+        client.is_connected = False
+
+        await client._process_message(xeggex_frame("updateOrderbook", 8))
+        task = client._resyncing["BTC"]
+        await asyncio.sleep(0)
+        assert client.ws.sent == []
+        assert not client.has_live_stream("BTC")
+        assert await client.get_orderbook("BTC") is None
+
+        client.is_connected = True
+        await asyncio.sleep(0.03)
+        assert [message["method"] for message in client.ws.sent].count("subscribeOrderbook") >= 2
+
+        await client._process_message(xeggex_frame("snapshotOrderbook", 20, asks=[("102", "1")], bids=[("99", "1")]))
+        await asyncio.sleep(0)
+        assert "BTC" not in client._resyncing
+        assert task.cancelled()
+        assert client.has_live_stream("BTC")
+        assert (await client.get_orderbook("BTC"))["asks"] == [["102", "1"]]
+
+    asyncio.run(scenario())
+
+
+def test_xeggex_skips_untracked_and_unhandled_frames_before_decoding():
+    """Кадри інших ринків і методів, які не обробляються, відкидаються до повного розбору."""
+    async def scenario():
+        client = await make_xeggex_client()
+        decoded = client.decoder.stats["decoded"]
+
+        other = xeggex_frame("updateOrderbook", 6, asks=[("1", "1")]).replace("BTC/USDT", "ETH/USDT")
+        await client._process_message(other)
+        await client._process_message(json.dumps({"method": "ticker", "params": {"symbol": "BTC/USDT"}}))
+        assert client.decoder.stats["decoded"] == decoded
+
+        await client._process_message(xeggex_frame("updateOrderbook", 6, bids=[("100.5", "2")]))
+        assert client.decoder.stats["decoded"] == decoded + 1
+        assert client.get_book("BTC").sequence == 6
+
+    asyncio.run(scenario())
+
+
+def test_frame_decoder_peeks_only_top_level_fields():
+    """peek читає лише поля верхнього рівня (до або після вкладених значень) з тексту і байтів."""
+    decoder = FrameDecoder()
+    frames = [
+        '{"c":"spot@public.limit.depth.v3.api@BTCUSDT@5","d":{"s":"ETHUSDT","asks":[]},"s":"BTCUSDT","t":1}',
+        '{"method": "depth.update", "params": [{"method": "nested"}], "id": null}',
+        '{"params":{"symbol":"BTC/USDT"},"symbol":"x","a":[1]}',
+        '{"c":"s","s" : "XMRUSDT","d":{}}',
+        '{"s":"A\\"B","d":{}}',
+        '{"note":"\\"s\\":\\"FAKE\\"","d":{}}'
+    ]
+    expected = [("s", "BTCUSDT"), ("method", "depth.update"), ("symbol", None), ("s", "XMRUSDT"), ("s", None), ("s", None)]
+
+    for frame, (field, value) in zip(frames, expected):
+        assert decoder.peek(frame, field) == value
+        assert decoder.peek(frame.encode(), field) == value
+
+    assert decoder.peek('{"d":{"s":"ETHUSDT"}}', "s") is None
+    assert decoder.peek('{"t":1}', "s") is None
+
+
+def test_frame_decoder_skips_unhandled_and_untracked_frames():
+    """Кадри з непотрібним методом або символом відкидаються; кадри без поля - ні."""
+    decoder = FrameDecoder(symbols=["BTCUSDT"])
+    handled = frozenset({"depth.update"})
+
+    for convert in (str, str.encode):
+        assert decoder.skip_unhandled(convert('{"method":"server.ping","params":[]}'), "method", handled)
+        assert not decoder.skip_unhandled(convert('{"method":"depth.update","params":[]}'), "method", handled)
+        assert not decoder.skip_unhandled(convert('{"id":1,"result":{"method":"server.ping"}}'), "method", handled)
+
+        assert decoder.skip_untracked(convert('{"d":{"s":"BTCUSDT"},"s":"ETHUSDT"}'), "s")
+        assert not decoder.skip_untracked(convert('{"d":{"s":"ETHUSDT"},"s":"BTCUSDT"}'), "s")
+        assert not decoder.skip_untracked(convert('{"d":{"s":"ETHUSDT"}}'), "s")
+        assert not decoder.skip_untracked(convert('{"s":"ETH\\u0055SDT","d":{}}'), "s")
+
+        assert decoder.skip_untracked(convert('{"method":"m","params":{"symbol": "ETH/USDT","asks":[]}}'), "symbol", nested=True)
+        assert not decoder.skip_untracked(convert('{"params":{"symbol":"ETH/USDT"},"r":{"symbol":"x"}}'), "symbol", nested=True)
+        assert not decoder.skip_untracked(convert('{"params":{"note":"symbol","a":1}}'), "symbol", nested=True)
+
+    assert decoder.stats["skipped"] == 6
+    decoder.untrack("BTCUSDT")
+    assert decoder.skip_symbol("BTCUSDT")
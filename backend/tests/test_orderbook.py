@@ -0,0 +1,150 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Додаємо корневу директорію проекту до PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exchange_clients.coinex import CoinExClient
+from exchange_clients.orderbook import DEFAULT_SCALE, MAX_UNITS, OrderBook, MarketScale, parse_level
+from services.depth_diff import DepthDiffTracker
+
+# Масштаб з 2 знаками ціни та 3 знаками обсягу: 1.5 -> 150 тіків, 2 -> 2000 лотів
+SCALE = MarketScale(price_decimals=2, size_decimals=3)
+
+
+def test_snapshot_is_sorted_and_skips_empty_levels():
+    """Снапшот сортується за ціною, нульові рівні відкидаються."""
+    book = OrderBook(SCALE)
+    book.load_snapshot(
+        asks=[(10100, 1000), (10050, 2000), (10200, 0)],
+        bids=[(9900, 1000), (9950, 3000)]
+    )
+
+    assert book.best_ask() == (10050, 2000)
+    assert book.best_bid() == (9950, 3000)
+    assert book.top_asks() == [(10050, 2000), (10100, 1000)]
+    assert book.top_bids() == [(9950, 3000), (9900, 1000)]
+
+
+def test_level_upsert_and_delete():
+    """Оновлення рівня вставляє, змінює або видаляє його."""
+    book = OrderBook(SCALE)
+    book.load_snapshot(asks=[(1000, 1000)], bids=[(900, 1000)])
+
+    assert book.update_ask(950, 2000)
+    assert book.best_ask() == (950, 2000)
+    assert book.update_ask(950, 3000)
+    assert book.best_ask() == (950, 3000)
+    assert not book.update_ask(950, 3000)
+    assert book.update_ask(950, 0)
+    assert book.best_ask() == (1000, 1000)
+    assert not book.update_bid(800, 0)
+
+    assert book.update_bid(920, 1000)
+    assert book.top_bids(1) == [(920, 1000)]
+
+
+def test_to_dict_and_level_formats():
+    """Рівні з різних форматів бірж розбираються однаково."""
+    assert parse_level(["1.5", "2"], SCALE) == (150, 2000)
+    assert parse_level({"price": "1.5", "quantity": "2"}, SCALE) == (150, 2000)
+    assert parse_level({"p": "1.5", "v": "2"}, SCALE) == (150, 2000)
+    assert parse_level(("1.5", 2), SCALE) == (150, 2000)
+
+    book = OrderBook(SCALE)
+    book.load_snapshot(asks=[(200, 1000), (300, 1000)], bids=[(105, 4250)])
+    assert book.to_dict(depth=1) == {'asks': [['2', '1']], 'bids': [['1.05', '4.25']]}
+
+
+def test_market_scale_is_exact():
+    """Масштаб ринку розбирає і форматує ціни без похибок float."""
+    scale = MarketScale.from_config({'tick_size': '0.0001', 'lot_size': '1e-8'})
+    assert (scale.price_decimals, scale.size_decimals) == (4, 8)
+
+    assert scale.parse_price("0.1") + scale.parse_price("0.2") == scale.parse_price("0.3")
+    assert scale.parse_price("1.23456") == 12346
+    assert scale.parse_size("1e-8") == 1
+    assert scale.parse_price(2.5) == 25000
+    assert scale.format_price(scale.parse_price("65000.1000")) == "65000.1"
+    assert scale.display_price(scale.parse_price("0.05")) == "0.0500000"
+
+
+def test_prefix_sums_follow_level_updates():
+    """Ціна за порогом обсягу і обсяг до ціни збігаються з лінійним проходом після змін книги."""
+    def linear_price(levels, target):
+        total = 0
+        for price, size in levels:
+            total += price * size
+            if total >= target:
+                return price
+        return None
+
+    rng = random.Random(5)
+    book = OrderBook(SCALE)
+    book.load_snapshot(
+        asks=[(rng.randint(10000, 10100), rng.randint(1, 5000)) for _ in range(50)],
+        bids=[(rng.randint(9900, 9999), rng.randint(1, 5000)) for _ in range(50)]
+    )
+
+    for _ in range(300):
+        book.update_ask(rng.randint(10000, 10100), rng.choice([0, rng.randint(1, 5000)]))
+        book.update_bid(rng.randint(9900, 9999), rng.choice([0, rng.randint(1, 5000)]))
+
+        target = rng.randint(1, 10 ** 9)
+        assert book.effective_prices(target) == (
+            linear_price(book.top_asks(), target),
+            linear_price(book.top_bids(), target)
+        )
+
+        price = rng.randint(9900, 9999)
+        assert book.bids.notional_at_price(price) == sum(p * s for p, s in book.top_bids() if p >= price)
+
+
+def test_depth_diffs_rebuild_top_levels():
+    """Снапшот трекера з послідовними різницями відтворює верхні рівні книги."""
+    rng = random.Random(7)
+    book = OrderBook(SCALE)
+    book.load_snapshot(
+        asks=[(rng.randint(10000, 10050), rng.randint(1, 5000)) for _ in range(30)],
+        bids=[(rng.randint(9950, 9999), rng.randint(1, 5000)) for _ in range(30)]
+    )
+    tracker = DepthDiffTracker(levels=5)
+    assert tracker.update(book) is not None
+    assert tracker.update(book) is None
+
+    asks, bids = (dict(side) for side in tracker.snapshot())
+    sequence = tracker.sequence
+    for _ in range(200):
+        book.update_ask(rng.randint(10000, 10050), rng.choice([0, rng.randint(1, 5000)]))
+        book.update_bid(rng.randint(9950, 9999), rng.choice([0, rng.randint(1, 5000)]))
+        changes = tracker.update(book)
+        if changes is None:
+            continue
+        sequence += 1
+        assert tracker.sequence == sequence
+        for levels, side_changes in zip((asks, bids), changes):
+            for price, size in side_changes:
+                if size:
+                    levels[price] = size
+                else:
+                    del levels[price]
+
+    assert sorted(asks.items()) == book.top_asks(5)
+    assert sorted(bids.items(), reverse=True) == book.top_bids(5)
+
+
+def test_sizes_beyond_int64_are_clamped():
+    """Обсяг, що не вміщується в int64-масиви книги, обмежується, а рівень лишається в книзі."""
+    client = CoinExClient("CoinEx", "wss://example", {})
+    huge = "100000000000"  # 1e11 монет = 1e19 лотів при 8 знаках обсягу
+
+    assert DEFAULT_SCALE.parse_level(["1", huge]) == (DEFAULT_SCALE.parse_price("1"), MAX_UNITS)
+    with pytest.raises(ValueError):
+        DEFAULT_SCALE.parse_level(["100000000", "1"])
+
+    book = client._load_snapshot("BTCUSDT", [["2", "1"], ["3", huge]], [["1", "1"]])
+    assert len(book.asks) == 2
+    assert book.top_asks()[-1] == (DEFAULT_SCALE.parse_price("3"), MAX_UNITS)
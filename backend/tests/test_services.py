@@ -0,0 +1,376 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Додаємо корневу директорію проекту до PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exchange_clients.base_client import BaseExchangeClient
+from exchange_clients.mexc import MEXCClient
+from services.broadcast_conflator import BroadcastConflator
+from services.client_connection import ClientConnection
+from services.ingest_scheduler import ALL_TOKENS, IngestScheduler
+from services.orderbook_manager import OrderbookManager
+from services.websocket_manager import WebSocketManager
+from utils.binary_codec import SymbolTable, decode_orderbook_update, encode_orderbook_update
+
+
+class FakeWebSocket:
+    """З'єднання клієнта /ws у пам'яті: зберігає відправлені кадри."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=None):
+        pass
+
+
+async def drain():
+    """Дає задачам запису клієнтів відправити черги."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class FakePushClient(BaseExchangeClient):
+    """Потоковий клієнт без мережі: книги заповнюються тестом, REST-запити рахуються."""
+
+    push_updates = True
+
+    def __init__(self, name="Fake", config=None):
+        super().__init__(name, "wss://example", config)
+        self.is_connected = True
+        self.rest_calls = 0
+
+    async def connect(self):
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def subscribe_to_orderbook(self, token):
+        pass
+
+    async def unsubscribe_from_orderbook(self, token):
+        pass
+
+    async def _fetch_orderbook(self, token):
+        self.rest_calls += 1
+        self._load_snapshot(self.book_key(token), [['2', '1']], [['1', '1']])
+        return {'asks': [['2', '1']], 'bids': [['1', '1']], 'best_sell': '2', 'best_buy': '1'}
+
+
+def make_manager(client):
+    manager = OrderbookManager(WebSocketManager())
+    manager.exchanges[client.name] = client
+    manager.tokens = ["BTC"]
+    return manager
+
+
+def test_push_book_falls_back_to_rest_when_stale_or_empty():
+    """Книга потокового клієнта відповідає з пам'яті, поки свіжа; застаріла чи порожня - через REST."""
+    async def scenario():
+        client = FakePushClient(config={'push_stale_after': 60, 'orderbook_cache_ttl': 0})
+        manager = make_manager(client)
+
+        client._ensure_book("BTC")
+        assert (await manager.get_orderbook("BTC", "Fake"))["source"] == "rest"
+
+        client._load_snapshot("BTC", [["2", "1"]], [["1", "1"]])
+        assert (await manager.get_orderbook("BTC", "Fake"))["source"] == "memory"
+
+        client.get_book("BTC").updated_at = time.time() - 61
+        assert (await manager.get_orderbook("BTC", "Fake"))["source"] == "rest"
+        assert client.rest_calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_polled_book_caches_only_best_prices():
+    """Опитана книга надходить у кеш подією зміни; кеш (initial_data) містить лише найкращі ціни."""
+    async def scenario():
+        client = FakePushClient(config={'orderbook_cache_ttl': 0})
+        manager = make_manager(client)
+        manager.orderbooks = {"BTC": {"Fake": {}}}
+        manager.last_update_time = {"BTC": {"Fake": 0}}
+        client.tokens = ["BTC"]
+        client.on_book_update = manager.notify_book_update
+
+        # Опитування лише завантажує книгу: кеш оновлює подія зміни книги
+        await manager._poll_token("Fake", "BTC")
+        assert manager.orderbooks["BTC"]["Fake"] == {}
+        for token, exchange in list(manager._pending_events):
+            await manager._handle_book_event(token, exchange)
+
+        assert manager.orderbooks["BTC"]["Fake"] == {"best_sell": "2.00000", "best_buy": "1.00000"}
+
+    asyncio.run(scenario())
+
+
+def test_book_without_live_stream_is_not_served_after_bulk_bbo():
+    """Найкращі ціни одним запитом не роблять книгу без живого потоку актуальною: після orderbook_max_age - REST."""
+    async def scenario():
+        client = MEXCClient("MEXC", "wss://example", {"depth_mode": "diff", "bulk_bbo": True, "orderbook_cache_ttl": 0})
+        manager = make_manager(client)
+        client.tokens = ["BTC"]
+        client.is_connected = True
+        client._load_snapshot("BTCUSDT", [["101", "1"], ["102", "1"]], [["100", "1"], ["99", "1"]])
+        client.get_book("BTC").updated_at = time.time() - 40
+        snapshots = []
+
+        async def fake_tickers():
+            return [{"symbol": "BTCUSDT", "askPrice": "100.5", "askQty": "1", "bidPrice": "100.2", "bidQty": "1"}]
+
+        async def fake_snapshot(symbol, limit):
+            snapshots.append(symbol)
+            return {"asks": [["100.6", "1"]], "bids": [["100.1", "1"]]}
+
+        client._fetch_book_tickers = fake_tickers
+        client._fetch_depth_snapshot = fake_snapshot
+        assert await client.refresh_bulk_bbo(["BTC"]) == 1
+        assert not client.has_live_stream("BTC")
+
+        orderbook = await manager.get_orderbook("BTC", "MEXC")
+        assert orderbook["source"] == "rest"
+        assert snapshots == ["BTCUSDT"]
+        assert orderbook["asks"] == [["100.6", "1"]]
+
+    asyncio.run(scenario())
+
+
+def test_effective_prices_fetch_depth_for_stale_book():
+    """Ціни виконання рахуються з повної книги: порожня чи застаріла книга спершу запитується через REST."""
+    async def scenario():
+        client = FakePushClient(config={'push_stale_after': 60, 'orderbook_cache_ttl': 0})
+        manager = make_manager(client)
+
+        prices = await manager.get_effective_prices("BTC", [1])
+        assert client.rest_calls == 1
+        assert prices["Fake"][0]["best_sell"] != "X X X"
+
+        await manager.get_effective_prices("BTC", [1])
+        assert client.rest_calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_subscriber_index_routes_updates_to_matching_clients():
+    """Інвертований індекс повертає клієнтів, підписаних на пару, токен, біржу або все, і очищається при відписці."""
+    async def scenario():
+        manager = WebSocketManager()
+        everything, btc, mexc, pair = (FakeWebSocket() for _ in range(4))
+        for ws in (everything, btc, mexc, pair):
+            await manager.connect(ws)
+        await manager.subscribe(btc, ["BTC"], [])
+        await manager.subscribe(mexc, [], ["MEXC"])
+        await manager.subscribe(pair, ["ETH"], ["CoinEx"])
+
+        assert manager._subscribers("BTC", "MEXC") == {id(everything), id(btc), id(mexc)}
+        assert manager._subscribers("ETH", "CoinEx") == {id(everything), id(pair)}
+        assert manager._subscribers("ETH", "Xeggex") == {id(everything)}
+
+        await manager.disconnect(everything)
+        await manager.unsubscribe(pair)
+        assert manager._subscribers("ETH", "Xeggex") == {id(pair)}
+        assert ("ETH", "CoinEx") not in manager._pair_index
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_binary_clients_learn_ids_assigned_at_later_connect():
+    """Ідентифікатори, призначені при підключенні другого бінарного клієнта, отримує і перший."""
+    async def scenario():
+        manager = WebSocketManager()
+        first, second = FakeWebSocket(), FakeWebSocket()
+
+        await manager.connect(first, binary=True)
+        await manager.announce_symbols(["BTC"], ["MEXC"])
+        await manager.connect(second, binary=True)
+        await manager.announce_symbols(["BTC", "ETH"], ["MEXC"])
+        await drain()
+
+        tables = [json.loads(frame) for frame in first.sent if isinstance(frame, str)]
+        assert tables[-1]["type"] == "symbol_ids"
+        assert tables[-1]["tokens"] == {"BTC": 0, "ETH": 1}
+
+        await manager.subscribe(first, [], [])
+        await manager.subscribe(second, [], [])
+        first.sent.clear()
+        update = {"type": "orderbook_update", "exchange": "MEXC", "token": "ETH",
+                  "best_sell": "2", "best_buy": "1", "timestamp": 1}
+        await manager.broadcast(update)
+        await drain()
+
+        record = decode_orderbook_update(next(frame for frame in first.sent if isinstance(frame, bytes)))
+        assert record["token_id"] == tables[-1]["tokens"]["ETH"]
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_bulk_bbo_source_feeds_tops_without_replacing_depth():
+    """Джерело найкращих цін оновлює last_tops і кеш, не замінюючи глибину книги, і не планується для кожного токена."""
+    async def scenario():
+        client = MEXCClient("MEXC", "wss://example", {"depth_mode": "diff", "bulk_bbo": True})
+        manager = make_manager(client)
+        manager.orderbooks = {"BTC": {"MEXC": {}}}
+        manager.last_update_time = {"BTC": {"MEXC": 0}}
+        client.tokens = ["BTC"]
+        client._load_snapshot("BTCUSDT", [[str(101 + i), "1"] for i in range(50)], [[str(100 - i), "1"] for i in range(50)])
+        client.get_book("BTC").updated_at = time.time() - 1
+        client.on_book_update = manager.notify_book_update
+
+        async def fake_tickers():
+            return [{"symbol": "BTCUSDT", "askPrice": "100.5", "askQty": "1", "bidPrice": "100.2", "bidQty": "1"}]
+
+        client._fetch_book_tickers = fake_tickers
+        manager._register_ingest("MEXC", client)
+        manager.scheduler.add_token("ETH")
+        assert list(manager.scheduler._generations) == [("MEXC:bbo", ALL_TOKENS)]
+
+        await manager.scheduler.run_now("MEXC:bbo", ALL_TOKENS)
+        for token, exchange in list(manager._pending_events):
+            await manager._handle_book_event(token, exchange)
+
+        scale = client.market_scale("BTCUSDT")
+        assert manager.orderbooks["BTC"]["MEXC"] == {"best_sell": "100.500", "best_buy": "100.200"}
+        assert manager.last_tops[("BTC", "MEXC")] == (scale.parse_level(["100.5", "1"]), scale.parse_level(["100.2", "1"]))
+        assert len(client.get_book("BTC").asks) == 50 and len(client.get_book("BTC").bids) == 50
+
+    asyncio.run(scenario())
+
+
+def test_manual_refresh_of_push_exchange_runs_through_scheduler():
+    """Ручне оновлення потокової біржі йде через джерело планувальника без періодичних запитів."""
+    async def scenario():
+        client = FakePushClient(config={'orderbook_cache_ttl': 0})
+        manager = make_manager(client)
+        gate = asyncio.Event()
+        fetch = client._fetch_orderbook
+
+        async def slow_fetch(token):
+            await gate.wait()
+            return await fetch(token)
+
+        client._fetch_orderbook = slow_fetch
+        manager._register_ingest("Fake", client)
+        manager.scheduler.add_token("ETH")
+        assert manager.scheduler.has_source("Fake")
+        assert not manager.scheduler._generations
+
+        first = asyncio.create_task(manager.refresh_all())
+        second = asyncio.create_task(manager.refresh_all())
+        third = asyncio.create_task(manager.refresh_exchange("Fake", "BTC"))
+        await drain()
+        assert manager.scheduler.in_flight == 1
+        gate.set()
+        await asyncio.gather(first, second, third)
+
+        assert client.rest_calls == 1
+        assert "Fake" in manager.update_stats['cycle_times']
+
+    asyncio.run(scenario())
+
+
+def test_ingest_scheduler_orders_jobs_by_cadence_and_skips_cancelled():
+    """Завдання виконуються за своїми інтервалами (і довшими за оберт колеса), скасовані - не виконуються."""
+    async def scenario():
+        scheduler = IngestScheduler(tick=0.01, wheel_size=4, jitter=0)
+        fetched = []
+
+        async def fetch(token):
+            fetched.append(token)
+
+        cadences = {"A": 0.07, "B": 0.03, "C": 0.01}
+        scheduler.register_source("Fake", fetch, 1, tokens=["A", "B", "C"], cadence_fn=cadences.get)
+        scheduler.unschedule("Fake", "C")
+        scheduler.start()
+        for _ in range(100):
+            if len(fetched) >= 5:
+                break
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+        assert fetched[:5] == ["A", "B", "B", "B", "A"]
+        assert "C" not in fetched
+
+    asyncio.run(scenario())
+
+
+def test_conflator_sends_latest_state_per_key_once_per_window():
+    """За вікно для кожного ключа відправляється лише останній стан; наступне вікно відправляється окремо."""
+    async def scenario():
+        batches = []
+
+        async def send_batch(messages):
+            batches.append([message["v"] for message in messages])
+
+        conflator = BroadcastConflator(None, window=0.02, send_batch=send_batch)
+        await conflator.publish("A", {"v": "A1"})
+        await conflator.publish("B", {"v": "B1"})
+        await conflator.publish("A", {"v": "A2"})
+        await asyncio.sleep(0.03)
+        await conflator.publish("A", {"v": "A3"})
+        await conflator.stop()
+
+        assert batches == [["A2", "B1"], ["A3"]]
+        assert conflator.stats == {"published": 4, "conflated": 1, "sent": 3}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message["v"])
+
+        immediate = BroadcastConflator(send, window=0)
+        await immediate.publish("A", {"v": "A1"})
+        await immediate.publish("A", {"v": "A2"})
+        assert sent == ["A1", "A2"]
+
+    asyncio.run(scenario())
+
+
+def test_client_queue_replaces_by_key_and_drops_oldest_keyed_state():
+    """Повідомлення з ключем замінює попереднє; при переповненні відкидається найстаріший стан з ключем."""
+    client = ClientConnection(FakeWebSocket(), None, max_queue=3)
+
+    assert client.enqueue("hello")
+    assert client.enqueue("a1", ("MEXC", "BTC"))
+    assert client.enqueue("b1", ("MEXC", "ETH"))
+    assert client.enqueue("a2", ("MEXC", "BTC"))
+    assert list(client._queue.values()) == ["hello", "a2", "b1"]
+
+    assert client.enqueue("c1", ("CoinEx", "BTC"))
+    assert client.enqueue("bye")
+    assert list(client._queue.values()) == ["hello", "c1", "bye"]
+
+    assert client.enqueue("end")
+    assert list(client._queue.values()) == ["hello", "bye", "end"]
+
+    assert client.enqueue("more")
+    assert list(client._queue.values()) == ["bye", "end", "more"]
+    assert client.stats["replaced"] == 1
+    assert client.stats["dropped"] == 4
+
+
+def test_batch_frames_join_binary_records_and_wrap_json_messages():
+    """Бінарні записи тіку склеюються в один кадр, JSON-повідомлення - в один кадр batch; одне повідомлення не загортається."""
+    symbols = SymbolTable()
+    symbols.register(["BTC", "ETH"], ["MEXC"])
+    records = [encode_orderbook_update(symbols, {"exchange": "MEXC", "token": token, "best_sell": "2",
+                                                 "best_buy": "1", "timestamp": 1}) for token in ("BTC", "ETH")]
+    texts = ['{"token":"BTC"}', '{"token":"ETH"}']
+
+    binary, text = WebSocketManager._batch_frames([records[0], texts[0], records[1], texts[1]])
+    assert [decode_orderbook_update(binary[i:i + 29])["token_id"] for i in range(0, len(binary), 29)] == [0, 1]
+    assert json.loads(text) == {"type": "batch", "messages": [{"token": "BTC"}, {"token": "ETH"}]}
+
+    assert WebSocketManager._batch_frames([texts[0]]) == [texts[0]]
+    assert WebSocketManager._batch_frames([]) == []
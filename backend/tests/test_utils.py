@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import math
+import os
+import queue
+import sys
+
+import pytest
+
+# Додаємо корневу директорію проекту до PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_codec
+from utils.binary_codec import SymbolTable, decode_orderbook_update, encode_orderbook_update
+from utils.log import DroppingQueueHandler
+from utils.single_flight import SingleFlight
+
+
+def test_json_backends_produce_identical_frames():
+    """orjson і стандартний json кодують повідомлення в однакові кадри і однаково їх розбирають."""
+    message = {
+        "type": "orderbook_update", "exchange": "MEXC", "token": "BTC",
+        "best_sell": "101.500", "best_buy": None, "timestamp": 1700000000123,
+        "asks": [["101.5", "2"]], "note": "ціна", "levels": {1: 0.25}
+    }
+    frames = []
+    try:
+        for backend in ("json", "orjson"):
+            assert json_codec.set_backend(backend) == backend
+            frames.append(json_codec.dumps(message))
+            assert json_codec.loads(frames[-1]) == json_codec.loads(frames[-1].encode())
+    finally:
+        json_codec.set_backend()
+
+    assert frames[0] == frames[1]
+    assert json_codec.loads(frames[0])["levels"] == {"1": 0.25}
+
+
+def test_binary_orderbook_update_round_trip():
+    """Бінарний запис має фіксовану довжину і розбирається в ті самі ідентифікатори, ціни та час; відсутня ціна - NaN."""
+    symbols = SymbolTable()
+    assert symbols.register(["BTC", "ETH"], ["MEXC", "CoinEx"])
+    assert not symbols.register(["ETH"], ["MEXC"])
+
+    frame = encode_orderbook_update(symbols, {
+        "exchange": "CoinEx", "token": "ETH", "best_sell": "2001.25", "best_buy": "X X X", "timestamp": 1700000000123
+    })
+    record = decode_orderbook_update(frame)
+
+    assert len(frame) == 29
+    assert (record["exchange_id"], record["token_id"]) == (symbols.exchanges["CoinEx"], symbols.tokens["ETH"])
+    assert record["best_sell"] == 2001.25
+    assert math.isnan(record["best_buy"])
+    assert record["timestamp"] == 1700000000123
+
+
+def test_single_flight_shares_requests_caches_results_and_not_errors():
+    """Одночасні виклики ділять один запит, результат кешується на ttl, помилка не кешується."""
+    async def scenario():
+        flight = SingleFlight(ttl=0.05)
+        calls = []
+
+        async def fetch(symbol):
+            calls.append(symbol)
+            await asyncio.sleep(0.01)
+            return {"symbol": symbol}
+
+        results = await asyncio.gather(*(flight.run("BTCUSDT", fetch, "BTCUSDT") for _ in range(3)))
+        assert results[0] is results[1] is results[2]
+        assert await flight.run("BTCUSDT", fetch, "BTCUSDT") is results[0]
+        assert len(calls) == 1
+
+        await asyncio.sleep(0.06)
+        await flight.run("BTCUSDT", fetch, "BTCUSDT")
+        assert len(calls) == 2
+        assert flight.stats == {"calls": 5, "fetches": 2, "shared": 2, "cache_hits": 1}
+
+        async def failing():
+            calls.append("error")
+            raise RuntimeError("timeout")
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await flight.run("ETHUSDT", failing)
+        assert calls.count("error") == 2
+        assert not flight._in_flight
+
+    asyncio.run(scenario())
+
+
+def test_dropping_queue_handler_counts_and_reports_dropped_records():
+    """Переповнена черга не блокує запис: записи відкидаються, а їх кількість повідомляється, коли з'явиться місце."""
+    log_queue = queue.Queue(2)
+    handler = DroppingQueueHandler(log_queue)
+
+    def record(msg):
+        return logging.LogRecord("test", logging.INFO, __file__, 0, msg, None, None)
+
+    for msg in ("first", "second", "lost 1", "lost 2"):
+        handler.emit(record(msg))
+    assert handler.dropped == 2
+
+    log_queue.get_nowait()
+    handler.emit(record("third"))
+    assert [log_queue.get_nowait().getMessage() for _ in range(2)] == ["second", "third"]
+
+    handler.emit(record("fourth"))
+    notice = [log_queue.get_nowait() for _ in range(2)][1]
+    assert notice.levelno == logging.WARNING
+    assert notice.getMessage() == "Черга логування переповнена: пропущено 2 записів"
+
+    handler.emit(record("fifth"))
+    assert log_queue.qsize() == 1
@@ -0,0 +1,108 @@
+"""
+Компактний бінарний формат повідомлень для клієнтів /ws?format=binary.
+
+Бінарно кодуються оновлення найкращих цін (orderbook_update) - основна частина
+трафіку. Назви токенів і бірж замінюються числовими ідентифікаторами, які
+клієнт отримує в initial_data (symbol_ids) і в повідомленнях symbol_ids при
+появі нових назв. Решта повідомлень залишається текстовим JSON.
+
+Формат orderbook_update (little-endian, 29 байт):
+    B  тип повідомлення (1)
+    H  ідентифікатор біржі
+    H  ідентифікатор токена
+    d  best_sell (NaN - немає ціни)
+    d  best_buy (NaN - немає ціни)
+    Q  timestamp, мс
+"""
+import math
+import struct
+from typing import Any, Dict, Iterable
+
+# Типи бінарних повідомлень
+MSG_ORDERBOOK_UPDATE = 1
+
+_ORDERBOOK_UPDATE = struct.Struct('<BHHddQ')
+
+
+def _price(value: Any) -> float:
+    """Ціна як число; відсутня ціна ('X X X', None) - NaN."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class SymbolTable:
+    """
+    Словникове кодування назв токенів і бірж у числові ідентифікатори.
+    Ідентифікатори не перевикористовуються, поки працює сервер.
+    """
+
+    def __init__(self):
+        self.tokens: Dict[str, int] = {}
+        self.exchanges: Dict[str, int] = {}
+
+    def register(self, tokens: Iterable[str] = (), exchanges: Iterable[str] = ()) -> bool:
+        """
+        Призначення ідентифікаторів новим назвам.
+
+        Args:
+            tokens (Iterable[str]): Символи токенів
+            exchanges (Iterable[str]): Назви бірж
+
+        Returns:
+            bool: True, якщо з'явилися нові ідентифікатори
+        """
+        added = False
+        for names, table in ((tokens, self.tokens), (exchanges, self.exchanges)):
+            for name in names:
+                if name not in table:
+                    table[name] = len(table)
+                    added = True
+        return added
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        """Таблиця ідентифікаторів для відправки клієнту."""
+        return {'tokens': dict(self.tokens), 'exchanges': dict(self.exchanges)}
+
+
+def encode_orderbook_update(symbols: SymbolTable, message: Dict[str, Any]) -> bytes:
+    """
+    Кодування orderbook_update у бінарний кадр.
+    Назви токена і біржі мають бути зареєстровані в таблиці.
+
+    Args:
+        symbols (SymbolTable): Таблиця ідентифікаторів
+        message (Dict[str, Any]): Повідомлення orderbook_update
+
+    Returns:
+        bytes: Бінарний кадр
+    """
+    return _ORDERBOOK_UPDATE.pack(
+        MSG_ORDERBOOK_UPDATE,
+        symbols.exchanges[message['exchange']],
+        symbols.tokens[message['token']],
+        _price(message.get('best_sell')),
+        _price(message.get('best_buy')),
+        int(message.get('timestamp', 0))
+    )
+
+
+def decode_orderbook_update(frame: bytes) -> Dict[str, Any]:
+    """
+    Розбір бінарного кадру orderbook_update (для тестів та клієнтів на Python).
+
+    Args:
+        frame (bytes): Бінарний кадр
+
+    Returns:
+        Dict[str, Any]: {'exchange_id', 'token_id', 'best_sell', 'best_buy', 'timestamp'}
+    """
+    _, exchange_id, token_id, best_sell, best_buy, timestamp = _ORDERBOOK_UPDATE.unpack(frame)
+    return {
+        'exchange_id': exchange_id,
+        'token_id': token_id,
+        'best_sell': best_sell,
+        'best_buy': best_buy,
+        'timestamp': timestamp
+    }
@@ -0,0 +1,91 @@
+"""
+Кодування JSON для повідомлень клієнтам.
+
+Бекенд обирається при запуску (JSON_BACKEND): orjson, якщо встановлений,
+інакше стандартний json. Повідомлення кодується один раз у незмінний рядок,
+який відправляється всім отримувачам.
+"""
+import json
+import logging
+from typing import Any
+
+from config import JSON_BACKEND
+
+# Налаштування логгера
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson - необов'язкова залежність
+    orjson = None
+
+
+def _json_dumps(obj: Any) -> str:
+    # Компактний UTF-8 вивід, як у orjson: кадри не залежать від бекенду
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def _orjson_dumps(obj: Any) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+_dumps = _json_dumps
+_loads = json.loads
+_backend = 'json'
+
+
+def set_backend(name: str = JSON_BACKEND) -> str:
+    """
+    Вибір бекенду кодування.
+
+    Args:
+        name (str): 'auto' (orjson, якщо доступний), 'orjson' або 'json'
+
+    Returns:
+        str: Назва обраного бекенду
+    """
+    global _dumps, _loads, _backend
+
+    if name in ('auto', 'orjson') and orjson is not None:
+        _dumps, _loads, _backend = _orjson_dumps, orjson.loads, 'orjson'
+    else:
+        if name == 'orjson':
+            logger.warning("orjson не встановлено, використовується стандартний json")
+        _dumps, _loads, _backend = _json_dumps, json.loads, 'json'
+
+    logger.info(f"JSON backend: {_backend}")
+    return _backend
+
+
+def backend_name() -> str:
+    """Назва поточного бекенду кодування."""
+    return _backend
+
+
+def dumps(obj: Any) -> str:
+    """
+    Кодування об'єкта в рядок JSON.
+
+    Args:
+        obj (Any): Об'єкт для кодування
+
+    Returns:
+        str: Рядок JSON
+    """
+    return _dumps(obj)
+
+
+def loads(data: Any) -> Any:
+    """
+    Розбір рядка або байтів JSON.
+
+    Args:
+        data (Any): Рядок або байти JSON
+
+    Returns:
+        Any: Розібраний об'єкт
+    """
+    return _loads(data)
+
+
+set_backend()
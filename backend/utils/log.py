@@ -0,0 +1,252 @@
+"""
+Логування для гарячих шляхів (обробка повідомлень бірж, розсилка оновлень).
+
+- Форматування ліниве: аргументи підставляються лише якщо запис буде виведено,
+  а дорогі обчислення (json.dumps книги тощо) загортаються в lazy(...).
+- payload - окремий рівень для повних повідомлень і книг (між DEBUG та INFO),
+  вимкнений за замовчуванням (LOG_PAYLOAD).
+- throttled - не частіше одного запису за інтервал для місця виклику,
+  з кількістю пропущених записів.
+- sampled - кожен N-й запис для місця виклику.
+
+setup_logging() налаштовує запис логів у фоновому потоці: обробники кореневого
+логера лише кладуть записи в обмежену чергу (при переповненні записи
+відкидаються і рахуються), а файл з ротацією за розміром і консоль
+обслуговує QueueListener.
+"""
+import atexit
+import logging
+import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from config import (
+    LOG_BACKUPS, LOG_FILE, LOG_MAX_SIZE, LOG_PAYLOAD, LOG_QUEUE_SIZE, LOG_SAMPLE_RATE, LOG_THROTTLE_INTERVAL
+)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Рівень повних повідомлень бірж і вмісту книг
+PAYLOAD = 15
+logging.addLevelName(PAYLOAD, "PAYLOAD")
+
+
+class lazy:
+    """
+    Відкладене обчислення аргументу логу: функція викликається лише при форматуванні запису.
+
+    Приклад: log.payload("%s: %s", name, lazy(json.dumps, data, indent=2))
+    """
+
+    __slots__ = ('fn', 'args', 'kwargs')
+
+    def __init__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return str(self.fn(*self.args, **self.kwargs))
+
+
+def _call_site() -> Hashable:
+    """Місце виклику методу HotLogger (файл і рядок)."""
+    frame = sys._getframe(2)
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+class HotLogger:
+    """
+    Обгортка над logging.Logger з перевіркою рівня, обмеженням частоти та вибіркою.
+    """
+
+    def __init__(self, name: str):
+        """
+        Ініціалізація.
+
+        Args:
+            name (str): Назва логера (зазвичай __name__)
+        """
+        self.logger = logging.getLogger(name)
+        self._throttle: Dict[Hashable, List[float]] = {}  # {місце виклику: [час запису, пропущено]}
+        self._samples: Dict[Hashable, int] = {}  # {місце виклику: кількість викликів}
+
+    def debug(self, msg: str, *args: Any):
+        """Запис рівня DEBUG з лінивим форматуванням."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.log(logging.DEBUG, msg, *args, stacklevel=2)
+
+    def payload(self, msg: str, *args: Any):
+        """Запис повного повідомлення або вмісту книги (рівень PAYLOAD, вимкнений за замовчуванням)."""
+        if self.logger.isEnabledFor(PAYLOAD):
+            self.logger.log(PAYLOAD, msg, *args, stacklevel=2)
+
+    def throttled(self, level: int, msg: str, *args: Any, interval: float = LOG_THROTTLE_INTERVAL,
+                  key: Optional[Hashable] = None):
+        """
+        Запис не частіше одного разу за interval секунд для місця виклику.
+
+        Args:
+            level (int): Рівень запису
+            msg (str): Шаблон повідомлення (%-форматування)
+            *args (Any): Аргументи шаблону
+            interval (float): Мінімальний інтервал між записами (секунди)
+            key (Optional[Hashable]): Ключ обмеження; за замовчуванням - місце виклику
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        if key is None:
+            key = _call_site()
+
+        now = time.monotonic()
+        state = self._throttle.get(key)
+        if state is not None and now - state[0] < interval:
+            state[1] += 1
+            return
+
+        suppressed = int(state[1]) if state is not None else 0
+        self._throttle[key] = [now, 0]
+        if suppressed:
+            msg += " (+%d пропущено)"
+            args += (suppressed,)
+        self.logger.log(level, msg, *args, stacklevel=2)
+
+    def sampled(self, level: int, msg: str, *args: Any, rate: int = LOG_SAMPLE_RATE,
+                key: Optional[Hashable] = None):
+        """
+        Запис кожного rate-го виклику для місця виклику (перший виклик записується завжди).
+
+        Args:
+            level (int): Рівень запису
+            msg (str): Шаблон повідомлення (%-форматування)
+            *args (Any): Аргументи шаблону
+            rate (int): Частота вибірки: 1 запис на rate викликів
+            key (Optional[Hashable]): Ключ вибірки; за замовчуванням - місце виклику
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        if key is None:
+            key = _call_site()
+
+        count = self._samples.get(key, 0)
+        self._samples[key] = count + 1
+        if count % rate == 0:
+            self.logger.log(level, msg + " (1 з %d)", *args, rate, stacklevel=2)
+
+
+def get_logger(name: str) -> HotLogger:
+    """
+    Логер для гарячих шляхів.
+
+    Args:
+        name (str): Назва логера (зазвичай __name__)
+
+    Returns:
+        HotLogger: Обгортка над logging.getLogger(name)
+    """
+    return HotLogger(name)
+
+
+def configure(payload: bool = LOG_PAYLOAD):
+    """
+    Налаштування рівня PAYLOAD при запуску: якщо payload увімкнено, кореневий логер
+    пропускає записи PAYLOAD (DEBUG залишається вимкненим).
+
+    Args:
+        payload (bool): Виводити повні повідомлення бірж і вміст книг
+    """
+    root = logging.getLogger()
+    if payload and root.level > PAYLOAD:
+        root.setLevel(PAYLOAD)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler, що ніколи не блокує: якщо черга заповнена, запис відкидається.
+    Кількість відкинутих записів повідомляється окремим записом, щойно в черзі з'явиться місце.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._reported = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped != self._reported:
+            lost = self.dropped - self._reported
+            notice = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                       "Черга логування переповнена: пропущено %d записів", (lost,), None)
+            try:
+                self.queue.put_nowait(notice)
+                self._reported = self.dropped
+            except queue.Full:
+                pass
+
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: int = logging.INFO, log_file: str = LOG_FILE, max_bytes: int = LOG_MAX_SIZE,
+                  backups: int = LOG_BACKUPS, queue_size: int = LOG_QUEUE_SIZE):
+    """
+    Налаштування кореневого логера: запис у файл і консоль виконує фоновий потік.
+
+    Args:
+        level (int): Рівень кореневого логера
+        log_file (str): Шлях до файлу логу (каталог створюється за потреби)
+        max_bytes (int): Розмір файлу, після якого виконується ротація
+        backups (int): Кількість резервних файлів
+        queue_size (int): Місткість черги записів
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+
+    log_dir = os.path.dirname(log_file)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+    _listener = QueueListener(_queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    configure()
+
+    atexit.register(shutdown)
+
+
+def dropped_records() -> int:
+    """Кількість записів, відкинутих через переповнену чергу."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def shutdown():
+    """Запис залишку черги та зупинка фонового потоку."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,91 @@
+"""
+Об'єднання одночасних однакових запитів (single-flight) з коротким кешем результату.
+
+Якщо кілька викликів запитують той самий ключ, поки запит уже виконується,
+вони чекають на нього і отримують той самий результат замість власного
+запиту до біржі. Успішний результат кешується на ttl секунд.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Налаштування логгера
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Спільні запити за ключем з кешем результату.
+    Результат повертається всім викликам як є - його не можна змінювати на місці.
+    """
+
+    def __init__(self, ttl: float = 0.0):
+        """
+        Ініціалізація.
+
+        Args:
+            ttl (float): Час життя успішного результату в кеші (секунди); 0 - без кешу
+        """
+        self.ttl = ttl
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}  # {ключ: (час завершення, результат)}
+        self.stats = {
+            'calls': 0,
+            'fetches': 0,
+            'shared': 0,
+            'cache_hits': 0
+        }
+
+    async def run(self, key: Hashable, fetch: Callable[..., Awaitable], *args: Any) -> Any:
+        """
+        Виконання запиту або приєднання до вже запущеного.
+
+        Args:
+            key (Hashable): Ключ запиту (наприклад, символ ринку)
+            fetch (Callable[..., Awaitable]): Корутина запиту
+            *args (Any): Аргументи запиту
+
+        Returns:
+            Any: Результат запиту
+        """
+        self.stats['calls'] += 1
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            if time.monotonic() - cached[0] <= self.ttl:
+                self.stats['cache_hits'] += 1
+                return cached[1]
+            del self._cache[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats['shared'] += 1
+        else:
+            self.stats['fetches'] += 1
+            task = self._in_flight[key] = asyncio.create_task(self._fetch(key, fetch, *args))
+
+        # Скасування одного з викликів не скасовує спільний запит
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """
+        Видалення результату з кешу.
+
+        Args:
+            key (Optional[Hashable]): Ключ; None - очистити весь кеш
+        """
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[..., Awaitable], *args: Any) -> Any:
+        """Виконання запиту та кешування непорожнього результату."""
+        try:
+            result = await fetch(*args)
+            if result and self.ttl > 0:
+                self._cache[key] = (time.monotonic(), result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)